@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Headless batch entry point. Runs scenario files (see plugin/scenario.py)
+with a standalone QgsApplication; the plugin GUI is never imported.
+
+    python -m ethiorisksurv_toolbox.cli scenarios/*.yaml --jobs 8
+
+Each job is a separate process with its own QgsApplication, so scenarios
+run in parallel on a multi-core machine. QGIS_PREFIX_PATH selects the QGIS
+installation when it cannot be detected.
+
+A single scenario can instead be run once per study area (see
+plugin/shard_runner.py), with the results merged into one GeoPackage:
+
+    python -m ethiorisksurv_toolbox.cli zone.yaml --shard-by WOREDA_ID --merge-into zone.gpkg --jobs 8
+
+Re-running the same command resumes after the last completed study area.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+LOG_LEVELS = {'info': 0, 'warning': 1, 'critical': 2}
+
+_qgs = None # QgsApplication of this process
+
+
+def init_qgis(log_level='warning'):
+    """
+    Starts a GUI-less QgsApplication with the processing framework and
+    forwards the QGIS message log to stderr. Safe to call more than once.
+    """
+    global _qgs
+    if _qgs is not None:
+        return _qgs
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen') # No display needed, even for map rendering
+
+    from qgis.core import QgsApplication, Qgis
+    if os.environ.get('QGIS_PREFIX_PATH'):
+        QgsApplication.setPrefixPath(os.environ['QGIS_PREFIX_PATH'], True)
+    _qgs = QgsApplication([], False)
+    _qgs.initQgis()
+
+    plugins_dir = os.path.join(QgsApplication.pkgDataPath(), 'python', 'plugins')
+    if plugins_dir not in sys.path:
+        sys.path.append(plugins_dir)
+    from processing.core.Processing import Processing
+    Processing.initialize()
+    from qgis.analysis import QgsNativeAlgorithms
+    if QgsApplication.processingRegistry().providerById('native') is None:
+        QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+
+    threshold = LOG_LEVELS[log_level]
+
+    def forward(message, tag, level):
+        severity = 0 if level == Qgis.Success else int(level) # Success messages count as info
+        if severity >= threshold:
+            print(f"[{tag}] {message}", file=sys.stderr)
+
+    QgsApplication.messageLog().messageReceived.connect(forward)
+    return _qgs
+
+
+def run_scenario_file(path, log_level='warning'):
+    """
+    Loads and runs one scenario file in this process.
+    :return: The scenario summary dict.
+    """
+    init_qgis(log_level)
+    from .plugin.scenario import load_scenario, ScenarioRunner, ScenarioError
+    try:
+        scenario = load_scenario(path)
+    except (OSError, ValueError, KeyError, ScenarioError) as e:
+        return {'name': os.path.basename(path), 'scenario': path, 'status': 'failed', 'error': f"Invalid scenario: {e}"}
+    summary = ScenarioRunner(scenario).run()
+    summary['scenario'] = path
+    return summary
+
+
+def _run_in_worker(args):
+    return run_scenario_file(*args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ethiorisksurv_toolbox.cli',
+                                     description="Run EthioRiskSurv-Toolbox scenarios (risk map, sampling, cost, report) without the GUI.")
+    parser.add_argument('scenarios', nargs='+', help="Scenario files (.yaml, .yml or .json).")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Scenarios run in parallel, one process each (default: 1).")
+    parser.add_argument('--summary', help="Write the summaries of all scenarios to this JSON file.")
+    parser.add_argument('--log-level', choices=sorted(LOG_LEVELS), default='warning', help="QGIS message log level printed to stderr.")
+    parser.add_argument('--shard-by', metavar='FIELD', help="Run the scenario once per study area, identified by this attribute.")
+    parser.add_argument('--merge-into', metavar='GPKG', help="GeoPackage the study-area results are merged into (with --shard-by).")
+    parser.add_argument('--restart', action='store_true', help="With --shard-by, discard the results of a previous run instead of resuming.")
+    args = parser.parse_args(argv)
+
+    if args.shard_by:
+        if len(args.scenarios) != 1:
+            parser.error("--shard-by takes exactly one scenario.")
+        return run_sharded(args)
+
+    tasks = [(os.path.abspath(path), args.log_level) for path in args.scenarios]
+    if args.jobs > 1 and len(tasks) > 1:
+        # 'spawn' gives every worker a clean interpreter for its own QgsApplication
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(min(args.jobs, len(tasks))) as pool:
+            summaries = []
+            for summary in pool.imap_unordered(_run_in_worker, tasks):
+                _print_summary(summary)
+                summaries.append(summary)
+    else:
+        summaries = []
+        for task in tasks:
+            summary = run_scenario_file(*task)
+            _print_summary(summary)
+            summaries.append(summary)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2)
+    failed = [summary for summary in summaries if summary['status'] != 'ok']
+    print(f"{len(summaries) - len(failed)} of {len(summaries)} scenarios succeeded.")
+    return 1 if failed else 0
+
+
+def run_sharded(args):
+    """Runs one scenario per study area on a process pool (--shard-by)."""
+    init_qgis(args.log_level) # The scenario module needs processing; the shards run in their own processes
+    from .plugin.shard_runner import ShardRunner
+    from .plugin.scenario import load_scenario
+    scenario = load_scenario(os.path.abspath(args.scenarios[0]))
+    output_path = os.path.abspath(args.merge_into or os.path.join(scenario['output_dir'], f"{scenario['name']}_merged.gpkg"))
+    counts = ShardRunner(scenario, args.shard_by, output_path, args.jobs, log_level=args.log_level).run(restart=args.restart)
+    print(f"{counts['ok'] + counts['skipped']} of {counts['total']} study areas completed, {counts['failed']} failed. Results: {output_path}")
+    return 1 if counts['failed'] else 0
+
+
+def _print_summary(summary):
+    if summary['status'] == 'ok':
+        cost = summary.get('cost', {}).get('total_cost')
+        cost_text = f", total cost {cost:,.0f} ETB" if cost is not None else ""
+        print(f"OK      {summary['name']} ({sum(summary.get('timings', {}).values()):.1f} s{cost_text})")
+    else:
+        print(f"FAILED  {summary['name']}: {summary.get('error')}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
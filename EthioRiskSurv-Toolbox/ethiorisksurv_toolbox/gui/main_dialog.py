@@ -83,13 +83,16 @@ class Ui_EthioRiskSurvToolboxDialogBase(object):
         self.spinBox_resolution.setProperty("value", 1000)
         self.spinBox_resolution.setObjectName("spinBox_resolution")
         self.gridLayout_1.addWidget(self.spinBox_resolution, 8, 1, 1, 1)
+        self.checkBox_live_weights = QtWidgets.QCheckBox(self.tab_risk_analysis)
+        self.checkBox_live_weights.setObjectName("checkBox_live_weights")
+        self.gridLayout_1.addWidget(self.checkBox_live_weights, 9, 0, 1, 2)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
-        self.gridLayout_1.addItem(spacerItem, 9, 0, 1, 2)
+        self.gridLayout_1.addItem(spacerItem, 10, 0, 1, 2)
         self.btn_generate_risk_map = QtWidgets.QPushButton(self.tab_risk_analysis)
         self.btn_generate_risk_map.setMinimumSize(QtCore.QSize(0, 40))
         self.btn_generate_risk_map.setStyleSheet("background-color: #4CAF50; color: white; font-weight: bold;")
         self.btn_generate_risk_map.setObjectName("btn_generate_risk_map")
-        self.gridLayout_1.addWidget(self.btn_generate_risk_map, 10, 0, 1, 2)
+        self.gridLayout_1.addWidget(self.btn_generate_risk_map, 11, 0, 1, 2)
         self.tab_widget.addTab(self.tab_risk_analysis, "")
         self.tab_sampling = QtWidgets.QWidget()
         self.tab_sampling.setObjectName("tab_sampling")
@@ -254,6 +257,21 @@ class Ui_EthioRiskSurvToolboxDialogBase(object):
         self.spinBox_cost_per_km.setProperty("value", 20)
         self.spinBox_cost_per_km.setObjectName("spinBox_cost_per_km")
         self.formLayout_costs.setWidget(4, QtWidgets.QFormLayout.FieldRole, self.spinBox_cost_per_km)
+        self.label_candidate_bases = QtWidgets.QLabel(self.groupBox_costs)
+        self.label_candidate_bases.setObjectName("label_candidate_bases")
+        self.formLayout_costs.setWidget(5, QtWidgets.QFormLayout.LabelRole, self.label_candidate_bases)
+        self.mMapLayerComboBox_candidate_bases = QgsMapLayerComboBox(self.groupBox_costs)
+        self.mMapLayerComboBox_candidate_bases.setObjectName("mMapLayerComboBox_candidate_bases")
+        self.formLayout_costs.setWidget(5, QtWidgets.QFormLayout.FieldRole, self.mMapLayerComboBox_candidate_bases)
+        self.label_max_bases = QtWidgets.QLabel(self.groupBox_costs)
+        self.label_max_bases.setObjectName("label_max_bases")
+        self.formLayout_costs.setWidget(6, QtWidgets.QFormLayout.LabelRole, self.label_max_bases)
+        self.spinBox_max_bases = QtWidgets.QSpinBox(self.groupBox_costs)
+        self.spinBox_max_bases.setMinimum(1)
+        self.spinBox_max_bases.setMaximum(50)
+        self.spinBox_max_bases.setProperty("value", 1)
+        self.spinBox_max_bases.setObjectName("spinBox_max_bases")
+        self.formLayout_costs.setWidget(6, QtWidgets.QFormLayout.FieldRole, self.spinBox_max_bases)
         self.gridLayout_3.addWidget(self.groupBox_costs, 1, 0, 1, 2)
         self.line_4 = QtWidgets.QFrame(self.tab_cost)
         self.line_4.setFrameShape(QtWidgets.QFrame.HLine)
@@ -359,6 +377,7 @@ class Ui_EthioRiskSurvToolboxDialogBase(object):
         self.btn_add_factor.setText(_translate("EthioRiskSurvToolboxDialogBase", "Add Risk Factor"))
         self.btn_remove_factor.setText(_translate("EthioRiskSurvToolboxDialogBase", "Remove Selected Factor"))
         self.label_resolution.setText(_translate("EthioRiskSurvToolboxDialogBase", "Output Resolution (meters):"))
+        self.checkBox_live_weights.setText(_translate("EthioRiskSurvToolboxDialogBase", "Live weight tuning (keep factors in memory)"))
         self.btn_generate_risk_map.setText(_translate("EthioRiskSurvToolboxDialogBase", "GENERATE FINAL RISK MAP"))
         self.tab_widget.setTabText(self.tab_widget.indexOf(self.tab_risk_analysis), _translate("EthioRiskSurvToolboxDialogBase", "1. Risk Analysis"))
         self.label_sampling_inputs.setText(_translate("EthioRiskSurvToolboxDialogBase", "<b>1. Input Data</b>"))
@@ -385,6 +404,8 @@ class Ui_EthioRiskSurvToolboxDialogBase(object):
         self.label_7.setText(_translate("EthioRiskSurvToolboxDialogBase", "People per Field Team:"))
         self.label_8.setText(_translate("EthioRiskSurvToolboxDialogBase", "Samples Collected per Team per Day:"))
         self.label_9.setText(_translate("EthioRiskSurvToolboxDialogBase", "Vehicle Cost per Kilometer:"))
+        self.label_candidate_bases.setText(_translate("EthioRiskSurvToolboxDialogBase", "Candidate Field Bases (Optional):"))
+        self.label_max_bases.setText(_translate("EthioRiskSurvToolboxDialogBase", "Maximum Number of Field Bases:"))
         self.label_scenario_analysis.setText(_translate("EthioRiskSurvToolboxDialogBase", "<b>2. Scenario Analysis</b>"))
         item = self.table_scenarios.horizontalHeaderItem(0)
         item.setText(_translate("EthioRiskSurvToolboxDialogBase", "Scenario Name"))
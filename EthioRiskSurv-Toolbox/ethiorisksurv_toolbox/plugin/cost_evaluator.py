@@ -1,7 +1,52 @@
 # -*- coding: utf-8 -*-
 
 import math
-from qgis.core import QgsMessageLog, Qgis, QgsDistanceArea
+import numpy as np
+from qgis.core import QgsMessageLog, Qgis, QgsProject, QgsGeometry, QgsPointXY
+
+from ..utils import geodesy
+from ..utils import road_network
+from ..utils import tours
+from ..utils import facility_location
+from ..utils import cost_surface
+
+# How the travel to the sampling points is measured
+LOGISTICS_STRAIGHT_LINE = 'straight_line' # Round trip from HQ to each point, geodesic distance
+LOGISTICS_ROAD_NETWORK = 'road_network'   # Round trip from HQ to each point, shortest path over params['road_layer']
+LOGISTICS_TOURS = 'tours'                 # Daily multi-stop tours of samples_per_day points, geodesic legs
+LOGISTICS_FRICTION = 'friction'           # Round trip on foot from HQ to each point, travel time over params['friction_raster']
+
+# Cost parameters that a batch evaluation can vary, with the defaults used by calculate_total_cost
+COST_PARAMETERS = {'cost_per_sample': 0, 'cost_per_diem': 0, 'team_size': 1, 'samples_per_day': 1, 'cost_per_km': 0, 'cost_per_hour': 0}
+
+# Parameters that change the travel distances; the cached distances, times and tours depend on them
+ROUTING_PARAMETERS = ('logistics_mode', 'road_layer', 'friction_raster')
+
+try:
+    import pandas
+except ImportError:
+    pandas = None # pandas is optional; batch results are also available as NumPy columns
+
+def cost_columns(num_samples, field_days, distance_km, cost_per_sample, cost_per_diem, team_size, cost_per_km,
+                 travel_hours=0, cost_per_hour=0):
+    """
+    The cost model of CostEvaluator.calculate_total_cost on NumPy arrays,
+    which broadcast against each other.
+    :return: Dict of result columns.
+    """
+    fixed_costs = num_samples * cost_per_sample
+    personnel_costs = field_days * team_size * cost_per_diem
+    logistics_costs = distance_km * cost_per_km + travel_hours * cost_per_hour
+    total_cost = fixed_costs + personnel_costs + logistics_costs
+    return {
+        'field_days': field_days,
+        'distance_km': distance_km,
+        'fixed_costs': fixed_costs,
+        'personnel_costs': personnel_costs,
+        'logistics_costs': logistics_costs,
+        'total_cost': total_cost,
+        'total_cost_per_sample': total_cost / num_samples
+    }
 
 class CostEvaluator:
     """
@@ -12,14 +57,372 @@ class CostEvaluator:
         Constructor.
         :param sampling_layer: QgsVectorLayer of sampling points.
         :param cost_params: A dictionary containing all cost parameters from the UI.
+                            'logistics_mode' selects LOGISTICS_STRAIGHT_LINE (default),
+                            LOGISTICS_ROAD_NETWORK, which needs a line layer as 'road_layer',
+                            LOGISTICS_TOURS, or LOGISTICS_FRICTION, which needs a raster
+                            of travel minutes per metre as 'friction_raster' and costs
+                            the travel time at 'cost_per_hour'. 'hq_point' may also be a list of
+                            points, e.g. chosen by choose_bases: each sampling point
+                            is then served from its nearest base.
         """
         self.sampling_layer = sampling_layer
         self.params = cost_params
+        self.coordinates = None # (x, y) arrays of the sampling points, cached by point_coordinates
+        self.distances = None # One-way distances (m) from HQ to each point, cached by point_distances
+        self.travel_times = None # One-way travel times (minutes) from HQ to each point, cached by point_travel_times
+        self.tours_by_capacity = {} # samples_per_day -> list of tours.Tour, cached by plan_tours
+        self.base_choice = None # Summary of the last choose_bases call
+
+    def update_params(self, cost_params):
+        """
+        Replaces the cost parameters. Cached coordinates, distances and tours
+        are kept unless the HQ or the routing parameters changed, so a new
+        evaluation with other unit costs does not read the layer again.
+        """
+        old_hq, old_routing = self.hq_points(), [self.params.get(name) for name in ROUTING_PARAMETERS]
+        self.params = cost_params
+        new_hq, new_routing = self.hq_points(), [self.params.get(name) for name in ROUTING_PARAMETERS]
+        if old_hq != new_hq:
+            self.base_choice = None
+        if old_hq != new_hq or any(old is not new and old != new for old, new in zip(old_routing, new_routing)):
+            self.distances = None
+            self.travel_times = None
+            self.tours_by_capacity = {}
+
+    @property
+    def tours(self):
+        """Tours planned for the current samples_per_day, or None."""
+        return self.tours_by_capacity.get(max(1, int(self.params.get('samples_per_day', 1))))
+
+    def hq_points(self):
+        """
+        The HQ locations (field bases) from the cost parameters as a list of
+        QgsPointXY in the sampling layer's CRS; empty if none is set.
+        """
+        hq_points = self.params.get('hq_point')
+        if not isinstance(hq_points, (list, tuple)):
+            hq_points = [hq_points]
+        points = []
+        for hq_point in hq_points:
+            if isinstance(hq_point, QgsGeometry):
+                hq_point = hq_point.asPoint() if hq_point.isGeosValid() else None
+            if hq_point is not None:
+                points.append(hq_point)
+        return points
+
+    def hq_point(self):
+        """
+        The HQ location from the cost parameters as a QgsPointXY in the
+        sampling layer's CRS (the first base if there are several), or None
+        if it is not set.
+        """
+        hq_points = self.hq_points()
+        return hq_points[0] if hq_points else None
+
+    def point_coordinates(self, feedback=None):
+        """
+        Coordinates of the sampling points in the layer CRS, read once.
+        :return: (x, y) arrays, or None if feedback is canceled.
+        """
+        if self.coordinates is None:
+            coordinates = geodesy.layer_xy(self.sampling_layer, feedback=feedback)
+            if feedback is not None and feedback.isCanceled():
+                return None
+            self.coordinates = coordinates
+        return self.coordinates
+
+    def point_distances(self, feedback=None):
+        """
+        One-way distances in metres from the HQ to every sampling point. The
+        coordinates are read once into arrays and measured in a single
+        vectorized call (see geodesy.distances_from_point) with the project
+        ellipsoid; the result agrees with a per-point QgsDistanceArea
+        measurement within geodesy.GEODESIC_TOLERANCE and is cached for reuse.
+        In the road network mode, distances follow the roads instead. With
+        several bases, each point is measured from its nearest base.
+        :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+        :return: float64 array, or None.
+        """
+        if self.distances is not None:
+            return self.distances
+        hq_points = self.hq_points()
+        if not hq_points:
+            return None
+        coordinates = self.point_coordinates(feedback)
+        if coordinates is None:
+            return None
+        x, y = coordinates
+        if feedback is not None:
+            feedback.setProgress(50)
+        crs, ellipsoid = self.sampling_layer.crs(), QgsProject.instance().ellipsoid()
+        by_base = []
+        for hq_point in hq_points:
+            distances = geodesy.distances_from_point(x, y, hq_point, crs, ellipsoid)
+            if self.params.get('logistics_mode', LOGISTICS_STRAIGHT_LINE) == LOGISTICS_ROAD_NETWORK:
+                distances = self._road_distances(x, y, hq_point, crs, ellipsoid, distances, feedback)
+                if distances is None:
+                    return None
+            by_base.append(distances)
+        self.distances = by_base[0] if len(by_base) == 1 else np.min(by_base, axis=0)
+        if feedback is not None:
+            feedback.setProgress(100)
+        return self.distances
+
+    def _road_distances(self, x, y, hq_point, crs, ellipsoid, straight_line, feedback):
+        """
+        Distances over the road network, from the cached shortest-path tree
+        of the HQ (see road_network.shortest_path_tree). Points not connected
+        to the HQ's part of the network keep their straight-line distance.
+        """
+        road_layer = self.params.get('road_layer')
+        if road_layer is None:
+            raise ValueError("The road network logistics mode needs a 'road_layer'.")
+        tree = road_network.shortest_path_tree(road_layer, hq_point, crs, ellipsoid, feedback)
+        if feedback is not None and feedback.isCanceled():
+            return None
+        if tree is None:
+            raise ValueError(f"Road layer '{road_layer.name()}' has no line segments.")
+        distances = tree.distances_to(x, y, crs)
+        unreachable = ~np.isfinite(distances)
+        if unreachable.any():
+            QgsMessageLog.logMessage(f"{int(unreachable.sum())} sampling points are not connected to the HQ by road; "
+                                     "their straight-line distance is used.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+            distances = np.where(unreachable, straight_line, distances)
+        return distances
+
+    def point_travel_times(self, feedback=None):
+        """
+        One-way travel times in minutes from the HQ to every sampling point,
+        looked up in the travel time surface of the HQ over the friction
+        raster (see cost_surface.cost_surface). The surface is computed once
+        per raster and HQ and cached across evaluators, so a new sampling
+        plan only needs the lookups. With several bases, each point is
+        reached from its nearest base in time.
+        :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+        :return: float64 array, or None.
+        """
+        if self.travel_times is not None:
+            return self.travel_times
+        hq_points = self.hq_points()
+        if not hq_points:
+            return None
+        friction_raster = self.params.get('friction_raster')
+        if friction_raster is None:
+            raise ValueError("The friction logistics mode needs a 'friction_raster'.")
+        coordinates = self.point_coordinates(feedback)
+        if coordinates is None:
+            return None
+        x, y = coordinates
+        crs = self.sampling_layer.crs()
+        by_base = []
+        for hq_point in hq_points:
+            surface = cost_surface.cost_surface(friction_raster, hq_point, crs, feedback)
+            if surface is None:
+                return None
+            by_base.append(surface.times_to(x, y, crs))
+        times = np.min(by_base, axis=0)
+        unreachable = ~np.isfinite(times)
+        if unreachable.any():
+            # Outside the raster or cut off from the HQ: straight line at the typical friction
+            straight_line = self.point_distances(feedback)
+            if straight_line is None:
+                return None
+            QgsMessageLog.logMessage(f"{int(unreachable.sum())} sampling points cannot be reached from the HQ over the friction raster; "
+                                     "their straight-line distance at the median friction is used.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+            times = np.where(unreachable, straight_line * cost_surface.friction_grid(friction_raster).median_friction, times)
+        self.travel_times = times
+        return self.travel_times
 
-    def calculate_total_cost(self):
+    def travel_hours(self, feedback=None):
+        """
+        Round-trip travel time in hours from the HQ to all sampling points in
+        the friction mode, 0 in the other modes.
+        :return: float, or None if feedback is canceled.
+        """
+        if self.params.get('logistics_mode', LOGISTICS_STRAIGHT_LINE) != LOGISTICS_FRICTION or self.hq_point() is None:
+            return 0.0
+        times = self.point_travel_times(feedback)
+        if times is None:
+            return None
+        return 2 * float(times.sum()) / 60
+
+    def plan_tours(self, feedback=None, samples_per_day=None):
+        """
+        Daily tours from the HQ visiting at most samples_per_day points each,
+        ordered by nearest neighbour, 2-opt and Or-opt (see tours.plan_tours).
+        With several bases, each base plans the tours of its nearest points.
+        :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+        :param samples_per_day: Defaults to the cost parameter.
+        :return: List of tours.Tour, or None.
+        """
+        if samples_per_day is None:
+            samples_per_day = self.params.get('samples_per_day', 1)
+        capacity = max(1, int(samples_per_day))
+        if capacity in self.tours_by_capacity:
+            return self.tours_by_capacity[capacity]
+        hq_points = self.hq_points()
+        if not hq_points:
+            return None
+        coordinates = self.point_coordinates(feedback)
+        if coordinates is None:
+            return None
+        x, y = coordinates
+        crs, ellipsoid = self.sampling_layer.crs(), QgsProject.instance().ellipsoid()
+        if len(hq_points) == 1:
+            planned = tours.plan_tours(x, y, hq_points[0], crs, ellipsoid, capacity, feedback)
+        else:
+            bx, by = np.array([[p.x(), p.y()] for p in hq_points]).T
+            nearest = np.argmin(geodesy.distances_between(bx[:, None], by[:, None], x[None, :], y[None, :], crs, ellipsoid), axis=0)
+            planned = []
+            for base, hq_point in enumerate(hq_points):
+                members = np.flatnonzero(nearest == base)
+                if len(members) == 0:
+                    continue
+                base_tours = tours.plan_tours(x[members], y[members], hq_point, crs, ellipsoid, capacity, feedback)
+                if base_tours is None:
+                    return None
+                planned.extend(tours.Tour(members[tour.points], tour.length) for tour in base_tours)
+        if planned is not None:
+            self.tours_by_capacity[capacity] = planned
+        return planned
+
+    def choose_bases(self, candidate_layer, max_bases=1, cost_per_base=0, compute_bound=False, feedback=None):
+        """
+        Chooses the field bases among the points of candidate_layer (towns,
+        veterinary clinics) that minimize the logistics costs of the sampling
+        plan, and makes them the HQ of this evaluator. For every number of
+        bases from 1 to max_bases, the p-median problem on the straight-line
+        distances is solved (see facility_location); the number with the
+        lowest logistics costs plus cost_per_base per base is kept.
+        :param candidate_layer: QgsVectorLayer of candidate points, in any CRS.
+        :param max_bases: Largest number of bases to open.
+        :param cost_per_base: Cost of running one base for the survey.
+        :param compute_bound: Also compute a lower bound on the optimal distance
+                              (facility_location.lagrangian_bound) to report the
+                              optimality 'gap'; this takes much longer than the choice.
+        :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+        :return: Dict with the chosen 'bases' ([x, y] in the sampling layer's CRS),
+                 their 'candidates' (row indices in the candidate layer), the costs
+                 'by_num_bases' and the optimality 'gap' (None unless compute_bound);
+                 None if there is nothing to choose.
+        """
+        coordinates = self.point_coordinates(feedback)
+        if coordinates is None or len(coordinates[0]) == 0:
+            return None
+        x, y = coordinates
+        crs, ellipsoid = self.sampling_layer.crs(), QgsProject.instance().ellipsoid()
+        cx, cy = geodesy.layer_xy(candidate_layer, feedback=feedback)
+        if feedback is not None and feedback.isCanceled():
+            return None
+        if len(cx) == 0:
+            QgsMessageLog.logMessage(f"Candidate layer '{candidate_layer.name()}' has no points.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+            return None
+        cx, cy = geodesy.transform_xy(cx, cy, candidate_layer.crs(), crs)
+        matrix = facility_location.distance_matrix(cx, cy, x, y, crs, ellipsoid, feedback)
+        if matrix is None:
+            return None
+
+        cost_per_km = self.params.get('cost_per_km', 0)
+        order = facility_location.greedy(matrix, max(1, int(max_bases)))
+        solutions = [facility_location.PMedianSolution(facility_location.interchange(matrix, order[:count]), matrix)
+                     for count in range(1, len(order) + 1)]
+        # Round trips from the nearest base, as in calculate_total_cost
+        by_num_bases = [{'num_bases': len(solution.bases), 'distance_km': 2 * solution.total / 1000,
+                         'logistics_costs': 2 * solution.total / 1000 * cost_per_km,
+                         'total': 2 * solution.total / 1000 * cost_per_km + len(solution.bases) * cost_per_base}
+                        for solution in solutions]
+        best = solutions[int(np.argmin([row['total'] for row in by_num_bases]))]
+        if compute_bound:
+            best.lower_bound = facility_location.lagrangian_bound(matrix, len(best.bases), best.total)
+        bases = [QgsPointXY(float(cx[index]), float(cy[index])) for index in best.bases]
+
+        self.update_params(dict(self.params, hq_point=bases if len(bases) > 1 else bases[0]))
+        self.base_choice = {
+            'bases': [[point.x(), point.y()] for point in bases],
+            'candidates': best.bases,
+            'num_bases': len(bases),
+            'num_candidates': len(cx),
+            'samples_per_base': np.bincount(best.assignment, minlength=len(bases)).tolist(),
+            'gap': float(best.gap) if compute_bound else None,
+            'by_num_bases': by_num_bases
+        }
+        gap = f" (optimality gap at most {100 * best.gap:.1f}%)" if compute_bound else ""
+        QgsMessageLog.logMessage(f"Chose {len(bases)} of {len(cx)} candidate bases{gap}.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        return self.base_choice
+
+    def field_days_and_distance(self, samples_per_day, feedback=None):
+        """
+        Field days and total travel distance for each value of samples_per_day.
+        Distances are computed once (or, for tours, once per distinct value).
+        :param samples_per_day: NumPy array.
+        :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+        :return: (field_days, distance_km) arrays, or None.
+        """
+        num_samples = self.sampling_layer.featureCount()
+        if self.hq_point() is None:
+            return np.ceil(num_samples / samples_per_day), np.zeros(len(samples_per_day))
+        if self.params.get('logistics_mode', LOGISTICS_STRAIGHT_LINE) == LOGISTICS_TOURS:
+            values, inverse = np.unique(samples_per_day, return_inverse=True)
+            field_days, distance_km = np.empty(len(values)), np.empty(len(values))
+            for i, value in enumerate(values):
+                planned = self.plan_tours(feedback, value)
+                if planned is None:
+                    return None
+                field_days[i], distance_km[i] = len(planned), sum(tour.length for tour in planned) / 1000
+            return field_days[inverse], distance_km[inverse]
+        if self.params.get('logistics_mode', LOGISTICS_STRAIGHT_LINE) == LOGISTICS_FRICTION:
+            # Travel is costed by time (see travel_hours), not by distance
+            return np.ceil(num_samples / samples_per_day), np.zeros(len(samples_per_day))
+        distances = self.point_distances(feedback)
+        if distances is None:
+            return None
+        distance_km = np.full(len(samples_per_day), 2 * float(distances.sum()) / 1000)
+        return np.ceil(num_samples / samples_per_day), distance_km
+
+    def evaluate_grid(self, param_grid, feedback=None, as_dataframe=False):
+        """
+        Evaluates every combination of cost parameter values at once, e.g. for
+        a sensitivity analysis. The sampling points are read and the
+        distances computed only once; the costs of all combinations are then
+        computed with NumPy, in the same way as calculate_total_cost.
+
+            evaluator.evaluate_grid({'cost_per_km': [10, 20, 30], 'team_size': [2, 3]})
+
+        :param param_grid: Dict of parameter name (see COST_PARAMETERS) -> list of
+                           values; parameters not in it keep their value from params.
+        :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+        :param as_dataframe: Return a pandas DataFrame instead of a dict of columns.
+        :return: One row per combination, with the parameter values followed by
+                 the columns of cost_columns(); None if the layer is empty or canceled.
+        """
+        unknown = set(param_grid) - set(COST_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown cost parameters: {', '.join(sorted(unknown))}")
+        if as_dataframe and pandas is None:
+            raise ImportError("pandas is not installed")
+        num_samples = self.sampling_layer.featureCount() if self.sampling_layer else 0
+        if num_samples == 0:
+            QgsMessageLog.logMessage("No sampling points to evaluate.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+            return None
+
+        values = [np.atleast_1d(np.asarray(param_grid.get(name, self.params.get(name, default)), dtype=np.float64))
+                  for name, default in COST_PARAMETERS.items()]
+        columns = {name: grid.ravel() for name, grid in zip(COST_PARAMETERS, np.meshgrid(*values, indexing='ij'))}
+        travel = self.field_days_and_distance(columns['samples_per_day'], feedback)
+        travel_hours = self.travel_hours(feedback) if travel is not None else None
+        if travel_hours is None:
+            return None
+        columns.update(cost_columns(num_samples, *travel, columns['cost_per_sample'], columns['cost_per_diem'],
+                                    columns['team_size'], columns['cost_per_km'], travel_hours, columns['cost_per_hour']))
+        QgsMessageLog.logMessage(f"Evaluated {len(columns['total_cost'])} cost scenarios.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        return pandas.DataFrame(columns) if as_dataframe else columns
+
+    def calculate_total_cost(self, feedback=None):
         """
         Calculates the total estimated cost for the given surveillance plan.
         Returns a dictionary with detailed cost breakdowns.
+        :param feedback: Optional QgsFeedback for progress and cancellation;
+                         None is returned if it is canceled.
         """
         QgsMessageLog.logMessage("Starting cost evaluation.", "EthioRiskSurv-Toolbox", Qgis.Info)
 
@@ -43,25 +446,42 @@ class CostEvaluator:
         personnel_costs = total_field_days * team_size * cost_per_diem
 
         # --- 4. Calculate Logistics (Travel) Costs ---
-        # For this version, we use simple straight-line distance.
-        # An advanced version would use a road network and a routing algorithm.
+        # Straight-line distance by default, the shortest path over a road network,
+        # daily tours visiting several points, or walking time over a friction raster.
+        logistics_mode = self.params.get('logistics_mode', LOGISTICS_STRAIGHT_LINE)
         logistics_costs = 0
-        hq_point = self.params.get('hq_point')
         cost_per_km = self.params.get('cost_per_km', 0)
+        cost_per_hour = self.params.get('cost_per_hour', 0)
+        travel_hours = 0
+        hq_point = self.hq_point()
+        field_tours = None
 
-        if hq_point and hq_point.isGeosValid():
-            d = QgsDistanceArea()
-            d.setEllipsoid(QgsProject.instance().ellipsoid())
+        if hq_point is not None and logistics_mode == LOGISTICS_FRICTION:
+            travel_hours = self.travel_hours(feedback)
+            if travel_hours is None:
+                return None
             total_distance_m = 0
-            for point_feature in self.sampling_layer.getFeatures():
-                point_geom = point_feature.geometry()
-                # Distance from HQ to point and back
-                distance = d.measureLine(hq_point, point_geom.asPoint()) * 2
-                total_distance_m += distance
-            
+            QgsMessageLog.logMessage(f"Total travel time calculated: {travel_hours:.2f} h", "EthioRiskSurv-Toolbox", Qgis.Info)
+        elif hq_point is not None and logistics_mode == LOGISTICS_TOURS:
+            field_tours = self.plan_tours(feedback)
+            if field_tours is None:
+                return None
+            # One tour per team day: the per diem follows the planned days
+            total_field_days = len(field_tours)
+            personnel_costs = total_field_days * team_size * cost_per_diem
+            total_distance_m = sum(tour.length for tour in field_tours)
+        elif hq_point is not None:
+            distances = self.point_distances(feedback)
+            if distances is None:
+                return None
+            # Distance from HQ to each point and back
+            total_distance_m = 2 * float(distances.sum())
+
+        if hq_point is not None:
             total_distance_km = total_distance_m / 1000
-            logistics_costs = total_distance_km * cost_per_km
-            QgsMessageLog.logMessage(f"Total travel distance calculated: {total_distance_km:.2f} km", "EthioRiskSurv-Toolbox", Qgis.Info)
+            logistics_costs = total_distance_km * cost_per_km + travel_hours * cost_per_hour
+            if logistics_mode != LOGISTICS_FRICTION:
+                QgsMessageLog.logMessage(f"Total travel distance calculated: {total_distance_km:.2f} km", "EthioRiskSurv-Toolbox", Qgis.Info)
         else:
             QgsMessageLog.logMessage("HQ point not set. Logistics costs will be zero.", "EthioRiskSurv-Toolbox", Qgis.Warning)
 
@@ -73,12 +493,20 @@ class CostEvaluator:
             'num_samples': num_samples,
             'total_cost': total_cost,
             'cost_per_sample': cost_per_sample_final,
+            'logistics_mode': logistics_mode,
             'breakdown': {
                 'fixed_costs': fixed_costs,
                 'personnel_costs': personnel_costs,
                 'logistics_costs': logistics_costs
             }
         }
+        if logistics_mode == LOGISTICS_FRICTION:
+            results['travel_hours'] = travel_hours
+        if self.base_choice is not None:
+            results['base_choice'] = self.base_choice
+        if field_tours is not None:
+            results['field_days'] = total_field_days
+            results['tours'] = [{'num_samples': len(tour), 'distance_km': tour.length / 1000} for tour in field_tours]
         
         QgsMessageLog.logMessage(f"Cost evaluation complete. Total estimated cost: {total_cost:.2f} ETB", "EthioRiskSurv-Toolbox", Qgis.Success)
         return results
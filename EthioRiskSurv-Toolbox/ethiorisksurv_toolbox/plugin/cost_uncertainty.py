@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+Monte Carlo uncertainty of the surveillance cost.
+
+The unit costs and the daily sampling rate are drawn from distributions
+instead of being point estimates, and the cost model of CostEvaluator is
+evaluated for every draw with NumPy over the evaluator's cached distances.
+The result is a set of percentiles of the total cost and its components.
+
+    distributions = {
+        'cost_per_km': {'distribution': 'triangular', 'low': 15, 'mode': 20, 'high': 35},
+        'cost_per_diem': {'distribution': 'normal', 'mean': 1000, 'sd': 100},
+        'samples_per_day': {'distribution': 'choice', 'values': [8, 10, 12]}
+    }
+    result = simulate_costs(evaluator, distributions, draws=100000, seed=42)
+    result['percentiles']['total_cost'][95]
+
+Draws are generated in fixed-size chunks, each with its own random stream
+spawned from the seed, so a given seed gives the same draws whether the
+chunks run in this process or across several worker processes.
+"""
+
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from qgis.core import QgsMessageLog, Qgis
+
+from .cost_evaluator import cost_columns, COST_PARAMETERS, LOGISTICS_STRAIGHT_LINE, LOGISTICS_TOURS
+
+DEFAULT_DRAWS = 100000
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_SIZE = 10000 # Draws per random stream and per worker task
+
+# Distributions and their parameters
+DISTRIBUTION_FIXED = 'fixed'           # value
+DISTRIBUTION_UNIFORM = 'uniform'       # low, high
+DISTRIBUTION_TRIANGULAR = 'triangular' # low, mode, high
+DISTRIBUTION_PERT = 'pert'             # low, mode, high (beta-PERT)
+DISTRIBUTION_NORMAL = 'normal'         # mean, sd; negative draws are clipped to 0
+DISTRIBUTION_LOGNORMAL = 'lognormal'   # mean, sd of the values (not of their logarithm)
+DISTRIBUTION_CHOICE = 'choice'         # values, optional weights
+
+DISTRIBUTION_PARAMETERS = {
+    DISTRIBUTION_FIXED: ('value',),
+    DISTRIBUTION_UNIFORM: ('low', 'high'),
+    DISTRIBUTION_TRIANGULAR: ('low', 'mode', 'high'),
+    DISTRIBUTION_PERT: ('low', 'mode', 'high'),
+    DISTRIBUTION_NORMAL: ('mean', 'sd'),
+    DISTRIBUTION_LOGNORMAL: ('mean', 'sd'),
+    DISTRIBUTION_CHOICE: ('values',)
+}
+
+RESULT_COLUMNS = ('total_cost', 'total_cost_per_sample', 'fixed_costs', 'personnel_costs', 'logistics_costs')
+
+
+def normalize_distribution(spec):
+    """
+    Checks a distribution specification; a plain number is a fixed value.
+    :return: The specification as a dict with a 'distribution' key.
+    """
+    if isinstance(spec, (int, float)):
+        return {'distribution': DISTRIBUTION_FIXED, 'value': float(spec)}
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid distribution: {spec!r}")
+    name = spec.get('distribution')
+    if name not in DISTRIBUTION_PARAMETERS:
+        raise ValueError(f"Unknown distribution: {name!r}")
+    missing = [key for key in DISTRIBUTION_PARAMETERS[name] if key not in spec]
+    if missing:
+        raise ValueError(f"The {name} distribution needs {', '.join(missing)}.")
+    if name in (DISTRIBUTION_UNIFORM, DISTRIBUTION_TRIANGULAR, DISTRIBUTION_PERT):
+        low, high = spec['low'], spec['high']
+        if not low <= spec.get('mode', low) <= high or low == high and name == DISTRIBUTION_PERT:
+            raise ValueError(f"Invalid {name} distribution bounds: {spec!r}")
+    if name in (DISTRIBUTION_NORMAL, DISTRIBUTION_LOGNORMAL) and spec['sd'] < 0:
+        raise ValueError(f"Negative standard deviation: {spec!r}")
+    if name == DISTRIBUTION_LOGNORMAL and spec['mean'] <= 0:
+        raise ValueError(f"The lognormal distribution needs a positive mean: {spec!r}")
+    if name == DISTRIBUTION_CHOICE and not len(spec['values']):
+        raise ValueError("The choice distribution needs at least one value.")
+    return dict(spec)
+
+
+def distribution_support(spec):
+    """(low, high) range of a normalized distribution, or None if unbounded above."""
+    name = spec['distribution']
+    if name == DISTRIBUTION_FIXED:
+        return spec['value'], spec['value']
+    if name == DISTRIBUTION_CHOICE:
+        return min(spec['values']), max(spec['values'])
+    if name in (DISTRIBUTION_UNIFORM, DISTRIBUTION_TRIANGULAR, DISTRIBUTION_PERT):
+        return spec['low'], spec['high']
+    return None
+
+
+def sample(spec, size, rng):
+    """Draws size values from a normalized distribution with a numpy Generator."""
+    name = spec['distribution']
+    if name == DISTRIBUTION_FIXED:
+        return np.full(size, float(spec['value']))
+    if name == DISTRIBUTION_UNIFORM:
+        return rng.uniform(spec['low'], spec['high'], size)
+    if name == DISTRIBUTION_TRIANGULAR:
+        if spec['low'] == spec['high']:
+            return np.full(size, float(spec['low']))
+        return rng.triangular(spec['low'], spec['mode'], spec['high'], size)
+    if name == DISTRIBUTION_PERT:
+        low, mode, high = spec['low'], spec['mode'], spec['high']
+        alpha = 1 + 4 * (mode - low) / (high - low)
+        beta = 1 + 4 * (high - mode) / (high - low)
+        return low + rng.beta(alpha, beta, size) * (high - low)
+    if name == DISTRIBUTION_NORMAL:
+        return np.maximum(rng.normal(spec['mean'], spec['sd'], size), 0.0)
+    if name == DISTRIBUTION_LOGNORMAL:
+        sigma2 = math.log(1 + (spec['sd'] / spec['mean']) ** 2)
+        return rng.lognormal(math.log(spec['mean']) - sigma2 / 2, math.sqrt(sigma2), size)
+    values = np.asarray(spec['values'], dtype=np.float64)
+    weights = spec.get('weights')
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    return rng.choice(values, size, p=weights)
+
+
+class CostModel:
+    """
+    Everything the cost model needs about one sampling plan, small and
+    picklable so that it can be sent to worker processes: the number of
+    samples and the travel distance (or, over a friction raster, the travel
+    time), or, for daily tours, the field days and distance of the tours
+    planned for each daily capacity.
+    """
+    def __init__(self, num_samples, distance_km=0.0, tour_capacities=None, tour_days=None, tour_km=None, travel_hours=0.0):
+        self.num_samples = num_samples
+        self.distance_km = distance_km
+        self.travel_hours = travel_hours
+        self.tour_capacities = tour_capacities
+        self.tour_days = tour_days
+        self.tour_km = tour_km
+
+    @classmethod
+    def from_evaluator(cls, evaluator, samples_per_day_range=None, feedback=None):
+        """
+        Computes (or reuses) the evaluator's distances, or its tours for every
+        whole samples_per_day in samples_per_day_range.
+        :return: CostModel, or None if feedback is canceled.
+        """
+        num_samples = evaluator.sampling_layer.featureCount()
+        tours = evaluator.params.get('logistics_mode', LOGISTICS_STRAIGHT_LINE) == LOGISTICS_TOURS
+        if tours and evaluator.hq_point() is not None:
+            low, high = samples_per_day_range
+            capacities = np.arange(max(1, int(low)), max(1, int(high)) + 1, dtype=np.float64)
+            travel = evaluator.field_days_and_distance(capacities, feedback)
+            if travel is None:
+                return None
+            return cls(num_samples, tour_capacities=capacities, tour_days=travel[0], tour_km=travel[1])
+        travel = evaluator.field_days_and_distance(np.ones(1), feedback)
+        travel_hours = evaluator.travel_hours(feedback) if travel is not None else None
+        if travel_hours is None:
+            return None
+        return cls(num_samples, distance_km=float(travel[1][0]), travel_hours=travel_hours)
+
+    def field_days_and_distance(self, samples_per_day):
+        if self.tour_capacities is None:
+            return np.ceil(self.num_samples / samples_per_day), np.full(len(samples_per_day), self.distance_km)
+        index = np.clip(np.floor(samples_per_day), self.tour_capacities[0], self.tour_capacities[-1]) - self.tour_capacities[0]
+        index = index.astype(np.int64)
+        return self.tour_days[index], self.tour_km[index]
+
+    def evaluate(self, parameters):
+        """Cost columns for arrays of parameter values."""
+        samples_per_day = np.maximum(parameters['samples_per_day'], 1.0)
+        field_days, distance_km = self.field_days_and_distance(samples_per_day)
+        return cost_columns(self.num_samples, field_days, distance_km, parameters['cost_per_sample'],
+                            parameters['cost_per_diem'], parameters['team_size'], parameters['cost_per_km'],
+                            self.travel_hours, parameters['cost_per_hour'])
+
+
+def simulate_chunk(model, distributions, seed_sequence, size):
+    """
+    Evaluates size draws with the random stream of one chunk. Runs in
+    worker processes, so it only takes picklable arguments.
+    :return: Dict of the sampled parameters and RESULT_COLUMNS.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    parameters = {name: sample(distributions[name], size, rng) for name in COST_PARAMETERS}
+    results = model.evaluate(parameters)
+    parameters.update({column: np.asarray(results[column], dtype=np.float64) for column in RESULT_COLUMNS})
+    return parameters
+
+
+def simulate_costs(evaluator, distributions, draws=DEFAULT_DRAWS, seed=None, jobs=1, percentiles=DEFAULT_PERCENTILES,
+                   return_samples=False, feedback=None):
+    """
+    Monte Carlo simulation of the total cost of a CostEvaluator's plan.
+    :param distributions: Dict of cost parameter (see COST_PARAMETERS) -> distribution
+                          specification or number; other parameters keep their value
+                          from evaluator.params. In the tours mode, samples_per_day
+                          needs a bounded distribution (tours are planned for each
+                          whole value in its range).
+    :param draws: Number of draws.
+    :param seed: Integer seed; the same seed gives the same result for any jobs.
+    :param jobs: Worker processes; 1 runs in this process (as needed inside QGIS).
+    :param percentiles: Percentiles to report, 0-100.
+    :param return_samples: Also return every draw, as a dict of NumPy columns.
+    :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+    :return: Dict with 'draws', 'seed', 'mean' and 'percentiles' (column ->
+             {percentile: value}) for RESULT_COLUMNS, and 'samples' if requested.
+    """
+    unknown = set(distributions) - set(COST_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown cost parameters: {', '.join(sorted(unknown))}")
+    if draws < 1:
+        raise ValueError("At least one draw is needed.")
+    specs = {name: normalize_distribution(distributions.get(name, evaluator.params.get(name, default)))
+             for name, default in COST_PARAMETERS.items()}
+    if not evaluator.sampling_layer or evaluator.sampling_layer.featureCount() == 0:
+        QgsMessageLog.logMessage("No sampling points to evaluate.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+        return None
+
+    samples_per_day_range = distribution_support(specs['samples_per_day'])
+    if samples_per_day_range is None and evaluator.params.get('logistics_mode') == LOGISTICS_TOURS:
+        raise ValueError("With daily tours, samples_per_day needs a bounded distribution (uniform, triangular, pert or choice).")
+    model = CostModel.from_evaluator(evaluator, samples_per_day_range, feedback)
+    if model is None:
+        return None
+
+    seed_sequence = np.random.SeedSequence(seed)
+    sizes = [min(CHUNK_SIZE, draws - start) for start in range(0, draws, CHUNK_SIZE)]
+    streams = seed_sequence.spawn(len(sizes))
+    chunks = []
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            futures = [executor.submit(simulate_chunk, model, specs, stream, size) for stream, size in zip(streams, sizes)]
+            for future in futures:
+                if feedback is not None and feedback.isCanceled():
+                    return None
+                chunks.append(future.result())
+                if feedback is not None:
+                    feedback.setProgress(100 * len(chunks) / len(sizes))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        for stream, size in zip(streams, sizes):
+            if feedback is not None:
+                if feedback.isCanceled():
+                    return None
+                feedback.setProgress(100 * len(chunks) / len(sizes))
+            chunks.append(simulate_chunk(model, specs, stream, size))
+
+    samples = {column: np.concatenate([chunk[column] for chunk in chunks]) for column in chunks[0]}
+    result = {
+        'draws': draws,
+        'seed': seed,
+        'mean': {column: float(samples[column].mean()) for column in RESULT_COLUMNS},
+        'percentiles': {column: dict(zip(percentiles, np.percentile(samples[column], percentiles).tolist())) for column in RESULT_COLUMNS}
+    }
+    if return_samples:
+        result['samples'] = samples
+    median = np.percentile(samples['total_cost'], 50)
+    QgsMessageLog.logMessage(f"Cost simulation of {draws} draws complete. Median total cost: {median:.2f} ETB", "EthioRiskSurv-Toolbox", Qgis.Success)
+    return result
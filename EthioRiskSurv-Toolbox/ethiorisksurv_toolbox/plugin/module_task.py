@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import traceback
+from qgis.PyQt.QtCore import Qt
+from qgis.core import QgsMessageLog, Qgis, QgsApplication, QgsTask, QgsProcessingFeedback, QgsMapLayer
+
+class ModuleTask(QgsTask):
+    """
+    Runs the work of one module (risk analysis, classification, sampling,
+    cost evaluation or report) in the background. The work function receives
+    a QgsProcessingFeedback whose progress is shown in the QGIS task manager
+    and which is canceled with the task; its return value is handed to
+    on_finished in the main thread.
+
+    The work function must only use layers that belong to no project (see
+    gis_utils.detach_layer); map layers it returns are moved to the main
+    thread so they can be added to the project.
+    """
+    def __init__(self, description, work, on_finished=None):
+        """
+        Constructor.
+        :param description: Shown in the task manager.
+        :param work: Callable(feedback) returning the module's result; None or False means failure.
+        :param on_finished: Optional callable(success, result) called in the main thread.
+        """
+        super().__init__(description, QgsTask.CanCancel)
+        self.work = work
+        self.on_finished = on_finished
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.setProgress, Qt.DirectConnection)
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.work(self.feedback)
+        except Exception as e:
+            self.error = e
+            QgsMessageLog.logMessage(f"{self.description()} failed: {e}\n{traceback.format_exc()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return False
+        _move_to_main_thread(self.result)
+        return not self.isCanceled() and self.result is not None and self.result is not False
+
+    def cancel(self):
+        self.feedback.cancel() # Stops the module at its next check, including running processing algorithms
+        super().cancel()
+
+    def finished(self, success):
+        if self.isCanceled():
+            QgsMessageLog.logMessage(f"{self.description()} canceled.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+        if self.on_finished is not None:
+            self.on_finished(success, self.result)
+
+def _move_to_main_thread(result):
+    """Hands map layers created in the task's thread over to the main thread."""
+    if isinstance(result, QgsMapLayer):
+        result.moveToThread(QgsApplication.instance().thread())
+    elif isinstance(result, (tuple, list)):
+        for item in result:
+            _move_to_main_thread(item)
+    elif isinstance(result, dict):
+        for item in result.values():
+            _move_to_main_thread(item)
+
+def start_task(task):
+    """Adds a task to the QGIS task manager. :return: The task, to keep a reference to."""
+    QgsApplication.taskManager().addTask(task)
+    return task
@@ -1,96 +1,157 @@
 # -*- coding: utf-8 -*-
 
 import os
-import processing
-from qgis.core import QgsMessageLog, Qgis, QgsVectorLayer, QgsRasterLayer, QgsProject, QgsProcessingContext, QgsProcessingFeedback, QgsRasterCalculator, QgsRasterCalculatorEntry
-from ..utils.gis_utils import normalize_raster
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from qgis.core import QgsMessageLog, Qgis, QgsVectorLayer, QgsRasterLayer, QgsProject, QgsRectangle
+from qgis.analysis import QgsRasterCalculator, QgsRasterCalculatorEntry
+from ..utils.gis_utils import normalize_raster, NORMALIZED_GTIFF, NORMALIZED_VRT
 from ..utils import logger
+from ..utils import raster_engine
+from ..utils.intermediate_store import IntermediateStore, STORAGE_PROJECT, DEFAULT_MEMORY_BUDGET_MB
+from ..utils.output_profile import OutputProfile, replace_raster
+from ..utils.overviews import ensure_overviews, OVERVIEWS_ASYNC
+from ..utils.pipeline import Pipeline
+from .risk_preview import RiskPreview, DEFAULT_PREVIEW_RESOLUTION
+
+# Overlay engines supported by RiskAnalyzer.run
+ENGINE_QGIS = 'qgis'     # QgsRasterCalculator, intermediate rasters in the project home
+ENGINE_NUMPY = 'numpy'   # Factors read once through GDAL and combined in memory
+ENGINE_STREAMING = 'streaming'  # Same as 'numpy', but window by window for rasters bigger than RAM
+
+DEFAULT_BLOCK_SIZE = 1024  # pixels per side of a streaming window
+
+LOWER_IS_HIGHER_RISK = 'Lower values = Higher Risk'
+
+# Relative progress weights of the parts of a run (see utils.pipeline)
+PART_WEIGHTS = {'vector_factor': 4, 'raster_factor': 1, 'clip': 1, 'overlay': 2, 'write': 1}
+# Share of its factor's part taken by each stage; a factor part is completed when the factor is ready
+STAGE_SHARES = {'proximity': 0.7, 'align': 0.5, 'normalize': 0.3, 'invert': 0.3, 'cache': 0.3}
 
 class RiskAnalyzer:
     """
     Handles all core logic for Module 1: Risk Analysis.
     """
-    def __init__(self, study_area_layer, risk_factors, resolution, project_name):
+    def __init__(self, study_area_layer, risk_factors, resolution, project_name, engine=ENGINE_QGIS, block_size=DEFAULT_BLOCK_SIZE, workers=1, cache=None, minmax_mode=raster_engine.MINMAX_EXACT, intermediate_format=NORMALIZED_GTIFF,
+                 storage=STORAGE_PROJECT, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, scratch_dir=None,
+                 distance_method=raster_engine.DISTANCE_AUTO, resampling='near', snap_origin=None, align_factors=False,
+                 output_profile=None, overviews=OVERVIEWS_ASYNC):
         self.study_area_layer = study_area_layer
         self.risk_factors = risk_factors
         self.resolution = resolution
         self.project_name = project_name
+        self.engine = engine
+        self.block_size = block_size
+        self.workers = workers
+        self.cache = cache # Optional utils.factor_cache.FactorCache
+        self.minmax_mode = minmax_mode
+        self.intermediate_format = intermediate_format
+        self.storage = storage # Where intermediates go, see utils.intermediate_store
+        self.memory_budget_mb = memory_budget_mb
+        self.scratch_dir = scratch_dir
+        self.store = None
+        self.distance_method = distance_method # EDT used for vector factors
+        self.resampling = resampling # GDAL kernel used to bring factors onto the grid
+        self.snap_origin = snap_origin # (x, y) the canonical grid is snapped to, None for the study-area extent
+        self.align_factors = align_factors # Warp each raster factor once onto the grid (cached with self.cache)
+        self.output_profile = output_profile or OutputProfile() # Layout/encoding of the risk map, see utils.output_profile
+        self.overviews = overviews # utils.overviews mode for a risk map written without overviews
+        self.overview_task = None
+        self.factor_timings = []
+        self.pipeline = None # utils.pipeline.Pipeline of the current (or last) run
+        self.timing_summary = None # Pipeline.summary() of the last run
         self.project = QgsProject.instance()
         self.output_layers = []
 
-    def run(self):
-        """Main execution method for risk analysis."""
+    def run(self, feedback=None):
+        """
+        Main execution method for risk analysis.
+        :param feedback: Optional QgsProcessingFeedback for progress and cancellation.
+        :return: (success, final_risk_map) tuple; final_risk_map is None on failure.
+        """
+        path = self.produce(feedback)
+        if path is None:
+            return False, None
+        return self.load_risk_map(path)
+
+    def produce(self, feedback=None):
+        """
+        Computes and writes the risk map without touching the project, so it
+        can run in a QgsTask; load_risk_map() then adds it from the main thread.
+        :param feedback: Optional QgsProcessingFeedback for progress and cancellation.
+        :return: Path of the clipped risk map, or None on failure or cancellation.
+        """
         QgsMessageLog.logMessage("Starting risk analysis process.", "EthioRiskSurv-Toolbox", Qgis.Info)
 
         # --- 1. Validate Inputs ---
         if not self.study_area_layer or not self.study_area_layer.isValid():
             QgsMessageLog.logMessage("Invalid study area layer provided.", "EthioRiskSurv-Toolbox", Qgis.Critical)
-            return False
+            return None
 
         if not self.risk_factors:
             QgsMessageLog.logMessage("No risk factors provided.", "EthioRiskSurv-Toolbox", Qgis.Warning)
-            return False
+            return None
             
         # --- 2. Prepare environment for processing ---
-        context = QgsProcessingContext()
-        feedback = QgsProcessingFeedback()
-        
-        # --- 3. Process each risk factor ---
-        processed_factors = []
-        for factor in self.risk_factors:
-            layer = factor['layer']
-            weight = factor['weight']
-            correlation = factor['correlation'] # 'Higher' or 'Lower'
-            
-            QgsMessageLog.logMessage(f"Processing factor: {layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Info)
-            
-            # Temporary path for intermediate files
-            temp_path = os.path.join(self.project.homePath(), f"temp_{layer.name().replace(' ', '_')}.tif")
-
-            # A. If vector, convert to raster (proximity)
-            if isinstance(layer, QgsVectorLayer):
-                params = {
-                    'INPUT': layer,
-                    'UNITS': 0, # Pixels
-                    'OUTPUT': temp_path
-                }
-                # Run proximity (raster distance) analysis
-                processing.run("gdal:proximity", params, context=context, feedback=feedback)
-                processed_layer = QgsRasterLayer(temp_path, f"prox_{layer.name()}")
+        pipeline = self.start_pipeline(feedback)
+        feedback = pipeline.feedback
+        path = None
+
+        # Intermediates are removed when the run ends, whatever the outcome;
+        # a cancellation ends the run at the next stage or block boundary
+        with pipeline, self._open_store():
+            if self.engine == ENGINE_NUMPY:
+                path = self._run_numpy(feedback)
+            elif self.engine == ENGINE_STREAMING:
+                path = self._run_streaming(feedback)
             else:
-                processed_layer = layer # It's already a raster
+                path = self._run_qgis(feedback)
+        self.timing_summary = pipeline.summary()
+        return None if pipeline.canceled else path
 
-            if not processed_layer.isValid():
-                QgsMessageLog.logMessage(f"Failed to process layer {layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
-                continue
+    def start_pipeline(self, feedback=None, name=None):
+        """
+        Creates the Pipeline of a run: one part per factor (vector factors weigh
+        more, for their proximity stage), then the clip, overlay and write parts.
+        Use it as a context manager around the run.
+        :param feedback: QgsFeedback receiving progress; cancel it to stop the run.
+        :return: The Pipeline, also kept as self.pipeline.
+        """
+        parts = {}
+        for index, factor in enumerate(self.risk_factors):
+            kind = 'vector_factor' if isinstance(factor['layer'], QgsVectorLayer) else 'raster_factor'
+            parts[self._factor_part(index)] = PART_WEIGHTS[kind]
+        if self.engine != ENGINE_STREAMING:
+            parts['clip'] = PART_WEIGHTS['clip'] # The streaming engine clips block by block, within the overlay
+        parts['overlay'] = PART_WEIGHTS['overlay']
+        if self.engine != ENGINE_QGIS or not self.output_profile.is_plain:
+            parts['write'] = PART_WEIGHTS['write']
+        self.pipeline = Pipeline(name or f"Risk analysis '{self.project_name}'", feedback, parts)
+        return self.pipeline
 
-            # B. Normalize the processed raster to 0-1
-            norm_path = os.path.join(self.project.homePath(), f"norm_{processed_layer.name().replace(' ', '_')}.tif")
-            normalized_layer = normalize_raster(processed_layer, norm_path)
-            
-            if not normalized_layer or not normalized_layer.isValid():
-                QgsMessageLog.logMessage(f"Failed to normalize layer {processed_layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
-                continue
-            
-            # C. Invert if correlation is 'Lower values = Higher Risk'
-            if correlation == 'Lower values = Higher Risk':
-                inverted_path = os.path.join(self.project.homePath(), f"inv_{normalized_layer.name().replace(' ', '_')}.tif")
-                entry = QgsRasterCalculatorEntry()
-                entry.ref = 'norm@1'
-                entry.raster = normalized_layer
-                entry.bandNumber = 1
-                calc = QgsRasterCalculator(f'1 - "{entry.ref}"', inverted_path, 'GTiff', normalized_layer.extent(), normalized_layer.width(), normalized_layer.height(), [entry])
-                calc.processCalculation()
-                final_processed_layer = QgsRasterLayer(inverted_path, f"final_{layer.name()}")
-            else:
-                final_processed_layer = normalized_layer
+    def preview(self, coarsest_resolution=DEFAULT_PREVIEW_RESOLUTION, background=True):
+        """
+        Preview mode: returns a coarse risk map within seconds and refines it
+        up to self.resolution in the background (see plugin.risk_preview).
+        :return: The started RiskPreview; keep a reference while it refines.
+        """
+        preview = RiskPreview(self, coarsest_resolution)
+        preview.start(self.project, background)
+        return preview
 
-            processed_factors.append({'layer': final_processed_layer, 'weight': weight})
+    def _run_qgis(self, feedback):
+        """
+        Processing framework / QgsRasterCalculator engine. Every stage is
+        written as a raster through the intermediate store.
+        """
+        # --- 3. Process each risk factor ---
+        processed_factors = self._map_factors(self._process_factor_qgis, feedback)
         
         # --- 4. Run Weighted Overlay ---
         if not processed_factors:
             QgsMessageLog.logMessage("No factors could be processed.", "EthioRiskSurv-Toolbox", Qgis.Critical)
-            return False
+            return None
 
         QgsMessageLog.logMessage("Performing weighted overlay...", "EthioRiskSurv-Toolbox", Qgis.Info)
         
@@ -109,39 +170,448 @@ class RiskAnalyzer:
             entry.bandNumber = 1
             entries.append(entry)
             
-        # Complete the formula (normalize by total weight)
-        formula = f"({formula.strip(' + ')}) / {total_weight}"
+        # --- 5. Clip to Study Area during the overlay ---
+        # The study area is rasterized once onto the grid (1 inside, NoData
+        # outside); multiplying by it clips the map in the same write.
+        grid = self._target_grid()
+        mask_path = self._intermediate_path('mask', 0, self.project_name, estimated_bytes=grid.width * grid.height)
+        with self.pipeline.stage('clip', 'clip'):
+            raster_engine.write_mask(mask_path, raster_engine.rasterize_mask(self.study_area_layer, grid), grid)
+        mask_entry = QgsRasterCalculatorEntry()
+        mask_entry.ref = 'mask@1'
+        mask_entry.raster = QgsRasterLayer(mask_path, 'study_area_mask')
+        mask_entry.bandNumber = 1
+        entries.append(mask_entry)
 
-        # --- 5. Clip to Study Area and Finalize ---
-        output_risk_map_path = os.path.join(self.project.homePath(), f"{self.project_name.replace(' ', '_')}_RiskMap.tif")
-        
-        # Setup calculator
+        # Complete the formula (normalize by total weight, then clip)
+        formula = f"(({formula.strip(' + ')}) / {total_weight}) * \"mask@1\""
+
+        # QgsRasterCalculator only writes default GeoTIFFs; any other profile is applied by one rewrite
+        clipped_risk_map_path = self._clipped_risk_map_path()
+        calc_path = clipped_risk_map_path if self.output_profile.is_plain else \
+            self._intermediate_path('overlay', 0, f"{self.project_name}_RiskMap", estimated_bytes=grid.width * grid.height * 4)
         calc = QgsRasterCalculator(
             formula,
-            output_risk_map_path,
+            calc_path,
             'GTiff',
-            self.study_area_layer.extent(),
-            int(self.study_area_layer.extent().width() / self.resolution),
-            int(self.study_area_layer.extent().height() / self.resolution),
+            QgsRectangle(*grid.bounds),
+            grid.width,
+            grid.height,
             entries
         )
-        calc.processCalculation()
-
-        # Clip final raster with study area polygon
-        clipped_risk_map_path = os.path.join(self.project.homePath(), f"{self.project_name.replace(' ', '_')}_RiskMap_Clipped.tif")
-        params = {
-            'INPUT': output_risk_map_path,
-            'MASK': self.study_area_layer,
-            'OUTPUT': clipped_risk_map_path
+        with self.pipeline.stage('overlay', 'overlay') as stage:
+            result = calc.processCalculation(stage.feedback)
+        if result != QgsRasterCalculator.Success:
+            QgsMessageLog.logMessage(f"Weighted overlay failed (raster calculator error {int(result)}).", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return None
+        if calc_path != clipped_risk_map_path:
+            with self.pipeline.stage('write', 'write'):
+                replace_raster(calc_path, clipped_risk_map_path, self.output_profile)
+
+        return clipped_risk_map_path
+
+    def _run_numpy(self, feedback):
+        """
+        In-memory overlay engine. Each factor is read once through GDAL onto
+        the study-area grid, then normalized, inverted, weighted and summed as
+        NumPy arrays. Only the final clipped risk map is written to disk.
+        """
+        grid, risk = self.compute_risk(feedback)
+        if risk is None:
+            return None
+
+        # --- 5. Write the final map ---
+        clipped_risk_map_path = self._clipped_risk_map_path()
+        with self.pipeline.stage('write', 'write'):
+            raster_engine.write_array(clipped_risk_map_path, risk, grid, profile=self.output_profile)
+
+        return clipped_risk_map_path
+
+    def _run_streaming(self, feedback):
+        """
+        Block-windowed overlay engine. Factors are opened as virtual warped
+        datasets and the overlay is computed one block_size x block_size
+        window at a time, so peak memory depends on the block size rather
+        than on the raster size.
+        """
+        grid = self._target_grid()
+
+        factor_sources = self._collect_factor_sources(feedback)
+        if not factor_sources:
+            QgsMessageLog.logMessage("No factors could be processed.", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return None
+        for source in factor_sources:
+            source['dataset'] = raster_engine.open_aligned(source['path'], grid, self.resampling)
+
+        QgsMessageLog.logMessage(f"Performing streaming weighted overlay ({self.block_size} px blocks)...", "EthioRiskSurv-Toolbox", Qgis.Info)
+        datasource, mask_layer = raster_engine.vector_layer_to_ogr(self.study_area_layer, grid.crs_wkt)
+        clipped_risk_map_path = self._clipped_risk_map_path()
+        output = raster_engine.create_output(clipped_risk_map_path, grid, profile=self.output_profile)
+        skipped = 0
+        windows = list(grid.iter_windows(self.block_size))
+        try:
+            with self.pipeline.stage('overlay', 'overlay') as stage:
+                for done, window in enumerate(windows):
+                    self.pipeline.check()
+                    stage.set_progress(100 * done / len(windows))
+                    inside = raster_engine.burn_mask(mask_layer, grid.window(*window))
+                    if not inside.any():
+                        # Entirely outside the study area: no factor is read and the
+                        # block is left to the GeoTIFF driver, which fills it with NoData
+                        skipped += 1
+                        continue
+                    risk = self._weighted_overlay(factor_sources, lambda source: raster_engine.read_window(source['dataset'], window), inside)
+                    raster_engine.write_window(output, risk, window, profile=self.output_profile)
+            if skipped:
+                QgsMessageLog.logMessage(f"Skipped {skipped} blocks outside the study area.", "EthioRiskSurv-Toolbox", Qgis.Info)
+            with self.pipeline.stage('write', 'write'):
+                raster_engine.close_output(output, clipped_risk_map_path, profile=self.output_profile)
+            output = None
+        except Exception: # Canceled, or a read, mask or write error
+            output = None
+            raster_engine.discard_output(clipped_risk_map_path, profile=self.output_profile) # No partial risk map is left behind
+            raise
+        datasource = None
+        for source in factor_sources:
+            source['dataset'] = None
+
+        peak_rss = raster_engine.peak_rss_mb()
+        if peak_rss is not None:
+            QgsMessageLog.logMessage(f"Streaming overlay finished. Peak RSS: {peak_rss:.1f} MB", "EthioRiskSurv-Toolbox", Qgis.Info)
+
+        return clipped_risk_map_path
+
+    def compute_risk(self, feedback):
+        """
+        Weighted overlay of the NumPy engine, clipped to the study area, without
+        writing anything. Must run inside the intermediate store (see run()).
+        :return: (grid, risk) with risk a float32 array, NaN outside the study
+                 area; risk is None if no factor could be processed.
+        """
+        grid = self._target_grid()
+        if self.pipeline is None:
+            self.start_pipeline(feedback)
+
+        # --- 3. Read, normalize and accumulate each factor ---
+        factor_sources = self._collect_factor_sources(feedback)
+        if not factor_sources:
+            QgsMessageLog.logMessage("No factors could be processed.", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return grid, None
+
+        # --- 4. Weighted overlay, clipped to the study area as it is computed ---
+        QgsMessageLog.logMessage("Performing weighted overlay in memory...", "EthioRiskSurv-Toolbox", Qgis.Info)
+        with self.pipeline.stage('clip', 'clip'):
+            inside = raster_engine.rasterize_mask(self.study_area_layer, grid)
+        with self.pipeline.stage('overlay', 'overlay'):
+            risk = self._weighted_overlay(factor_sources, lambda source: raster_engine.read_aligned(source['path'], grid, self.resampling), inside)
+        return grid, risk
+
+    def build_factor_stack(self):
+        """
+        Reads every factor onto the study-area grid as a normalized (and, where
+        needed, inverted) float32 array, for interactive weight tuning.
+        :return: (grid, stack, inside) where stack maps the factor index to its
+                 array and inside is the study-area mask.
+        """
+        grid = self._target_grid()
+        stack = {}
+        pipeline = self.start_pipeline(name=f"Factor stack '{self.project_name}'")
+        with pipeline, self._open_store():
+            for source in self._collect_factor_sources(pipeline.feedback):
+                array = raster_engine.read_aligned(source['path'], grid, self.resampling)
+                stack[source['index']] = raster_engine.normalize_array(array, source['min'], source['max'], invert=source['invert'])
+        inside = raster_engine.rasterize_mask(self.study_area_layer, grid)
+        return grid, stack, inside
+
+    def _target_grid(self):
+        """
+        The study-area grid at self.resolution shared by all engines, snapped
+        to self.snap_origin when one is set.
+        """
+        if self.snap_origin is not None:
+            return raster_engine.RasterGrid.snapped(self.study_area_layer.extent(), self.resolution,
+                                                    self.study_area_layer.crs().toWkt(), self.snap_origin)
+        return raster_engine.RasterGrid.from_extent(self.study_area_layer.extent(), self.resolution,
+                                                    self.study_area_layer.crs().toWkt())
+
+    def _collect_factor_sources(self, feedback):
+        """
+        Prepares every factor as a raster source with its full-resolution
+        min/max, as used by normalize_raster.
+        :return: list of dicts with 'index', 'path', 'min', 'max', 'invert' and 'weight'.
+        """
+        return self._map_factors(self._factor_source, feedback)
+
+    def _map_factors(self, process, feedback):
+        """
+        Runs process(index, factor, feedback) for every risk factor, on a
+        thread pool when self.workers > 1. GDAL, QgsRasterCalculator and the
+        NumPy/SciPy kernels release the GIL, so the factors are prepared concurrently.
+        :return: non-None results, in the order of self.risk_factors.
+        """
+        self.factor_timings = []
+
+        def timed(indexed_factor):
+            index, factor = indexed_factor
+            self.pipeline.check() # Raises PipelineCanceled, which also stops the thread pool
+            start = time.perf_counter()
+            result = process(index, factor, feedback)
+            self.pipeline.finish_part(self._factor_part(index))
+            return result, time.perf_counter() - start
+
+        indexed_factors = list(enumerate(self.risk_factors))
+        if self.workers > 1 and len(indexed_factors) > 1:
+            QgsMessageLog.logMessage(f"Preparing {len(indexed_factors)} factors with {self.workers} workers.", "EthioRiskSurv-Toolbox", Qgis.Info)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                outcomes = list(executor.map(timed, indexed_factors))
+        else:
+            outcomes = [timed(indexed_factor) for indexed_factor in indexed_factors]
+
+        results = []
+        for (index, factor), (result, elapsed) in zip(indexed_factors, outcomes):
+            self.factor_timings.append((factor['layer'].name(), elapsed))
+            QgsMessageLog.logMessage(f"Factor '{factor['layer'].name()}' prepared in {elapsed:.2f} s", "EthioRiskSurv-Toolbox", Qgis.Info)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def _process_factor_qgis(self, index, factor, feedback):
+        """
+        Distance surface, normalization and inversion of one factor, written
+        as rasters and combined later by QgsRasterCalculator.
+        :return: dict with the final 'layer' and its 'weight', or None on failure.
+        """
+        layer = factor['layer']
+        correlation = factor['correlation'] # 'Higher' or 'Lower'
+
+        QgsMessageLog.logMessage(f"Processing factor: {layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Info)
+
+        cache_key = self._cache_key(layer, correlation == LOWER_IS_HIGHER_RISK, 'qgis')
+        cached_path = self.cache.get(cache_key) if cache_key else None
+        if cached_path:
+            return {'layer': QgsRasterLayer(cached_path, f"final_{layer.name()}"), 'weight': factor['weight']}
+
+        # A. If vector, convert to a distance raster; optionally align rasters to the grid
+        processed_layer = self._prepare_factor_layer(index, layer, feedback)
+
+        if not processed_layer.isValid():
+            QgsMessageLog.logMessage(f"Failed to process layer {layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return None
+        if self.align_factors:
+            processed_layer = self._align_factor_layer(index, layer, processed_layer)
+
+        # B. Normalize the processed raster to 0-1, inverted in the same pass
+        #    if correlation is 'Lower values = Higher Risk'
+        invert = correlation == LOWER_IS_HIGHER_RISK
+        extension = 'vrt' if self.intermediate_format == NORMALIZED_VRT else 'tif'
+        norm_path = self._intermediate_path('inv' if invert else 'norm', index, layer.name(), extension,
+                                            estimated_bytes=processed_layer.width() * processed_layer.height() * 4)
+        stage = 'invert' if invert else 'normalize'
+        with self.pipeline.stage(stage, self._factor_part(index), layer.name(), STAGE_SHARES[stage]):
+            final_processed_layer = normalize_raster(processed_layer, norm_path, self.minmax_mode, invert=invert,
+                                                     output_format=self.intermediate_format, profile=self.output_profile.intermediate(),
+                                                     cache=self._range_cache(layer, processed_layer))
+
+        if not final_processed_layer or not final_processed_layer.isValid():
+            QgsMessageLog.logMessage(f"Failed to normalize layer {processed_layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return None
+        final_processed_layer.setName(f"final_{layer.name()}")
+
+        # VRTs only reference their source, so there is nothing worth caching
+        if cache_key and self.intermediate_format == NORMALIZED_GTIFF:
+            self.cache.put(cache_key, final_processed_layer.source())
+
+        return {'layer': final_processed_layer, 'weight': factor['weight']}
+
+    def _factor_source(self, index, factor, feedback):
+        """Raster source and min/max of one factor for the GDAL-based engines."""
+        layer = factor['layer']
+        invert = factor['correlation'] == LOWER_IS_HIGHER_RISK
+        QgsMessageLog.logMessage(f"Processing factor: {layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Info)
+
+        # Cached entries are already aligned to the grid, normalized and inverted
+        cache_key = self._cache_key(layer, invert, 'aligned')
+        cached_path = self.cache.get(cache_key) if cache_key else None
+        if cached_path:
+            return {'index': index, 'path': cached_path, 'min': 0.0, 'max': 1.0, 'invert': False, 'weight': factor['weight']}
+
+        processed_layer = self._prepare_factor_layer(index, layer, feedback)
+        if not processed_layer.isValid():
+            QgsMessageLog.logMessage(f"Failed to process layer {layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return None
+        if self.align_factors:
+            processed_layer = self._align_factor_layer(index, layer, processed_layer)
+
+        path = processed_layer.source()
+        # The values themselves are normalized (and inverted) during the overlay; this stage finds their range
+        with self.pipeline.stage('normalize', self._factor_part(index), layer.name(), STAGE_SHARES['normalize']):
+            min_val, max_val = raster_engine.band_min_max(path, mode=self.minmax_mode, cache=self._range_cache(layer, processed_layer))
+        if min_val is None or max_val is None or min_val == max_val:
+            QgsMessageLog.logMessage(f"Failed to normalize layer {processed_layer.name()}", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return None
+
+        source = {
+            'index': index,
+            'path': path,
+            'min': min_val,
+            'max': max_val,
+            'invert': invert,
+            'weight': factor['weight']
         }
-        processing.run("gdal:cliprasterbymasklayer", params, context=context, feedback=feedback)
+        if cache_key:
+            with self.pipeline.stage('cache', self._factor_part(index), layer.name(), STAGE_SHARES['cache']) as stage:
+                source = self._store_in_cache(source, cache_key, stage)
+        return source
+
+    def _cache_key(self, layer, invert, stage):
+        """Factor cache key for a layer on the target grid, or None if caching is off."""
+        if self.cache is None:
+            return None
+        if self.minmax_mode == raster_engine.MINMAX_APPROXIMATE:
+            stage += ':approximate' # Estimated ranges give different normalized values
+        stage += f":{self.resampling}:{int(self.align_factors)}"
+        grid = self._target_grid()
+        return self.cache.key(layer.source(), grid.bounds, self.resolution, grid.crs_wkt, invert, stage)
+
+    def _range_cache(self, layer, processed_layer):
+        """
+        Factor cache for the value range of MINMAX_CACHED: only for a factor's
+        own raster, as intermediates are rewritten (and refingerprinted) every run.
+        """
+        return self.cache if processed_layer is layer else None
+
+    def _align_factor_layer(self, index, layer, processed_layer):
+        """
+        Alignment stage: warps a raster factor once onto the target grid with
+        self.resampling. The aligned raster is kept in the factor cache when one
+        is set, so later runs on the same grid skip warping entirely.
+        """
+        grid = self._target_grid()
+        if raster_engine.is_aligned(processed_layer.source(), grid):
+            return processed_layer # Distance rasters are computed on the grid already
+
+        cache_key = self._cache_key(layer, False, 'grid')
+        cached_path = self.cache.get(cache_key) if cache_key else None
+        if cached_path:
+            return QgsRasterLayer(cached_path, processed_layer.name())
+
+        QgsMessageLog.logMessage(f"Aligning {layer.name()} to the {grid.width} x {grid.height} target grid ({self.resampling}).", "EthioRiskSurv-Toolbox", Qgis.Info)
+        with self.pipeline.stage('align', self._factor_part(index), layer.name(), STAGE_SHARES['align']):
+            if cache_key:
+                raster_engine.warp_to_grid(processed_layer.source(), grid, self.cache.staging_path(cache_key), self.resampling,
+                                           self._intermediate_creation_options())
+                self.cache.commit(cache_key)
+                aligned_path = self.cache.path_for(cache_key)
+            else:
+                aligned_path = self._intermediate_path('aligned', index, layer.name(), estimated_bytes=grid.width * grid.height * 4)
+                raster_engine.warp_to_grid(processed_layer.source(), grid, aligned_path, self.resampling,
+                                           self._intermediate_creation_options())
+        return QgsRasterLayer(aligned_path, processed_layer.name())
+
+    def _store_in_cache(self, source, cache_key, stage):
+        """
+        Writes the normalized, aligned factor into the cache window by window
+        and returns a source that reads it back without renormalizing.
+        A cancellation between windows leaves the entry uncommitted.
+        """
+        grid = self._target_grid()
+        dataset = raster_engine.open_aligned(source['path'], grid, self.resampling)
+        profile = self.output_profile.intermediate()
+        output = raster_engine.create_output(self.cache.staging_path(cache_key), grid, profile=profile)
+        windows = list(grid.iter_windows(self.block_size))
+        for done, window in enumerate(windows):
+            self.pipeline.check()
+            stage.set_progress(100 * done / len(windows))
+            normalized = raster_engine.normalize_array(raster_engine.read_window(dataset, window),
+                                                       source['min'], source['max'], invert=source['invert'])
+            raster_engine.write_window(output, normalized, window, profile=profile)
+        raster_engine.close_output(output, self.cache.staging_path(cache_key), profile=profile)
+        output = None
+        dataset = None
+        self.cache.commit(cache_key)
+        return {'index': source['index'], 'path': self.cache.path_for(cache_key), 'min': 0.0, 'max': 1.0, 'invert': False, 'weight': source['weight']}
+
+    def _weighted_overlay(self, factor_sources, read, inside=None):
+        """
+        Normalizes and combines the factors into a float32 risk array.
+        :param read: callable returning the aligned float64 array for a factor source.
+        :param inside: Optional study-area mask of the same shape. Only pixels
+                       inside it are normalized and summed; the rest are NaN.
+        """
+        weighted_sum = None
+        total_weight = 0
+        shape = None
+        for source in factor_sources:
+            values = read(source)
+            shape = values.shape
+            if inside is not None:
+                values = values[inside]
+            normalized = raster_engine.normalize_array(values, source['min'], source['max'], invert=source['invert'])
+            contribution = normalized.astype(np.float64) * source['weight']
+            weighted_sum = contribution if weighted_sum is None else weighted_sum + contribution
+            total_weight += source['weight']
+        if inside is None:
+            return (weighted_sum / total_weight).astype(np.float32)
+        risk = np.full(shape, np.nan, dtype=np.float32)
+        risk[inside] = weighted_sum / total_weight
+        return risk
+
+    def _prepare_factor_layer(self, index, layer, feedback):
+        """
+        Returns a raster for the factor. Vector layers are rasterized once onto
+        the study-area grid and converted to a Euclidean distance surface.
+        """
+        if not isinstance(layer, QgsVectorLayer):
+            return layer # It's already a raster
+
+        grid = self._target_grid()
+        with self.pipeline.stage('proximity', self._factor_part(index), layer.name(), STAGE_SHARES['proximity']):
+            distances = raster_engine.vector_distance(layer, grid, self.distance_method)
+            if distances is None:
+                QgsMessageLog.logMessage(f"Layer {layer.name()} has no features inside the study area.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+                return QgsRasterLayer()
+
+            # Temporary path for intermediate files
+            temp_path = self._intermediate_path('temp', index, layer.name(), estimated_bytes=grid.width * grid.height * 4)
+            raster_engine.write_array(temp_path, distances, grid, profile=self.output_profile.intermediate())
+        return QgsRasterLayer(temp_path, f"prox_{layer.name()}")
+
+    @staticmethod
+    def _factor_part(index):
+        """Pipeline part of the factor at index."""
+        return f'factor{index}'
+
+    def _intermediate_creation_options(self):
+        """GTiff creation options for intermediates written by GDAL tools (gdal.Warp)."""
+        profile = self.output_profile.intermediate()
+        return None if profile.is_plain else profile.creation_options()
+
+    def _open_store(self):
+        """Creates the intermediate store for a run, bound to the current project home."""
+        self.store = IntermediateStore(self.storage, self.project.homePath(), self.scratch_dir, self.memory_budget_mb)
+        return self.store
+
+    def _intermediate_path(self, prefix, index, name, extension='tif', estimated_bytes=0, in_process=True):
+        """
+        Path of an intermediate raster from the intermediate store. The factor
+        index keeps names unique when factors share a layer name or run concurrently.
+        """
+        if self.store is None:
+            self._open_store()
+        return self.store.path(prefix, index, name, extension, estimated_bytes, in_process)
+
+    def _clipped_risk_map_path(self):
+        return os.path.join(self.project.homePath(), f"{self.project_name.replace(' ', '_')}_RiskMap_Clipped.tif")
 
-        # Load the final layer into the project
-        final_risk_map = QgsRasterLayer(clipped_risk_map_path, f"{self.project_name} - Risk Map")
+    def load_risk_map(self, path):
+        """Loads the final risk map into the project (main thread only)."""
+        final_risk_map = QgsRasterLayer(path, f"{self.project_name} - Risk Map")
         if final_risk_map.isValid():
             self.project.addMapLayer(final_risk_map)
+            # A no-op when the output profile already built internal overviews
+            self.overview_task = ensure_overviews(final_risk_map, self.overviews)
             QgsMessageLog.logMessage("Risk analysis completed successfully!", "EthioRiskSurv-Toolbox", Qgis.Success)
-            return True
+            return True, final_risk_map
         else:
             QgsMessageLog.logMessage("Failed to create the final clipped risk map.", "EthioRiskSurv-Toolbox", Qgis.Critical)
-            return False
+            return False, None
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import os
+import shutil
+import tempfile
+from qgis.PyQt.QtCore import QObject, pyqtSignal, pyqtSlot
+from qgis.core import QgsMessageLog, Qgis, QgsApplication, QgsTask, QgsRasterLayer
+from ..utils import raster_engine
+from ..utils.gis_utils import detach_layer
+from ..utils.intermediate_store import STORAGE_MEMORY
+from ..utils.overviews import DEFAULT_RESAMPLING
+
+DEFAULT_PREVIEW_RESOLUTION = 1000 # Coarsest preview level, in map units
+
+def preview_resolutions(resolution, coarsest=DEFAULT_PREVIEW_RESOLUTION):
+    """
+    Resolutions of the preview levels, coarse to fine: resolution * 2^k for
+    every k that stays at or below coarsest, ending with resolution itself.
+    """
+    levels = [resolution]
+    while levels[0] * 2 <= coarsest:
+        levels.insert(0, levels[0] * 2)
+    return levels
+
+class RiskPreview(QObject):
+    """
+    Coarse-to-fine preview of Module 1. The weighted overlay is first
+    computed on a coarse grid (factors are read from their GDAL overviews
+    and the value ranges approximated), then refined level by level up to
+    the analyzer's resolution in a background task; the preview layer is
+    updated as each level finishes.
+    """
+    levelFinished = pyqtSignal(float, str)
+
+    def __init__(self, analyzer, coarsest_resolution=DEFAULT_PREVIEW_RESOLUTION):
+        """
+        Constructor.
+        :param analyzer: A configured RiskAnalyzer; it is not modified.
+        :param coarsest_resolution: Resolution of the first, fast level.
+        """
+        super().__init__()
+        self.analyzer = analyzer
+        self.resolutions = preview_resolutions(analyzer.resolution, coarsest_resolution)
+        self.layer = None
+        self.task = None
+        self.current_resolution = None
+        self.preview_dir = tempfile.mkdtemp(prefix='ethiorisksurv_preview_')
+        self.levelFinished.connect(self._show_level)
+
+    def start(self, project=None, background=True):
+        """
+        Computes the coarsest level, adds it to the project and refines the
+        rest in a QgsTask (or right away if background is False).
+        :return: The preview QgsRasterLayer, or None if no factor could be processed.
+        """
+        project = project or self.analyzer.project
+        path = self.compute_level(self.resolutions[0])
+        if path is None:
+            return None
+        self.layer = QgsRasterLayer(path, f"{self.analyzer.project_name} - Risk Preview")
+        self.current_resolution = self.resolutions[0]
+        project.addMapLayer(self.layer)
+
+        if len(self.resolutions) > 1:
+            if background:
+                # Layers of the project must not be read from the task's thread
+                self.task = RiskPreviewTask(self, self._detached_inputs())
+                QgsApplication.taskManager().addTask(self.task)
+            else:
+                self.refine(self.resolutions[1:])
+        return self.layer
+
+    def refine(self, resolutions, inputs=None, is_canceled=None, progress=None):
+        """
+        Computes the given levels in order and announces each one through
+        levelFinished.
+        :param inputs: (study_area_layer, risk_factors) to use instead of the analyzer's.
+        :param is_canceled: Optional callable checked before each level.
+        :param progress: Optional callable receiving a 0-100 percentage.
+        :return: False if cancelled or a level failed.
+        """
+        for done, resolution in enumerate(resolutions):
+            if is_canceled is not None and is_canceled():
+                return False
+            path = self.compute_level(resolution, inputs)
+            if path is None:
+                return False
+            self.levelFinished.emit(float(resolution), path)
+            if progress is not None:
+                progress(100.0 * (done + 1) / len(resolutions))
+        return True
+
+    def compute_level(self, resolution, inputs=None):
+        """
+        Runs the in-memory overlay at one resolution and writes it to a
+        temporary GeoTIFF.
+        :return: Path of the level, or None on failure.
+        """
+        level = self._level_analyzer(resolution, inputs)
+        pipeline = level.start_pipeline(name=f"Risk preview at {resolution:g}")
+        risk = None
+        with pipeline, level._open_store():
+            grid, risk = level.compute_risk(pipeline.feedback)
+        if risk is None:
+            return None
+        path = os.path.join(self.preview_dir, f"{self.analyzer.project_name.replace(' ', '_')}_RiskPreview_{resolution:g}.tif")
+        raster_engine.write_array(path, risk, grid)
+        QgsMessageLog.logMessage(f"Risk preview at {resolution:g} ({grid.width} x {grid.height}) ready.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        return path
+
+    def cancel(self):
+        """Stops the background refinement after the level in progress."""
+        if self.task is not None:
+            try:
+                self.task.cancel()
+            except RuntimeError:
+                pass # Already finished and deleted by the task manager
+            self.task = None
+
+    def close(self, project=None):
+        """Cancels the refinement, removes the preview layer and its files."""
+        self.cancel()
+        if self.layer is not None:
+            (project or self.analyzer.project).removeMapLayer(self.layer.id())
+            self.layer = None
+        shutil.rmtree(self.preview_dir, ignore_errors=True)
+
+    @pyqtSlot(float, str)
+    def _show_level(self, resolution, path):
+        """Points the preview layer at a finer level (runs in the main thread)."""
+        if self.layer is None or (self.current_resolution is not None and resolution >= self.current_resolution):
+            return
+        previous = self.layer.source()
+        self.layer.setDataSource(path, self.layer.name(), 'gdal')
+        self.layer.triggerRepaint()
+        self.current_resolution = resolution
+        if previous != path and os.path.exists(previous):
+            os.remove(previous)
+
+    def _level_analyzer(self, resolution, inputs=None):
+        """
+        A copy of the analyzer for one level: in-memory intermediates and, below
+        the final resolution, area-averaged reads (GDAL picks the matching
+        overview) and approximate value ranges.
+        """
+        level = copy.copy(self.analyzer)
+        level.resolution = resolution
+        level.storage = STORAGE_MEMORY
+        level.store = None
+        level.factor_timings = []
+        level.pipeline = None
+        level.timing_summary = None
+        if inputs is not None:
+            level.study_area_layer, level.risk_factors = inputs
+        if resolution != self.analyzer.resolution:
+            level.resampling = DEFAULT_RESAMPLING
+            level.minmax_mode = raster_engine.MINMAX_APPROXIMATE
+        return level
+
+    def _detached_inputs(self):
+        """
+        In-memory copies of the vector inputs, not registered in any project,
+        for use from the refinement task.
+        """
+        risk_factors = []
+        for factor in self.analyzer.risk_factors:
+            factor = dict(factor)
+            factor['layer'] = detach_layer(factor['layer'])
+            risk_factors.append(factor)
+        return detach_layer(self.analyzer.study_area_layer), risk_factors
+
+class RiskPreviewTask(QgsTask):
+    """Background refinement of a RiskPreview, one level at a time."""
+    def __init__(self, preview, inputs):
+        super().__init__(f"Refining risk preview for {preview.analyzer.project_name}", QgsTask.CanCancel)
+        self.preview = preview
+        self.inputs = inputs
+
+    def run(self):
+        return self.preview.refine(self.preview.resolutions[1:], self.inputs, self.isCanceled, self.setProgress)
+
+    def finished(self, result):
+        if not result and not self.isCanceled():
+            QgsMessageLog.logMessage("Risk preview refinement failed.", "EthioRiskSurv-Toolbox", Qgis.Warning)
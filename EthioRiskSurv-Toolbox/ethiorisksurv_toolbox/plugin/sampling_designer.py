@@ -5,22 +5,53 @@ import processing
 from qgis.core import (
     QgsMessageLog, Qgis, QgsVectorLayer, QgsRasterLayer, QgsProject,
     QgsProcessingContext, QgsProcessingFeedback, QgsFeature, QgsGeometry,
-    QgsField, QgsFeatureSink, QgsFields, QgsWkbTypes
+    QgsField, QgsFeatureSink, QgsFields, QgsWkbTypes, QgsRasterBandStats
 )
 from PyQt5.QtCore import QVariant
+from ..utils.pipeline import Pipeline
 
 class SamplingDesigner:
     """
     Handles all core logic for Module 2: Sampling Strategy Design.
     """
-    def __init__(self, risk_map_layer, study_area_layer, output_name, snap_layer=None):
+    def __init__(self, risk_map_layer, study_area_layer, output_name, snap_layer=None, feedback=None, add_to_project=True):
+        """
+        Constructor.
+        :param feedback: Optional QgsProcessingFeedback for progress and cancellation.
+        :param add_to_project: False when running in a QgsTask; the caller then adds the points layer.
+        """
         self.risk_map = risk_map_layer
         self.study_area = study_area_layer
         self.output_name = output_name if output_name else "Sampling_Points"
         self.snap_layer = snap_layer
+        self.add_to_project = add_to_project
         self.project = QgsProject.instance()
         self.context = QgsProcessingContext()
-        self.feedback = QgsProcessingFeedback()
+        self.feedback = feedback or QgsProcessingFeedback()
+        self.pipeline = None # utils.pipeline.Pipeline of the last method run
+
+    @property
+    def timing_summary(self):
+        """Pipeline.summary() of the last method run, None before the first."""
+        return self.pipeline.summary() if self.pipeline else None
+
+    def classify_risk_map(self, num_strata, output='TEMPORARY_OUTPUT'):
+        """
+        Reclassifies the risk map into num_strata equal-interval strata,
+        numbered 1 (lowest risk) to num_strata, for generate_stratified_points.
+        :return: The classified QgsRasterLayer (not added to the project).
+        """
+        QgsMessageLog.logMessage(f"Classifying risk map into {num_strata} strata.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        stats = self.risk_map.dataProvider().bandStatistics(1, QgsRasterBandStats.Min | QgsRasterBandStats.Max)
+        min_val, max_val = stats.minimumValue, stats.maximumValue
+        step = (max_val - min_val) / num_strata
+        reclass_table = [[min_val + (i * step), min_val + ((i + 1) * step), i + 1] for i in range(num_strata)]
+        reclass_table[-1][1] = max_val
+        params = {'INPUT_RASTER': self.risk_map, 'RASTER_BAND': 1, 'TABLE': [value for row in reclass_table for value in row], 'OUTPUT': output}
+        with self._start_pipeline("Risk map classification", {'classify': 1}, snap=False):
+            result = self._run_algorithm('classify', 'classify', "native:reclassifybytable", params)
+            return QgsRasterLayer(result['OUTPUT'], f"{self.risk_map.name()}_{num_strata}_Strata")
+        return None # Canceled
 
     def generate_random_points(self, count):
         """Generates simple random points within the study area."""
@@ -31,76 +62,100 @@ class SamplingDesigner:
             'POINTS_NUMBER': count,
             'OUTPUT': 'memory:'
         }
-        result = processing.run("qgis:randompointsinsidepolygons", params, context=self.context, feedback=self.feedback)
-        return self._finalize_output(result['OUTPUT'])
+        with self._start_pipeline("Random sampling", {'points': 3}):
+            result = self._run_algorithm('points', 'points', "qgis:randompointsinsidepolygons", params)
+            return self._finalize_output(result['OUTPUT'])
+        return None # Canceled
 
     def generate_stratified_points(self, classified_raster, strata_counts):
         """Generates points within each stratum of a classified raster."""
         QgsMessageLog.logMessage(f"Generating stratified points for {len(strata_counts)} strata.", "EthioRiskSurv-Toolbox", Qgis.Info)
 
-        final_points = []
-        for stratum_value, count in strata_counts.items():
-            if count == 0:
-                continue
-            
-            # Create a mask for the current stratum
-            expr = f'"{classified_raster.name()}@1" = {stratum_value}'
-            stratum_mask_path = 'memory:'
+        parts = {f'stratum{value}': 1 for value, count in strata_counts.items() if count > 0}
+        with self._start_pipeline("Stratified sampling", parts):
+            final_points = []
+            for stratum_value, count in strata_counts.items():
+                if count == 0:
+                    continue
+                part = f'stratum{stratum_value}'
+
+                # Create a mask for the current stratum
+                expr = f'"{classified_raster.name()}@1" = {stratum_value}'
+                stratum_mask_path = 'memory:'
+                params = {
+                    'EXPRESSION': expr,
+                    'LAYERS': [classified_raster],
+                    'OUTPUT': stratum_mask_path
+                }
+                mask_result = self._run_algorithm('mask', part, "qgis:rastercalculator", params, share=0.2)
+                mask_raster = mask_result['OUTPUT']
+
+                # Polygonize the mask
+                polygon_path = 'memory:'
+                params = {
+                    'INPUT': mask_raster,
+                    'BAND': 1,
+                    'OUTPUT': polygon_path
+                }
+                polygon_result = self._run_algorithm('polygonize', part, "gdal:polygonize", params, share=0.5)
+                stratum_polygon = polygon_result['OUTPUT']
+
+                # Generate random points within the stratum polygon
+                params = {
+                    'INPUT': stratum_polygon,
+                    'POINTS_NUMBER': count,
+                    'OUTPUT': 'memory:'
+                }
+                points_result = self._run_algorithm('points', part, "qgis:randompointsinsidepolygons", params, share=0.3)
+
+                for feature in points_result['OUTPUT'].getFeatures():
+                    final_points.append(feature)
+
+            return self._create_layer_from_features(final_points)
+        return None # Canceled
+
+    def generate_targeted_points(self, threshold, count):
+        """Generates random points within areas exceeding a risk threshold."""
+        QgsMessageLog.logMessage(f"Generating {count} targeted points with threshold > {threshold}.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        
+        with self._start_pipeline("Targeted sampling", {'mask': 1, 'polygonize': 2, 'points': 1}):
+            # Create a mask of high-risk areas
+            expr = f'"{self.risk_map.name()}@1" >= {threshold}'
             params = {
-                'EXPRESSION': expr,
-                'LAYERS': [classified_raster],
-                'OUTPUT': stratum_mask_path
+                'EXPRESSION': expr, 'LAYERS': [self.risk_map], 'OUTPUT': 'memory:'
             }
-            mask_result = processing.run("qgis:rastercalculator", params, context=self.context, feedback=self.feedback)
-            mask_raster = mask_result['OUTPUT']
-            
+            mask_result = self._run_algorithm('mask', 'mask', "qgis:rastercalculator", params)
+
             # Polygonize the mask
-            polygon_path = 'memory:'
             params = {
-                'INPUT': mask_raster,
-                'BAND': 1,
-                'OUTPUT': polygon_path
+                'INPUT': mask_result['OUTPUT'], 'BAND': 1, 'OUTPUT': 'memory:'
             }
-            polygon_result = processing.run("gdal:polygonize", params, context=self.context, feedback=self.feedback)
-            stratum_polygon = polygon_result['OUTPUT']
-            
-            # Generate random points within the stratum polygon
+            polygon_result = self._run_algorithm('polygonize', 'polygonize', "gdal:polygonize", params)
+            high_risk_polygons = polygon_result['OUTPUT']
+
+            # Generate points inside the high-risk polygons
             params = {
-                'INPUT': stratum_polygon,
-                'POINTS_NUMBER': count,
-                'OUTPUT': 'memory:'
+                'INPUT': high_risk_polygons, 'POINTS_NUMBER': count, 'OUTPUT': 'memory:'
             }
-            points_result = processing.run("qgis:randompointsinsidepolygons", params, context=self.context, feedback=self.feedback)
-            
-            for feature in points_result['OUTPUT'].getFeatures():
-                final_points.append(feature)
+            points_result = self._run_algorithm('points', 'points', "qgis:randompointsinsidepolygons", params)
+            return self._finalize_output(points_result['OUTPUT'])
+        return None # Canceled
 
-        return self._create_layer_from_features(final_points)
+    def _start_pipeline(self, name, parts, snap=True):
+        """
+        Creates the Pipeline of one method run (progress, cancellation, stage
+        timings); a 'snap' part is added when points will be snapped.
+        """
+        parts = dict(parts)
+        if snap and self.snap_layer and self.snap_layer.isValid():
+            parts['snap'] = 1
+        self.pipeline = Pipeline(name, self.feedback, parts)
+        return self.pipeline
 
-    def generate_targeted_points(self, threshold, count):
-        """Generates random points within areas exceeding a risk threshold."""
-        QgsMessageLog.logMessage(f"Generating {count} targeted points with threshold > {threshold}.", "EthioRiskSurv-Toolbox", Qgis.Info)
-        
-        # Create a mask of high-risk areas
-        expr = f'"{self.risk_map.name()}@1" >= {threshold}'
-        params = {
-            'EXPRESSION': expr, 'LAYERS': [self.risk_map], 'OUTPUT': 'memory:'
-        }
-        mask_result = processing.run("qgis:rastercalculator", params, context=self.context, feedback=self.feedback)
-        
-        # Polygonize the mask
-        params = {
-            'INPUT': mask_result['OUTPUT'], 'BAND': 1, 'OUTPUT': 'memory:'
-        }
-        polygon_result = processing.run("gdal:polygonize", params, context=self.context, feedback=self.feedback)
-        high_risk_polygons = polygon_result['OUTPUT']
-        
-        # Generate points inside the high-risk polygons
-        params = {
-            'INPUT': high_risk_polygons, 'POINTS_NUMBER': count, 'OUTPUT': 'memory:'
-        }
-        points_result = processing.run("qgis:randompointsinsidepolygons", params, context=self.context, feedback=self.feedback)
-        return self._finalize_output(points_result['OUTPUT'])
+    def _run_algorithm(self, stage, part, algorithm, params, share=1.0):
+        """Runs a processing algorithm as a timed pipeline stage with its own feedback."""
+        with self.pipeline.stage(stage, part, share=share) as step:
+            return processing.run(algorithm, params, context=self.context, feedback=step.feedback)
 
     def _create_layer_from_features(self, features):
         """Helper to create a new point layer from a list of features."""
@@ -137,9 +192,10 @@ class SamplingDesigner:
                 'BEHAVIOR': 0, # Prefer closest point
                 'OUTPUT': 'memory:'
             }
-            result = processing.run("qgis:snappointstogrid", params, context=self.context, feedback=self.feedback)
+            result = self._run_algorithm('snap', 'snap', "qgis:snappointstogrid", params)
             final_layer = result['OUTPUT']
         
         final_layer.setName(self.output_name)
-        self.project.addMapLayer(final_layer)
+        if self.add_to_project:
+            self.project.addMapLayer(final_layer)
         return final_layer
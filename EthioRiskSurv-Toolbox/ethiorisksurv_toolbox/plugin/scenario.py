@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+"""
+Headless scenario runner: drives RiskAnalyzer, SamplingDesigner,
+CostEvaluator and Reporter from a YAML or JSON scenario file without any
+GUI. Requires an initialized QgsApplication and the processing framework
+(see cli.py).
+
+Example scenario (paths are relative to the scenario file):
+
+    name: Woreda_Ada_Berga
+    output_dir: results/ada_berga
+    study_area: data/woredas.gpkg|layername=ada_berga
+    risk_analysis:
+      resolution: 1000
+      engine: numpy
+      factors:
+        - {path: data/livestock_density.tif, weight: 8, correlation: higher}
+        - {path: data/markets.shp, weight: 5, correlation: lower}
+    sampling:
+      strategy: stratified      # random | targeted | stratified
+      strata_counts: [5, 10, 20, 40]
+    cost:
+      cost_per_sample: 500
+      cost_per_diem: 1000
+      team_size: 2
+      samples_per_day: 10
+      cost_per_km: 20
+      hq: [38.75, 9.03]          # study area CRS, defaults to a point inside the study area
+      candidate_bases: data/towns.gpkg  # Optional: choose up to max_bases field bases among these points instead
+      max_bases: 3
+      cost_per_base: 20000
+      report_gap: false          # Also bound the optimality gap of the bases (slow for many candidates)
+      logistics: road_network    # straight_line (default) | road_network | tours | friction
+      road_layer: data/roads.gpkg
+      friction_raster: data/walking_friction.tif  # friction: minutes per metre, costed at cost_per_hour
+      cost_per_hour: 150
+      uncertainty:               # Optional Monte Carlo percentiles (see cost_uncertainty.py)
+        draws: 100000
+        seed: 42
+        distributions:
+          cost_per_km: {distribution: triangular, low: 15, mode: 20, high: 35}
+    report:
+      title: Ada Berga surveillance plan
+      author: NAHDIC
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from qgis.PyQt.QtCore import QSize
+from qgis.PyQt.QtGui import QColor
+from qgis.core import (
+    QgsMessageLog, Qgis, QgsProject, QgsVectorLayer, QgsRasterLayer, QgsPointXY,
+    QgsVectorFileWriter, QgsMapSettings, QgsMapRendererSequentialJob
+)
+from .risk_analyzer import RiskAnalyzer, LOWER_IS_HIGHER_RISK
+from .sampling_designer import SamplingDesigner
+from .cost_evaluator import CostEvaluator, COST_PARAMETERS
+from .cost_uncertainty import simulate_costs, DEFAULT_DRAWS
+from .reporter import Reporter
+from ..utils.gis_utils import interior_point
+from ..utils.output_profile import OutputProfile
+from ..utils.overviews import OVERVIEWS_SYNC
+
+try:
+    import yaml
+except ImportError:
+    yaml = None # PyYAML is optional; JSON scenarios always work
+
+HIGHER_IS_HIGHER_RISK = 'Higher values = Higher Risk'
+
+STRATEGY_RANDOM = 'random'
+STRATEGY_TARGETED = 'targeted'
+STRATEGY_STRATIFIED = 'stratified'
+
+# Strategy names as shown in the dialog, used in the report
+STRATEGY_LABELS = {
+    STRATEGY_RANDOM: "Simple Random",
+    STRATEGY_TARGETED: "Targeted (Risk-Based)",
+    STRATEGY_STRATIFIED: "Stratified"
+}
+
+class ScenarioError(Exception):
+    """Raised for an invalid scenario file or a failed pipeline stage."""
+
+def load_scenario(path):
+    """
+    Reads a scenario file (.json, .yaml or .yml) and resolves its relative
+    paths against the file's directory.
+    :return: The scenario dict.
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ScenarioError("PyYAML is not installed; use a JSON scenario file.")
+            scenario = yaml.safe_load(f)
+        else:
+            scenario = json.load(f)
+    if not isinstance(scenario, dict):
+        raise ScenarioError(f"{path}: a scenario must be a mapping.")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    scenario['output_dir'] = _resolve(base_dir, scenario.get('output_dir', os.path.join('results', scenario['name'])))
+    if 'study_area' not in scenario:
+        raise ScenarioError(f"{path}: 'study_area' is required.")
+    scenario['study_area'] = _resolve(base_dir, scenario['study_area'])
+    for factor in scenario.get('risk_analysis', {}).get('factors', []):
+        factor['path'] = _resolve(base_dir, factor['path'])
+    sampling = scenario.get('sampling', {})
+    if sampling.get('snap_layer'):
+        sampling['snap_layer'] = _resolve(base_dir, sampling['snap_layer'])
+    cost = scenario.get('cost') or {}
+    for key in ('road_layer', 'candidate_bases', 'friction_raster'):
+        if cost.get(key):
+            cost[key] = _resolve(base_dir, cost[key])
+    return scenario
+
+def _resolve(base_dir, source):
+    """Resolves a relative layer source ('path|options') against base_dir."""
+    path, sep, options = source.partition('|')
+    return os.path.normpath(os.path.join(base_dir, path)) + sep + options
+
+def load_layer(source, name, layer_type=None):
+    """
+    Loads a layer from a file source, as a vector layer if OGR can read it
+    and as a raster otherwise (or as layer_type: 'vector' / 'raster').
+    """
+    if layer_type != 'raster':
+        layer = QgsVectorLayer(source, name, "ogr")
+        if layer.isValid() or layer_type == 'vector':
+            return layer
+    return QgsRasterLayer(source, name)
+
+def correlation_label(value):
+    """Maps 'higher'/'lower' (or the dialog's labels) to the RiskAnalyzer correlation."""
+    if str(value).lower().startswith('lower'):
+        return LOWER_IS_HIGHER_RISK
+    return HIGHER_IS_HIGHER_RISK
+
+class ScenarioRunner:
+    """
+    Runs one scenario end to end: risk map, sampling points, cost and PDF
+    report, writing everything to the scenario's output_dir.
+    """
+    def __init__(self, scenario):
+        """
+        Constructor.
+        :param scenario: Dict returned by load_scenario().
+        """
+        self.scenario = scenario
+        self.name = scenario['name']
+        self.output_dir = scenario['output_dir']
+        self.project = QgsProject.instance()
+        self.summary = {'name': self.name, 'output_dir': self.output_dir, 'status': 'running', 'timings': {}}
+
+    def run(self):
+        """
+        Runs every configured stage.
+        :return: Summary dict (also written to output_dir/summary.json);
+                 'status' is 'ok' or 'failed' with an 'error' message.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.project.clear()
+        self.project.setHomePath(self.output_dir)
+        try:
+            study_area = load_layer(self.scenario['study_area'], "study_area", 'vector')
+            if not study_area.isValid():
+                raise ScenarioError(f"Could not load study area: {self.scenario['study_area']}")
+            self.project.addMapLayer(study_area)
+
+            risk_map = self._timed('risk_analysis', self.run_risk_analysis, study_area)
+            points = self._timed('sampling', self.run_sampling, risk_map, study_area)
+            costs = self._timed('cost', self.run_cost, points, study_area)
+            if 'report' in self.scenario:
+                self._timed('report', self.run_report, risk_map, points, study_area, costs)
+            self.summary['status'] = 'ok'
+        except Exception as e:
+            self.summary['status'] = 'failed'
+            self.summary['error'] = str(e)
+            QgsMessageLog.logMessage(f"Scenario '{self.name}' failed: {e}", "EthioRiskSurv-Toolbox", Qgis.Critical)
+        finally:
+            with open(os.path.join(self.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.summary, f, indent=2)
+            self.project.clear()
+        return self.summary
+
+    def run_risk_analysis(self, study_area):
+        """Module 1. :return: The risk map QgsRasterLayer."""
+        config = self.scenario.get('risk_analysis')
+        if not config:
+            raise ScenarioError("'risk_analysis' is required.")
+        risk_factors = []
+        for i, factor in enumerate(config.get('factors', [])):
+            layer = load_layer(factor['path'], factor.get('name', f"factor_{i + 1}"), factor.get('type'))
+            if not layer.isValid():
+                raise ScenarioError(f"Could not load risk factor: {factor['path']}")
+            risk_factors.append({'layer': layer, 'weight': factor.get('weight', 1), 'correlation': correlation_label(factor.get('correlation', 'higher'))})
+
+        options = {key: config[key] for key in ('engine', 'block_size', 'workers', 'minmax_mode', 'storage', 'memory_budget_mb',
+                                                'distance_method', 'resampling', 'align_factors') if key in config}
+        if 'snap_origin' in config:
+            options['snap_origin'] = tuple(config['snap_origin'])
+        if 'output_profile' in config:
+            options['output_profile'] = OutputProfile(**config['output_profile'])
+        analyzer = RiskAnalyzer(study_area, risk_factors, config.get('resolution', 1000), self.name,
+                                overviews=OVERVIEWS_SYNC, **options)
+        success, risk_map = analyzer.run()
+        if not success:
+            raise ScenarioError("Risk analysis failed.")
+        self.summary['risk_map'] = risk_map.source()
+        self.summary['factor_timings'] = dict(analyzer.factor_timings)
+        self.summary['stage_timings'] = analyzer.timing_summary
+        return risk_map
+
+    def run_sampling(self, risk_map, study_area):
+        """Module 2. :return: The sampling points layer, or None if not configured."""
+        config = self.scenario.get('sampling')
+        if not config:
+            return None
+        snap_layer = load_layer(config['snap_layer'], "snap_layer", 'vector') if config.get('snap_layer') else None
+        designer = SamplingDesigner(risk_map, study_area, config.get('output_name', f"{self.name}_Sampling_Points"), snap_layer)
+        strategy = config.get('strategy', STRATEGY_RANDOM)
+        if strategy == STRATEGY_RANDOM:
+            points = designer.generate_random_points(config['count'])
+        elif strategy == STRATEGY_TARGETED:
+            points = designer.generate_targeted_points(config['threshold'], config['count'])
+        elif strategy == STRATEGY_STRATIFIED:
+            strata_counts = config['strata_counts']
+            classified = designer.classify_risk_map(len(strata_counts))
+            points = designer.generate_stratified_points(classified, {i + 1: count for i, count in enumerate(strata_counts)})
+        else:
+            raise ScenarioError(f"Unknown sampling strategy: {strategy}")
+        if not points or not points.isValid():
+            raise ScenarioError("Sampling point generation did not produce a valid output.")
+
+        output_path = os.path.join(self.output_dir, config.get('output', f"{self.name}_sampling_points.gpkg"))
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        status, error = QgsVectorFileWriter.writeAsVectorFormatV3(points, output_path, self.project.transformContext(), options)[:2]
+        if status != QgsVectorFileWriter.NoError:
+            raise ScenarioError(f"Could not write sampling points: {error}")
+        self.summary['sampling'] = {'strategy': strategy, 'num_samples': points.featureCount(), 'output': output_path,
+                                    'stage_timings': designer.timing_summary}
+        return points
+
+    def run_cost(self, points, study_area):
+        """Module 3. :return: CostEvaluator results, or None if not configured."""
+        config = self.scenario.get('cost')
+        if not config or points is None:
+            return None
+        cost_params = {key: config[key] for key in COST_PARAMETERS if key in config}
+        hq = config.get('hq')
+        cost_params['hq_point'] = QgsPointXY(*hq) if hq else interior_point(study_area)
+        if config.get('logistics'):
+            cost_params['logistics_mode'] = config['logistics']
+        if config.get('road_layer'):
+            cost_params['road_layer'] = load_layer(config['road_layer'], "roads", 'vector')
+        if config.get('friction_raster'):
+            cost_params['friction_raster'] = load_layer(config['friction_raster'], "friction", 'raster')
+        evaluator = CostEvaluator(points, cost_params)
+        if config.get('candidate_bases'):
+            candidates = load_layer(config['candidate_bases'], "candidate bases", 'vector')
+            if not evaluator.choose_bases(candidates, config.get('max_bases', 1), config.get('cost_per_base', 0), config.get('report_gap', False)):
+                raise ScenarioError(f"No field base could be chosen from {config['candidate_bases']}.")
+        results = evaluator.calculate_total_cost()
+        if not results:
+            raise ScenarioError("Cost evaluation failed.")
+        uncertainty = config.get('uncertainty')
+        if uncertainty:
+            results['uncertainty'] = simulate_costs(evaluator, uncertainty.get('distributions', {}), uncertainty.get('draws', DEFAULT_DRAWS),
+                                                    uncertainty.get('seed'), uncertainty.get('jobs', 1))
+        self.summary['cost'] = results
+        return results
+
+    def run_report(self, risk_map, points, study_area, costs):
+        """Module 4: renders the map headlessly and builds the PDF report."""
+        config = self.scenario['report']
+        map_image_path = os.path.join(self.output_dir, f"{self.name}_map.png")
+        render_map_image([layer for layer in (points, study_area, risk_map) if layer is not None], map_image_path)
+
+        sampling = self.scenario.get('sampling', {})
+        strategy = STRATEGY_LABELS.get(sampling.get('strategy', STRATEGY_RANDOM), "N/A")
+        report_data = {
+            'report_title': config.get('title', self.name), 'report_author': config.get('author', 'N/A'),
+            'report_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'project_name': self.name,
+            'objective': config.get('objective', 'N/A'), 'study_area_name': os.path.basename(self.scenario['study_area']),
+            'sampling_strategy': strategy, 'total_samples': points.featureCount() if points else "N/A",
+            'snap_layer_name': os.path.basename(sampling['snap_layer']) if sampling.get('snap_layer') else None,
+            'map_image_path': map_image_path, 'cost_scenarios': [],
+            'risk_factors': [{'name': os.path.basename(factor['path']), 'weight': factor.get('weight', 1),
+                              'correlation': correlation_label(factor.get('correlation', 'higher'))}
+                             for factor in self.scenario['risk_analysis'].get('factors', [])]
+        }
+        if costs:
+            report_data['total_cost'] = costs['total_cost']
+            report_data['cost_scenarios'].append([self.name, strategy, str(costs['num_samples']),
+                                                  f"{costs['total_cost']:.0f}", f"{costs['cost_per_sample']:.0f}"])
+        output_path = os.path.join(self.output_dir, config.get('output', f"{self.name}_report.pdf"))
+        if not Reporter(report_data).build_report(output_path):
+            raise ScenarioError("Failed to build the PDF report.")
+        self.summary['report'] = output_path
+
+    def _timed(self, stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.summary['timings'][stage] = round(time.perf_counter() - start, 3)
+        return result
+
+def render_map_image(layers, path, width=1600, height=1200):
+    """
+    Renders layers (top first) to a PNG without a map canvas, for the report.
+    Raster layers draw from their overviews when they have any.
+    """
+    settings = QgsMapSettings()
+    settings.setLayers(layers)
+    settings.setDestinationCrs(layers[-1].crs())
+    settings.setExtent(layers[-1].extent())
+    settings.setOutputSize(QSize(width, height))
+    settings.setBackgroundColor(QColor(255, 255, 255))
+    job = QgsMapRendererSequentialJob(settings)
+    job.start()
+    job.waitForFinished()
+    job.renderedImage().save(path, "png")
+    return path
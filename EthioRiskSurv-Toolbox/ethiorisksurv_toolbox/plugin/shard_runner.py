@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs one scenario over many study areas (e.g. every woreda of a zone) on a
+process pool. The study-area layer is split into shards by an attribute,
+each shard runs as its own scenario in a worker process with its own
+QgsApplication, and the results are merged into a single GeoPackage as the
+shards complete:
+
+- risk_map_<shard>: one raster table per study area
+- sampling_points: all sampling points, with a 'shard' column
+- shards: one row per study area with its status, cost and timings
+
+The shards table doubles as the resume log: re-running the same command
+skips every shard already merged with status 'ok' and retries the others.
+"""
+
+import copy
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+from osgeo import gdal, ogr
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+
+SHARDS_TABLE = 'shards'
+POINTS_TABLE = 'sampling_points'
+
+# GeoPackage tables describing a raster table, as (table, column naming it), children first
+RASTER_METADATA_TABLES = [
+    ('gpkg_2d_gridded_tile_ancillary', 'tpudt_name'), ('gpkg_2d_gridded_coverage_ancillary', 'tile_matrix_set_name'),
+    ('gpkg_metadata_reference', 'table_name'), ('gpkg_extensions', 'table_name'),
+    ('gpkg_tile_matrix', 'table_name'), ('gpkg_tile_matrix_set', 'table_name'), ('gpkg_contents', 'table_name')
+]
+
+SHARD_FIELDS = [
+    ('shard', ogr.OFTString), ('status', ogr.OFTString), ('error', ogr.OFTString),
+    ('num_samples', ogr.OFTInteger), ('total_cost', ogr.OFTReal), ('cost_per_sample', ogr.OFTReal),
+    ('fixed_costs', ogr.OFTReal), ('personnel_costs', ogr.OFTReal), ('logistics_costs', ogr.OFTReal),
+    ('seconds', ogr.OFTReal), ('risk_map_table', ogr.OFTString), ('finished', ogr.OFTString)
+]
+
+
+def open_source_layer(source):
+    """Opens an OGR layer from a 'path|layername=name' source. :return: (datasource, layer)"""
+    path, _, options = source.partition('|')
+    datasource = ogr.Open(path)
+    layer_name = dict(option.split('=', 1) for option in options.split('|') if '=' in option).get('layername')
+    return datasource, (datasource.GetLayerByName(layer_name) if layer_name else datasource.GetLayer(0))
+
+
+def list_shards(source, field):
+    """Distinct values of field in the study-area layer, as strings, in feature order."""
+    datasource, layer = open_source_layer(source)
+    if layer.GetLayerDefn().GetFieldIndex(field) < 0:
+        raise ValueError(f"Field '{field}' not found in {source}")
+    shards = []
+    for feature in layer:
+        value = feature.GetField(field)
+        if value is not None and str(value) not in shards:
+            shards.append(str(value))
+    datasource = None
+    return shards
+
+
+def shard_scenario(scenario, field, shard, work_dir):
+    """
+    The scenario restricted to one study area: an OGR subset of the
+    study-area layer and its own output directory.
+    """
+    shard_scenario = copy.deepcopy(scenario)
+    shard_scenario['name'] = f"{scenario['name']}_{safe_name(shard)}"
+    shard_scenario['output_dir'] = os.path.join(work_dir, safe_name(shard))
+    path, _, options = scenario['study_area'].partition('|')
+    options = [option for option in options.split('|') if option and not option.startswith('subset=')]
+    quoted = shard.replace("'", "''")
+    options.append(f"subset=\"{field}\" = '{quoted}'")
+    shard_scenario['study_area'] = '|'.join([path] + options)
+    return shard_scenario
+
+
+def gdal_exceptions():
+    """
+    raster_engine.gdal_exceptions(), imported on use: like the scenario
+    code, it needs QGIS, which worker processes only set up in run_shard.
+    """
+    from ..utils.raster_engine import gdal_exceptions
+    return gdal_exceptions()
+
+
+def safe_name(value):
+    """Shard value usable in file and table names."""
+    return re.sub(r'[^0-9A-Za-z_]+', '_', str(value)).strip('_') or 'shard'
+
+
+def run_shard(scenario, shard, log_level='warning'):
+    """
+    Worker entry point: runs one shard scenario in this process, with the
+    process's own QgsApplication.
+    :return: (shard, summary)
+    """
+    from ..cli import init_qgis
+    init_qgis(log_level)
+    from .scenario import ScenarioRunner
+    try:
+        summary = ScenarioRunner(scenario).run()
+    except Exception as e: # Anything not caught by the runner must not take the pool down
+        summary = {'name': scenario['name'], 'status': STATUS_FAILED, 'error': str(e), 'timings': {}}
+    return shard, summary
+
+
+class ShardRunner:
+    """
+    Shards a scenario by study area, runs the shards on a process pool and
+    merges their outputs into one GeoPackage.
+    """
+    def __init__(self, scenario, field, output_path, jobs=1, work_dir=None, log_level='warning', progress=None):
+        """
+        Constructor.
+        :param scenario: Dict from plugin.scenario.load_scenario(); its study_area holds every study area.
+        :param field: Attribute of the study-area layer identifying a study area.
+        :param output_path: GeoPackage the results are merged into (and resumed from).
+        :param jobs: Number of worker processes.
+        :param work_dir: Per-shard outputs; defaults to scenario['output_dir']/shards.
+        :param progress: Optional callable(done, total, shard, summary) called after each merge.
+        """
+        self.scenario = scenario
+        self.field = field
+        self.output_path = output_path
+        self.jobs = max(1, jobs)
+        self.work_dir = work_dir or os.path.join(scenario['output_dir'], 'shards')
+        self.log_level = log_level
+        self.progress = progress or self._print_progress
+        self.worker = run_shard # Called in the worker processes; must be a picklable module-level function
+        self.start_time = None
+
+    def run(self, restart=False):
+        """
+        Runs every shard not yet completed.
+        :param restart: Ignore (and overwrite) the results of a previous run.
+        :return: Dict with the 'total', 'skipped', 'ok' and 'failed' shard counts.
+        """
+        with gdal_exceptions():
+            return self._run(restart)
+
+    def _run(self, restart):
+        if restart and os.path.exists(self.output_path):
+            gdal.GetDriverByName('GPKG').Delete(self.output_path)
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        shards = list_shards(self.scenario['study_area'], self.field)
+        completed = self.completed_shards()
+        pending = [shard for shard in shards if shard not in completed]
+        counts = {'total': len(shards), 'skipped': len(shards) - len(pending), STATUS_OK: 0, STATUS_FAILED: 0}
+        if counts['skipped']:
+            print(f"Resuming: {counts['skipped']} of {len(shards)} study areas already completed.")
+
+        self.start_time = time.perf_counter()
+        for shard, summary in self._execute(pending):
+            self.merge(shard, summary)
+            counts[summary['status'] if summary['status'] == STATUS_OK else STATUS_FAILED] += 1
+            self.progress(counts[STATUS_OK] + counts[STATUS_FAILED], len(pending), shard, summary)
+        return counts
+
+    def completed_shards(self):
+        """Shards recorded with status 'ok' in the output GeoPackage."""
+        if not os.path.exists(self.output_path):
+            return set()
+        with gdal_exceptions():
+            datasource = gdal.OpenEx(self.output_path, gdal.OF_VECTOR)
+        layer = datasource.GetLayerByName(SHARDS_TABLE)
+        completed = set()
+        if layer is not None:
+            layer.SetAttributeFilter(f"status = '{STATUS_OK}'")
+            completed = {feature.GetField('shard') for feature in layer}
+        datasource = None
+        return completed
+
+    def _execute(self, shards):
+        """
+        Yields (shard, summary) as shards finish, at most self.jobs at a time.
+        A crashed worker process only fails the shards that were running
+        (results already delivered are kept); the pool is recreated for the rest.
+        """
+        queue = list(shards)
+        context = multiprocessing.get_context('spawn') # A clean interpreter for each worker's QgsApplication
+        while queue:
+            executor = ProcessPoolExecutor(max_workers=self.jobs, mp_context=context)
+            running = {}
+            try:
+                while queue or running:
+                    while queue and len(running) < self.jobs:
+                        shard = queue.pop(0)
+                        scenario = shard_scenario(self.scenario, self.field, shard, self.work_dir)
+                        running[executor.submit(self.worker, scenario, shard, self.log_level)] = shard
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            raise # The shard is still in running and fails with the others below
+                        except Exception as e:
+                            result = running[future], {'name': running[future], 'status': STATUS_FAILED, 'error': str(e), 'timings': {}}
+                        del running[future]
+                        yield result
+            except BrokenProcessPool:
+                for future, shard in list(running.items()):
+                    del running[future]
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        yield future.result() # Finished before the pool broke
+                    else:
+                        yield shard, {'name': shard, 'status': STATUS_FAILED, 'error': "Worker process terminated unexpectedly.", 'timings': {}}
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def merge(self, shard, summary):
+        """
+        Adds one shard's outputs to the GeoPackage. Re-merging a shard
+        replaces its previous raster table and rows (a failed shard keeps
+        none), so an interrupted merge is safe to repeat.
+        """
+        with gdal_exceptions():
+            self._merge(shard, summary)
+
+    def _merge(self, shard, summary):
+        quoted = shard.replace("'", "''")
+        raster_table = f"risk_map_{safe_name(shard)}"
+        if os.path.exists(self.output_path):
+            self._drop_raster_table(raster_table, quoted)
+        if summary['status'] == STATUS_OK and summary.get('risk_map'):
+            self._merge_raster(summary['risk_map'], raster_table)
+        else:
+            raster_table = None
+
+        if os.path.exists(self.output_path): # May hold only raster tables so far
+            datasource = gdal.OpenEx(self.output_path, gdal.OF_VECTOR | gdal.OF_UPDATE)
+        else:
+            datasource = ogr.GetDriverByName('GPKG').CreateDataSource(self.output_path)
+        datasource.StartTransaction()
+        try:
+            points_output = summary.get('sampling', {}).get('output') if summary['status'] == STATUS_OK else None
+            if points_output:
+                self._merge_points(datasource, points_output, shard, quoted)
+            elif datasource.GetLayerByName(POINTS_TABLE) is not None:
+                datasource.ExecuteSQL(f"DELETE FROM \"{POINTS_TABLE}\" WHERE shard = '{quoted}'")
+            shards_layer = self._shards_layer(datasource)
+            datasource.ExecuteSQL(f"DELETE FROM \"{SHARDS_TABLE}\" WHERE shard = '{quoted}'")
+            row = ogr.Feature(shards_layer.GetLayerDefn())
+            cost = summary.get('cost') or {}
+            breakdown = cost.get('breakdown', {})
+            values = {
+                'shard': shard, 'status': summary['status'], 'error': summary.get('error'),
+                'num_samples': cost.get('num_samples', summary.get('sampling', {}).get('num_samples')),
+                'total_cost': cost.get('total_cost'), 'cost_per_sample': cost.get('cost_per_sample'),
+                'fixed_costs': breakdown.get('fixed_costs'), 'personnel_costs': breakdown.get('personnel_costs'),
+                'logistics_costs': breakdown.get('logistics_costs'),
+                'seconds': sum(summary.get('timings', {}).values()), 'risk_map_table': raster_table,
+                'finished': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            for name, value in values.items():
+                if value is not None:
+                    row.SetField(name, value)
+            shards_layer.CreateFeature(row)
+            datasource.CommitTransaction()
+        except Exception:
+            datasource.RollbackTransaction()
+            raise
+        finally:
+            datasource = None
+
+    def _drop_raster_table(self, table, quoted):
+        """
+        Removes a shard's raster table from a previous merge with its
+        GeoPackage metadata rows. Its shards row goes in the same
+        transaction, so a merge interrupted before the new raster is in
+        place leaves the shard to be retried rather than completed.
+        """
+        datasource = gdal.OpenEx(self.output_path, gdal.OF_VECTOR | gdal.OF_UPDATE)
+        try:
+            result = datasource.ExecuteSQL("SELECT name FROM sqlite_master WHERE type = 'table'")
+            tables = {feature.GetField(0) for feature in result}
+            datasource.ReleaseResultSet(result)
+            if table not in tables:
+                return
+            datasource.StartTransaction()
+            try:
+                if SHARDS_TABLE in tables:
+                    datasource.ExecuteSQL(f"DELETE FROM \"{SHARDS_TABLE}\" WHERE shard = '{quoted}'")
+                for metadata_table, column in RASTER_METADATA_TABLES:
+                    if metadata_table in tables:
+                        datasource.ExecuteSQL(f"DELETE FROM {metadata_table} WHERE {column} = '{table}'")
+                datasource.ExecuteSQL(f"DROP TABLE \"{table}\"")
+                datasource.CommitTransaction()
+            except Exception:
+                datasource.RollbackTransaction()
+                raise
+        finally:
+            datasource = None
+
+    def _merge_raster(self, risk_map_path, table):
+        """Copies a risk map into a new raster table (Float32 TIFF tiles)."""
+        options = [f'RASTER_TABLE={table}', 'TILE_FORMAT=TIFF']
+        if os.path.exists(self.output_path):
+            options.append('APPEND_SUBDATASET=YES')
+        gdal.Translate(self.output_path, risk_map_path, format='GPKG', creationOptions=options)
+
+    def _merge_points(self, datasource, points_path, shard, quoted):
+        """Replaces the shard's rows of the sampling_points layer with its new points."""
+        source = ogr.Open(points_path)
+        source_layer = source.GetLayer(0)
+        target = datasource.GetLayerByName(POINTS_TABLE)
+        if target is None:
+            target = datasource.CreateLayer(POINTS_TABLE, source_layer.GetSpatialRef(), source_layer.GetGeomType())
+            target.CreateField(ogr.FieldDefn('shard', ogr.OFTString))
+            source_defn = source_layer.GetLayerDefn()
+            for i in range(source_defn.GetFieldCount()):
+                if source_defn.GetFieldDefn(i).GetName() != 'shard':
+                    target.CreateField(source_defn.GetFieldDefn(i))
+        else:
+            datasource.ExecuteSQL(f"DELETE FROM \"{POINTS_TABLE}\" WHERE shard = '{quoted}'")
+
+        target_defn = target.GetLayerDefn()
+        for feature in source_layer:
+            row = ogr.Feature(target_defn)
+            row.SetGeometry(feature.GetGeometryRef())
+            for i in range(feature.GetFieldCount()):
+                name = feature.GetFieldDefnRef(i).GetName()
+                if name != 'shard' and target_defn.GetFieldIndex(name) >= 0:
+                    row.SetField(name, feature.GetField(i))
+            row.SetField('shard', shard)
+            target.CreateFeature(row)
+        source = None
+
+    def _shards_layer(self, datasource):
+        layer = datasource.GetLayerByName(SHARDS_TABLE)
+        if layer is None:
+            layer = datasource.CreateLayer(SHARDS_TABLE, geom_type=ogr.wkbNone)
+            for name, field_type in SHARD_FIELDS:
+                layer.CreateField(ogr.FieldDefn(name, field_type))
+        return layer
+
+    def _print_progress(self, done, total, shard, summary):
+        elapsed = time.perf_counter() - self.start_time
+        eta = elapsed / done * (total - done) if done else 0
+        status = 'OK' if summary['status'] == STATUS_OK else f"FAILED ({summary.get('error')})"
+        print(f"[{done}/{total}] {shard}: {status} - elapsed {elapsed:.0f} s, ETA {eta:.0f} s", flush=True)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import numpy as np
+from qgis.core import QgsMessageLog, Qgis, QgsRasterLayer
+from ..utils import raster_engine
+
+class WeightTuner:
+    """
+    Interactive weight tuning for Module 1. Keeps the normalized factor stack
+    of a RiskAnalyzer in memory and updates the weighted overlay
+    incrementally when a single weight changes, instead of re-running the
+    whole pipeline.
+    """
+    def __init__(self, analyzer):
+        """
+        Constructor.
+        :param analyzer: A configured RiskAnalyzer whose factors will be tuned.
+        """
+        self.analyzer = analyzer
+        self.grid = None
+        self.stack = {}
+        self.weights = {}
+        self.inside = None
+        self.weighted_sum = None
+        self.preview_layer = None
+        self.preview_path = os.path.join(tempfile.gettempdir(), f"{analyzer.project_name.replace(' ', '_')}_RiskPreview_{id(self)}.tif")
+
+    def load(self):
+        """
+        Reads and normalizes every factor once and computes the initial overlay.
+        :return: True if at least one factor could be loaded.
+        """
+        QgsMessageLog.logMessage("Loading factor stack for weight tuning.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        self.grid, self.stack, self.inside = self.analyzer.build_factor_stack()
+        if not self.stack:
+            QgsMessageLog.logMessage("No factors could be loaded for weight tuning.", "EthioRiskSurv-Toolbox", Qgis.Critical)
+            return False
+        self.weights = {index: self.analyzer.risk_factors[index]['weight'] for index in self.stack}
+        self.recompute()
+        return True
+
+    def recompute(self):
+        """Rebuilds the weighted sum from scratch (also clears accumulated rounding)."""
+        self.weighted_sum = np.zeros((self.grid.height, self.grid.width), dtype=np.float64)
+        for index, array in self.stack.items():
+            self.weighted_sum += array.astype(np.float64) * self.weights[index]
+
+    def set_weight(self, index, weight):
+        """
+        Changes the weight of one factor by adding (new - old) times its
+        normalized array to the weighted sum: one pass over one factor.
+        :param index: Position of the factor in analyzer.risk_factors.
+        :return: True if the overlay changed.
+        """
+        if index not in self.stack or self.weights[index] == weight:
+            return False
+        self.weighted_sum += self.stack[index].astype(np.float64) * (weight - self.weights[index])
+        self.weights[index] = weight
+        self.analyzer.risk_factors[index]['weight'] = weight
+        return True
+
+    def risk(self):
+        """Current risk surface as a float32 array, NaN outside the study area."""
+        total_weight = sum(self.weights.values())
+        if total_weight == 0:
+            return np.full((self.grid.height, self.grid.width), np.nan, dtype=np.float32)
+        risk = (self.weighted_sum / total_weight).astype(np.float32)
+        risk[~self.inside] = np.nan
+        return risk
+
+    def update_preview(self, project=None):
+        """
+        Writes the current risk surface and refreshes the preview layer,
+        adding it to the project on first use.
+        :return: The preview QgsRasterLayer.
+        """
+        raster_engine.write_array(self.preview_path, self.risk(), self.grid)
+        if self.preview_layer is None:
+            self.preview_layer = QgsRasterLayer(self.preview_path, f"{self.analyzer.project_name} - Risk Preview")
+            (project or self.analyzer.project).addMapLayer(self.preview_layer)
+        else:
+            self.preview_layer.dataProvider().reloadData()
+            self.preview_layer.triggerRepaint()
+        return self.preview_layer
+
+    def close(self, project=None):
+        """Removes the preview layer and its file and releases the factor stack."""
+        if self.preview_layer is not None:
+            (project or self.analyzer.project).removeMapLayer(self.preview_layer.id())
+            self.preview_layer = None
+        if os.path.exists(self.preview_path):
+            os.remove(self.preview_path)
+        self.stack = {}
+        self.weighted_sum = None
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import os
-import processing
 from datetime import datetime
 from qgis.PyQt.QtWidgets import (
     QAction, QDialog, QTableWidgetItem, QComboBox, QSpinBox, 
@@ -10,8 +9,8 @@ from qgis.PyQt.QtWidgets import (
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import (
     QgsProject, QgsMessageLog, Qgis, QgsMapLayerProxyModel, 
-    QgsVectorLayer, QgsRasterLayer, QgsRasterBandStats, QgsPointXY,
-    QgsVectorFileWriter
+    QgsVectorLayer, QgsRasterLayer, QgsPointXY,
+    QgsVectorFileWriter, QgsTask
 )
 from PyQt5.QtCore import Qt
 from qgis.utils import iface
@@ -22,8 +21,10 @@ from .core.risk_analyzer import RiskAnalyzer
 from .core.sampling_designer import SamplingDesigner
 from .core.cost_evaluator import CostEvaluator
 from .core.reporter import Reporter
+from .core.weight_tuner import WeightTuner
+from .core.module_task import ModuleTask, start_task
 # ... (other imports)
-from .utils.gis_utils import load_resource_layer
+from .utils.gis_utils import load_resource_layer, detach_layer, interior_point
 
 class EthioRiskSurvToolbox:
     def __init__(self, iface):
@@ -76,6 +77,12 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         self.last_sampling_plan = None
         self.last_strategy_name = ""
         self.last_risk_map = None
+        self.weight_tuner = None
+        self.loading_tuner = None # WeightTuner whose factor stack is being loaded
+        self.overview_task = None
+        self.running_task = None # Module currently running in the background (see start_module_task)
+        self.cost_evaluator = None # Reused while the sampling plan is unchanged, keeping its distances
+        self.cost_evaluator_plan = None
         
         # --- Run setup functions ---
         self.setup_ui_logic()
@@ -99,6 +106,9 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         self.table_stratified_n.horizontalHeader().setStretchLastSection(True)
         
         # --- Tab 3 ---
+        self.mMapLayerComboBox_candidate_bases.setFilters(QgsMapLayerProxyModel.PointLayer)
+        self.mMapLayerComboBox_candidate_bases.setAllowEmptyLayer(True)
+        self.mMapLayerComboBox_candidate_bases.setLayer(None)
         self.table_scenarios.setColumnWidth(0, 120)
         self.table_scenarios.setColumnWidth(2, 60)
         self.table_scenarios.horizontalHeader().setStretchLastSection(True)
@@ -141,14 +151,51 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
             item_name = QTableWidgetItem(layer_name)
             item_name.setData(Qt.UserRole, layer_path)
             self.table_risk_factors.setItem(row_position, 0, item_name)
-            spin_box = QSpinBox(); spin_box.setRange(1, 10); self.table_risk_factors.setCellWidget(row_position, 1, spin_box)
+            spin_box = QSpinBox(); spin_box.setRange(1, 10); spin_box.valueChanged.connect(self.on_factor_weight_changed); self.table_risk_factors.setCellWidget(row_position, 1, spin_box)
             combo_corr = QComboBox(); combo_corr.addItems(["Higher values = Higher Risk", "Lower values = Higher Risk"]); self.table_risk_factors.setCellWidget(row_position, 2, combo_corr)
             layer_type = "Vector" if layer_path.lower().endswith(('.shp', '.gpkg')) else "Raster"
             self.table_risk_factors.setItem(row_position, 3, QTableWidgetItem(layer_type))
+        self.stop_weight_tuning() # The factor stack no longer matches the table
             
     def remove_risk_factor_row(self):
         current_row = self.table_risk_factors.currentRow()
-        if current_row > -1: self.table_risk_factors.removeRow(current_row)
+        if current_row > -1:
+            self.table_risk_factors.removeRow(current_row)
+            self.stop_weight_tuning()
+
+    def on_factor_weight_changed(self, value):
+        """Incrementally refreshes the risk preview when live weight tuning is active."""
+        if not self.weight_tuner: return
+        spin_box = self.sender()
+        for row in range(self.table_risk_factors.rowCount()):
+            if self.table_risk_factors.cellWidget(row, 1) is spin_box:
+                if self.weight_tuner.set_weight(row, value): self.weight_tuner.update_preview()
+                return
+
+    def start_weight_tuning(self, analyzer):
+        """Loads the factor stack in the background; tuning starts once it is loaded."""
+        self.stop_weight_tuning()
+        tuner = self.loading_tuner = WeightTuner(analyzer)
+        self.start_module_task("Loading factors for weight tuning", lambda feedback: tuner.load(),
+                               lambda success, result: self.on_weight_tuning_loaded(tuner, success), self.btn_generate_risk_map)
+
+    def on_weight_tuning_loaded(self, tuner, success):
+        if tuner is not self.loading_tuner: # The factor table changed while loading
+            tuner.close(); return
+        self.loading_tuner = None
+        if not success:
+            iface.messageBar().pushMessage("Warning", "Live weight tuning is unavailable: no factor could be loaded.", level=Qgis.Warning); return
+        for row in range(self.table_risk_factors.rowCount()): # Weights changed while loading
+            tuner.set_weight(row, self.table_risk_factors.cellWidget(row, 1).value())
+        tuner.update_preview()
+        self.weight_tuner = tuner
+        iface.messageBar().pushMessage("Info", "Live weight tuning active: weight changes update the risk preview.", level=Qgis.Info, duration=5)
+
+    def stop_weight_tuning(self):
+        self.loading_tuner = None
+        if self.weight_tuner:
+            self.weight_tuner.close()
+            self.weight_tuner = None
 
     def run_risk_analysis(self):
         project_name = self.le_project_name.text()
@@ -167,17 +214,24 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
             risk_factors_data.append({'layer': layer, 'weight': self.table_risk_factors.cellWidget(row, 1).value(), 'correlation': self.table_risk_factors.cellWidget(row, 2).currentText()})
         if not risk_factors_data:
             iface.messageBar().pushMessage("Error", "Please add at least one risk factor.", level=Qgis.Critical); return
+        analyzer = RiskAnalyzer(detach_layer(study_area_layer), risk_factors_data, resolution, project_name)
+        self.start_module_task(f"Risk analysis for '{project_name}'", analyzer.produce,
+                               lambda success, path: self.on_risk_analysis_finished(analyzer, path if success else None), self.btn_generate_risk_map)
+
+    def on_risk_analysis_finished(self, analyzer, path):
         try:
-            iface.messageBar().pushMessage("Info", "Starting risk analysis...", level=Qgis.Info, duration=10)
-            analyzer = RiskAnalyzer(study_area_layer, risk_factors_data, resolution, project_name)
-            success, final_map = analyzer.run()
+            success, final_map = analyzer.load_risk_map(path) if path else (False, None)
             if success and final_map:
                 self.last_risk_map = final_map
+                self.overview_task = analyzer.overview_task # Keeps the background QgsTask alive
                 self.mMapLayerComboBox_risk_map.setLayer(self.last_risk_map) # Auto-populate in Tab 2
-                iface.messageBar().pushMessage("Success", f"Risk Map for '{project_name}' created!", level=Qgis.Success, duration=10)
+                iface.messageBar().pushMessage("Success", f"Risk Map for '{analyzer.project_name}' created!", level=Qgis.Success, duration=10)
+                if self.checkBox_live_weights.isChecked():
+                    self.start_weight_tuning(analyzer)
+                    return # Stay on Tab 1 while tuning
                 self.tab_widget.setCurrentIndex(1)
             else:
-                iface.messageBar().pushMessage("Error", "Risk analysis failed. Check QGIS Message Log.", level=Qgis.Critical)
+                iface.messageBar().pushMessage("Error", "Risk analysis failed or was canceled. Check QGIS Message Log.", level=Qgis.Critical)
         except Exception as e:
             QgsMessageLog.logMessage(f"An error occurred: {str(e)}", "EthioSurv-RiskToolbox", Qgis.Critical)
 
@@ -188,15 +242,13 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         risk_map = self.mMapLayerComboBox_risk_map.currentLayer()
         if not risk_map: iface.messageBar().pushMessage("Error", "Please select a Risk Map Layer.", level=Qgis.Critical); return
         num_strata = self.spinBox_strata_count.value()
-        stats = risk_map.dataProvider().bandStatistics(1, QgsRasterBandStats.All)
-        min_val, max_val = stats.minimumValue, stats.maximumValue
-        step = (max_val - min_val) / num_strata
-        reclass_table = [[min_val + (i * step), min_val + ((i + 1) * step), i + 1] for i in range(num_strata)]
-        reclass_table[-1][1] = max_val
-        params = {'INPUT_RASTER': risk_map, 'RASTER_BAND': 1, 'TABLE': reclass_table, 'OUTPUT': 'memory:'}
-        result = processing.run("native:reclassifybytable", params)
-        self.classified_risk_raster = result['OUTPUT']
-        self.classified_risk_raster.setName(f"{risk_map.name()}_{num_strata}_Strata")
+        risk_map = detach_layer(risk_map)
+        self.start_module_task("Classifying risk map", lambda feedback: SamplingDesigner(risk_map, None, None, feedback=feedback, add_to_project=False).classify_risk_map(num_strata),
+                               lambda success, layer: self.on_classification_finished(layer if success else None, num_strata), self.btn_classify_risk_map)
+
+    def on_classification_finished(self, classified_raster, num_strata):
+        if not classified_raster or not classified_raster.isValid(): iface.messageBar().pushMessage("Error", "Risk map classification failed or was canceled.", level=Qgis.Critical); return
+        self.classified_risk_raster = classified_raster
         QgsProject.instance().addMapLayer(self.classified_risk_raster)
         self.table_stratified_n.setRowCount(num_strata)
         for i in range(num_strata):
@@ -211,16 +263,24 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         snap_layer = self.mMapLayerComboBox_snap_layer.currentLayer()
         output_name = self.le_output_name.text()
         if not risk_map or not study_area: iface.messageBar().pushMessage("Error", "Risk Map and Study Area layers are required.", level=Qgis.Critical); return
-        designer = SamplingDesigner(risk_map, study_area, output_name, snap_layer)
-        result_layer = None
+        if strategy_name == "Stratified" and not self.classified_risk_raster: iface.messageBar().pushMessage("Error", "Please classify the risk map first.", level=Qgis.Critical); return
+        # Everything the task needs is read from the dialog and the project now, in the main thread
+        risk_map, study_area, snap_layer = detach_layer(risk_map), detach_layer(study_area), detach_layer(snap_layer)
+        random_n, threshold, targeted_n = self.spinBox_random_n.value(), self.doubleSpinBox_risk_threshold.value(), self.spinBox_targeted_n.value()
+        classified_raster = detach_layer(self.classified_risk_raster) if strategy_name == "Stratified" else None
+        strata_counts = {i + 1: self.table_stratified_n.cellWidget(i, 1).value() for i in range(self.table_stratified_n.rowCount())}
+
+        def work(feedback):
+            designer = SamplingDesigner(risk_map, study_area, output_name, snap_layer, feedback=feedback, add_to_project=False)
+            if strategy_name == "Simple Random": return designer.generate_random_points(random_n)
+            if strategy_name == "Targeted (Risk-Based)": return designer.generate_targeted_points(threshold, targeted_n)
+            return designer.generate_stratified_points(classified_raster, strata_counts)
+        self.start_module_task(f"Sampling design ({strategy_name})", work, lambda success, layer: self.on_sampling_design_finished(layer if success else None, strategy_name), self.btn_generate_samples)
+
+    def on_sampling_design_finished(self, result_layer, strategy_name):
         try:
-            if strategy_name == "Simple Random": result_layer = designer.generate_random_points(self.spinBox_random_n.value())
-            elif strategy_name == "Targeted (Risk-Based)": result_layer = designer.generate_targeted_points(self.doubleSpinBox_risk_threshold.value(), self.spinBox_targeted_n.value())
-            elif strategy_name == "Stratified":
-                if not self.classified_risk_raster: iface.messageBar().pushMessage("Error", "Please classify the risk map first.", level=Qgis.Critical); return
-                strata_counts = {i + 1: self.table_stratified_n.cellWidget(i, 1).value() for i in range(self.table_stratified_n.rowCount())}
-                result_layer = designer.generate_stratified_points(self.classified_risk_raster, strata_counts)
             if result_layer and result_layer.isValid():
+                QgsProject.instance().addMapLayer(result_layer)
                 iface.messageBar().pushMessage("Success", f"Sampling points generated: {result_layer.name()}", level=Qgis.Success)
                 self.last_sampling_plan = result_layer
                 self.last_strategy_name = strategy_name
@@ -236,11 +296,17 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         if not self.last_sampling_plan or not self.last_sampling_plan.isValid(): iface.messageBar().pushMessage("Error", "Please generate a sampling plan in Tab 2 first.", level=Qgis.Critical); return
         study_area_layer = self.mMapLayerComboBox_study_area.currentLayer()
         if not study_area_layer: iface.messageBar().pushMessage("Error", "Study Area layer is required.", level=Qgis.Critical); return
-        self.hq_point = study_area_layer.extent().center()
+        self.hq_point = interior_point(study_area_layer) # Inside the study area, unlike its extent centre
         cost_params = {'cost_per_sample': self.spinBox_cost_per_sample.value(), 'cost_per_diem': self.spinBox_cost_per_diem.value(), 'team_size': self.spinBox_team_size.value(), 'samples_per_day': self.spinBox_samples_per_day.value(), 'cost_per_km': self.spinBox_cost_per_km.value(), 'hq_point': self.hq_point}
-        evaluator = CostEvaluator(self.last_sampling_plan, cost_params)
-        results = evaluator.calculate_total_cost()
-        if not results: iface.messageBar().pushMessage("Error", "Cost evaluation failed.", level=Qgis.Critical); return
+        if self.cost_evaluator is None or self.cost_evaluator_plan is not self.last_sampling_plan: self.cost_evaluator, self.cost_evaluator_plan = CostEvaluator(detach_layer(self.last_sampling_plan), cost_params), self.last_sampling_plan
+        else: self.cost_evaluator.update_params(cost_params) # Only the unit costs changed: no new pass over the layer
+        candidates, max_bases, evaluator = detach_layer(self.mMapLayerComboBox_candidate_bases.currentLayer()), self.spinBox_max_bases.value(), self.cost_evaluator
+        work = (lambda feedback: evaluator.calculate_total_cost(feedback) if evaluator.choose_bases(candidates, max_bases, feedback=feedback) else None) if candidates else evaluator.calculate_total_cost
+        self.start_module_task("Cost evaluation", work, lambda success, results: self.on_cost_evaluation_finished(results if success else None), self.btn_calculate_and_add)
+
+    def on_cost_evaluation_finished(self, results):
+        if not results: iface.messageBar().pushMessage("Error", "Cost evaluation failed or was canceled.", level=Qgis.Critical); return
+        if results.get('base_choice'): iface.messageBar().pushMessage("Field Bases", f"{results['base_choice']['num_bases']} of {results['base_choice']['num_candidates']} candidates chosen as field bases.", level=Qgis.Info)
         scenario_name, ok = QInputDialog.getText(self, "Scenario Name", "Enter a name for this scenario:", text=self.last_sampling_plan.name())
         if not ok or not scenario_name: scenario_name = self.last_sampling_plan.name()
         row_position = self.table_scenarios.rowCount()
@@ -266,6 +332,13 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         else: iface.messageBar().pushMessage("Error", f"Export failed: {err}", level=Qgis.Critical)
 
     def run_report_generation(self):
+        try: # Snapshot from the overviews, not the full-resolution band: queue the report until they are built
+            if self.overview_task is not None and self.overview_task.status() not in (QgsTask.Complete, QgsTask.Terminated):
+                self.overview_task.taskCompleted.connect(self.on_overviews_ready); self.overview_task.taskTerminated.connect(self.on_overviews_ready)
+                self.btn_generate_pdf.setEnabled(False)
+                iface.messageBar().pushMessage("Info", "The report will be generated once the risk map overviews are built.", level=Qgis.Info, duration=5); return
+        except RuntimeError: pass # Already finished and deleted by the task manager
+        self.overview_task = None
         map_image_path = os.path.join(QgsProject.instance().homePath(), "temp_report_map.png")
         iface.mapCanvas().saveAsImage(map_image_path)
         report_data = {
@@ -282,10 +355,38 @@ class EthioSurvRiskToolboxDialog(QDialog, Ui_EthioSurvRiskToolboxDialogBase):
         save_path, _ = QFileDialog.getSaveFileName(self, "Save PDF Report", "", "PDF Documents (*.pdf)")
         if not save_path: os.remove(map_image_path); return
         reporter = Reporter(report_data)
-        success = reporter.build_report(save_path)
-        os.remove(map_image_path)
+        self.start_module_task("Generating PDF report", lambda feedback: reporter.build_report(save_path),
+                               lambda success, result: self.on_report_finished(success, save_path, map_image_path), self.btn_generate_pdf)
+
+    def on_overviews_ready(self):
+        self.overview_task = None
+        self.btn_generate_pdf.setEnabled(True)
+        self.run_report_generation()
+
+    def on_report_finished(self, success, save_path, map_image_path):
+        if os.path.exists(map_image_path): os.remove(map_image_path)
         if success: iface.messageBar().pushMessage("Success", f"PDF report saved to {save_path}", level=Qgis.Success)
-        else: iface.messageBar().pushMessage("Error", "Failed to generate PDF report.", levelQgis.Critical)
+        else: iface.messageBar().pushMessage("Error", "Failed to generate PDF report.", level=Qgis.Critical)
+
+    # ===================================================================
+    # BACKGROUND EXECUTION
+    # ===================================================================
+    def start_module_task(self, description, work, on_finished, button):
+        """
+        Runs work(feedback) as a ModuleTask, one module at a time. Progress and
+        cancellation are available from the QGIS task manager; on_finished(success,
+        result) runs in the main thread once the task ends.
+        """
+        if self.running_task is not None:
+            iface.messageBar().pushMessage("Warning", f"Please wait until '{self.running_task.description()}' has finished.", level=Qgis.Warning); return
+        button.setEnabled(False)
+
+        def finished(success, result):
+            self.running_task = None
+            button.setEnabled(True)
+            on_finished(success, result)
+        self.running_task = start_task(ModuleTask(description, work, finished))
+        iface.messageBar().pushMessage("Info", f"{description} started in the background...", level=Qgis.Info, duration=5)
 
 class EthioSurvRiskToolbox:
     """QGIS Plugin Implementation."""
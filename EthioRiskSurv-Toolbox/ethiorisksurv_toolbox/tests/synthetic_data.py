@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Small synthetic inputs written with OGR/GDAL for the tests: square study
+areas side by side, a smooth risk-factor raster covering them and a point
+factor layer, all in UTM 37N.
+"""
+
+import os
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+EPSG = 32637
+X_MIN, Y_MAX = 500000.0, 1000000.0
+AREA_SIZE = 10000.0 # Side of each square study area, metres
+RASTER_MARGIN = 5000.0
+RASTER_PIXEL = 100.0
+MAX_AREAS = 4 # Study areas covered by the raster and the points
+
+def _srs():
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(EPSG)
+    return srs
+
+def area_geometry(index):
+    """Square study area number index, east of the previous one."""
+    x_min = X_MIN + index * AREA_SIZE
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for x, y in [(x_min, Y_MAX - AREA_SIZE), (x_min + AREA_SIZE, Y_MAX - AREA_SIZE), (x_min + AREA_SIZE, Y_MAX),
+                 (x_min, Y_MAX), (x_min, Y_MAX - AREA_SIZE)]:
+        ring.AddPoint_2D(x, y)
+    polygon = ogr.Geometry(ogr.wkbPolygon)
+    polygon.AddGeometry(ring)
+    return ogr.ForceToMultiPolygon(polygon)
+
+def write_study_areas(path, names=('Study area',), field='name', layer_name='study_area'):
+    """
+    GeoPackage with one multi-polygon feature per name.
+    :return: path
+    """
+    datasource = ogr.GetDriverByName('GPKG').CreateDataSource(path)
+    layer = datasource.CreateLayer(layer_name, _srs(), ogr.wkbMultiPolygon)
+    layer.CreateField(ogr.FieldDefn(field, ogr.OFTString))
+    for index, name in enumerate(names):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField(field, name)
+        feature.SetGeometry(area_geometry(index))
+        layer.CreateFeature(feature)
+    datasource = None
+    return path
+
+def write_risk_raster(path):
+    """
+    Float32 GeoTIFF of 100 m pixels with a smooth 0-100 surface and a
+    NoData strip, covering MAX_AREAS study areas plus a margin. It is
+    shifted by half a pixel so that the centres of 1 km grid cells fall on
+    pixel centres: nearest-neighbour resampling then picks the same pixel
+    in GDAL and in QGIS instead of breaking a tie between two.
+    :return: path
+    """
+    width = int((MAX_AREAS * AREA_SIZE + 2 * RASTER_MARGIN) / RASTER_PIXEL)
+    height = int((AREA_SIZE + 2 * RASTER_MARGIN) / RASTER_PIXEL)
+    rows, cols = np.mgrid[0:height, 0:width]
+    array = (50 * (np.sin(rows / 25.0) * np.cos(cols / 40.0) + 1)).astype(np.float32)
+    array[:, :3] = -9999.0
+    dataset = gdal.GetDriverByName('GTiff').Create(path, width, height, 1, gdal.GDT_Float32)
+    dataset.SetGeoTransform((X_MIN - RASTER_MARGIN + RASTER_PIXEL / 2, RASTER_PIXEL, 0, Y_MAX + RASTER_MARGIN + RASTER_PIXEL / 2, 0, -RASTER_PIXEL))
+    dataset.SetProjection(_srs().ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(-9999.0)
+    band.WriteArray(array)
+    dataset = None
+    return path
+
+def write_points(path, count=40, seed=0):
+    """
+    GeoPackage of count points scattered over the study areas, e.g.
+    livestock markets for a distance factor.
+    :return: path
+    """
+    rng = np.random.default_rng(seed)
+    datasource = ogr.GetDriverByName('GPKG').CreateDataSource(path)
+    layer = datasource.CreateLayer('points', _srs(), ogr.wkbPoint)
+    for x, y in zip(rng.uniform(X_MIN, X_MIN + MAX_AREAS * AREA_SIZE, count), rng.uniform(Y_MAX - AREA_SIZE, Y_MAX, count)):
+        point = ogr.Geometry(ogr.wkbPoint)
+        point.AddPoint_2D(float(x), float(y))
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetGeometry(point)
+        layer.CreateFeature(feature)
+    datasource = None
+    return path
+
+def write_inputs(directory):
+    """
+    One study area, the risk raster and the points in directory.
+    :return: (study_area_path, raster_path, points_path)
+    """
+    return (write_study_areas(os.path.join(directory, 'study_area.gpkg')),
+            write_risk_raster(os.path.join(directory, 'risk_factor.tif')),
+            write_points(os.path.join(directory, 'points.gpkg')))
@@ -1,14 +1,48 @@
 # -*- coding: utf-8 -*-
 
+import os
+import time
 import unittest
 import math
 
+import numpy as np
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
 # This setup is needed to run QGIS processing algorithms in a standalone script
-from qgis.core import QgsApplication, QgsVectorLayer, QgsFields, QgsField, QgsFeature, QgsGeometry, QgsPointXY
+from qgis.core import (QgsApplication, QgsVectorLayer, QgsFields, QgsField, QgsFeature, QgsGeometry, QgsPointXY,
+                       QgsDistanceArea, QgsCoordinateReferenceSystem, QgsProject)
 from PyQt5.QtCore import QVariant
 
 # Import the class we want to test
-from ..plugin.cost_evaluator import CostEvaluator
+from ..plugin.cost_evaluator import CostEvaluator, LOGISTICS_TOURS, COST_PARAMETERS
+from ..utils import geodesy
+
+# Number of sampling points in the distance benchmark; set
+# ETHIORISKSURV_BENCHMARK_POINTS to e.g. 1000000 for a national survey.
+BENCHMARK_POINTS = int(os.environ.get('ETHIORISKSURV_BENCHMARK_POINTS', 50000))
+MAX_GRID_SECONDS = 1.0
+
+def make_points_layer(points, crs="epsg:4326"):
+    """In-memory point layer with one feature per (x, y)."""
+    layer = QgsVectorLayer(f"Point?crs={crs}", "TestSamplingPlan", "memory")
+    features = []
+    for x, y in points:
+        feat = QgsFeature()
+        feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+def reference_distances(layer, hq_point, ellipsoid='WGS84'):
+    """Per-point QgsDistanceArea measurement, as the evaluator used to do."""
+    d = QgsDistanceArea()
+    d.setSourceCrs(layer.crs(), QgsProject.instance().transformContext())
+    d.setEllipsoid(ellipsoid)
+    return np.array([d.measureLine(hq_point, feature.geometry().asPoint()) for feature in layer.getFeatures()])
 
 class TestCostEvaluator(unittest.TestCase):
     """Test suite for the CostEvaluator class."""
@@ -35,19 +69,8 @@ class TestCostEvaluator(unittest.TestCase):
         """
         # Create an in-memory point layer with a specific number of features
         self.num_samples = 120
-        self.sampling_layer = QgsVectorLayer("Point?crs=epsg:4326", "TestSamplingPlan", "memory")
-        provider = self.sampling_layer.dataProvider()
-        
-        features = []
-        for i in range(self.num_samples):
-            feat = QgsFeature()
-            # The actual point location doesn't matter for this test,
-            # unless we were testing the advanced road network logic.
-            # We will test the simpler HQ distance calculation.
-            feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(i, i)))
-            features.append(feat)
-        
-        provider.addFeatures(features)
+        # A 12 x 10 grid of points, 0.1 degree apart, in the Ethiopian highlands
+        self.sampling_layer = make_points_layer([(37.5 + 0.1 * (i % 12), 8.0 + 0.1 * (i // 12)) for i in range(self.num_samples)])
         self.assertEqual(self.sampling_layer.featureCount(), self.num_samples)
         
         # Define a standard set of cost parameters for testing
@@ -57,7 +80,7 @@ class TestCostEvaluator(unittest.TestCase):
             'team_size': 2,                # 2 people per team
             'samples_per_day': 40,         # 40 samples collected per day by one team
             'cost_per_km': 20,             # 20 ETB per km
-            'hq_point': QgsGeometry.fromPointXY(QgsPointXY(0, 0)) # HQ at origin
+            'hq_point': QgsGeometry.fromPointXY(QgsPointXY(38.74, 9.03)) # HQ in Addis Ababa
         }
 
     def test_calculate_total_cost(self):
@@ -95,8 +118,11 @@ class TestCostEvaluator(unittest.TestCase):
         # but we can check if it's a plausible number.
         # For this test, we'll just check that it's a positive number,
         # as the exact value depends on the ellipsoid and CRS math.
+        # Round trips to every point, measured on the ellipsoid.
         self.assertGreater(results['breakdown']['logistics_costs'], 0)
-        print(f"  - Logistics Costs OK (is positive): {results['breakdown']['logistics_costs']:.2f}")
+        expected_km = 2 * reference_distances(self.sampling_layer, QgsPointXY(38.74, 9.03)).sum() / 1000
+        self.assertAlmostEqual(results['breakdown']['logistics_costs'], expected_km * 20, delta=expected_km * 20 * geodesy.GEODESIC_TOLERANCE)
+        print(f"  - Logistics Costs OK: {results['breakdown']['logistics_costs']:.2f}")
 
         # --- D. Verify Total Cost ---
         expected_total_cost = expected_fixed_costs + expected_personnel_costs + results['breakdown']['logistics_costs']
@@ -126,6 +152,130 @@ class TestCostEvaluator(unittest.TestCase):
         self.assertIsNone(results, "Evaluator should return None for a layer with zero features.")
         print("  - Zero samples case handled correctly.")
 
+    def test_distances_match_qgs_distance_area(self):
+        """
+        The vectorized distances agree with QgsDistanceArea within
+        GEODESIC_TOLERANCE, for geographic and projected layers and both
+        geodesic methods.
+        """
+        print("\n--- Running test_distances_match_qgs_distance_area ---")
+        rng = np.random.default_rng(42)
+        lon, lat = rng.uniform(33.0, 48.0, 500), rng.uniform(3.5, 15.0, 500) # Ethiopia's bounding box
+        hq_point = QgsPointXY(38.74, 9.03)
+        methods = [geodesy.METHOD_VINCENTY] + ([geodesy.METHOD_PYPROJ] if geodesy.Geod is not None else [])
+
+        layer = make_points_layer(zip(lon, lat))
+        x, y = geodesy.layer_xy(layer)
+        expected = reference_distances(layer, hq_point)
+        for ellipsoid in ('WGS84', 'NONE'): # Geographic layers without an ellipsoid use WGS84
+            for method in methods:
+                distances = geodesy.distances_from_point(x, y, hq_point, layer.crs(), ellipsoid, method)
+                np.testing.assert_allclose(distances, expected, rtol=geodesy.GEODESIC_TOLERANCE)
+
+        # UTM zone 37N: transformed to longitude/latitude, then measured on the ellipsoid
+        utm = QgsCoordinateReferenceSystem("EPSG:32637")
+        projected = make_points_layer(zip(rng.uniform(200000, 800000, 500), rng.uniform(400000, 1600000, 500)), "epsg:32637")
+        hq_utm = QgsPointXY(473000, 998000)
+        x, y = geodesy.layer_xy(projected)
+        expected = reference_distances(projected, hq_utm)
+        for method in methods:
+            distances = geodesy.distances_from_point(x, y, hq_utm, utm, 'WGS84', method)
+            np.testing.assert_allclose(distances, expected, rtol=geodesy.GEODESIC_TOLERANCE)
+
+        # Planar distances in metres when the project has no ellipsoid
+        distances = geodesy.distances_from_point(x, y, hq_utm, utm, 'NONE')
+        np.testing.assert_allclose(distances, np.hypot(x - 473000, y - 998000))
+        print("--- Test completed successfully ---")
+
+    def test_vincenty_edge_cases(self):
+        print("\n--- Running test_vincenty_edge_cases ---")
+        axes = geodesy.ellipsoid_axes('WGS84')
+        # Coincident points, a meridian, the equator and a nearly antipodal pair
+        distances = geodesy.vincenty_distance(np.array([38.0, 0.0, 0.0, 0.0]), np.array([9.0, 0.0, 0.0, 0.0]),
+                                              np.array([38.0, 0.0, 90.0, 179.7]), np.array([9.0, 90.0, 0.0, 0.5]), axes)
+        self.assertEqual(distances[0], 0.0)
+        self.assertAlmostEqual(distances[1], 10001965.729, places=2) # Equator to pole on WGS84
+        self.assertAlmostEqual(distances[2], 10018754.171, places=2) # Quarter of the equator
+        self.assertTrue(np.isfinite(distances[3]))
+        print("--- Test completed successfully ---")
+
+    def test_distance_benchmark(self):
+        """
+        Benchmarks the vectorized distances against one QgsDistanceArea
+        measurement per point, as the evaluator used to do.
+        """
+        print("\n--- Running test_distance_benchmark ---")
+        rng = np.random.default_rng(0)
+        layer = make_points_layer(zip(rng.uniform(33.0, 48.0, BENCHMARK_POINTS), rng.uniform(3.5, 15.0, BENCHMARK_POINTS)))
+        hq_point = QgsPointXY(38.74, 9.03)
+
+        start = time.perf_counter()
+        expected = reference_distances(layer, hq_point)
+        loop_seconds = time.perf_counter() - start
+
+        evaluator = CostEvaluator(layer, dict(self.cost_params, hq_point=hq_point))
+        start = time.perf_counter()
+        distances = evaluator.point_distances()
+        vectorized_seconds = time.perf_counter() - start
+
+        print(f"{BENCHMARK_POINTS} points: QgsDistanceArea loop {loop_seconds:.3f} s, vectorized {vectorized_seconds:.3f} s "
+              f"({loop_seconds / vectorized_seconds:.1f}x)")
+        np.testing.assert_allclose(distances, expected, rtol=geodesy.GEODESIC_TOLERANCE)
+        self.assertLess(vectorized_seconds, loop_seconds)
+        self.assertIs(evaluator.point_distances(), distances) # Cached for further evaluations
+        print("--- Test completed successfully ---")
+
+    def test_evaluate_grid(self):
+        """
+        Every row of the grid matches calculate_total_cost with the same
+        parameters, and the layer is read only once.
+        """
+        print("\n--- Running test_evaluate_grid ---")
+        grid = {'cost_per_km': [10, 20, 35], 'team_size': [2, 3], 'samples_per_day': [15, 40]}
+        evaluator = CostEvaluator(self.sampling_layer, self.cost_params)
+        table = evaluator.evaluate_grid(grid)
+        self.assertEqual(len(table['total_cost']), 12)
+        self.assertEqual(list(table)[:len(COST_PARAMETERS)], list(COST_PARAMETERS))
+        coordinates = evaluator.coordinates
+
+        for row in (0, 5, 11):
+            params = dict(self.cost_params, **{name: table[name][row] for name in COST_PARAMETERS})
+            results = CostEvaluator(self.sampling_layer, params).calculate_total_cost()
+            self.assertAlmostEqual(table['total_cost'][row], results['total_cost'], places=6)
+            self.assertAlmostEqual(table['total_cost_per_sample'][row], results['cost_per_sample'], places=6)
+            for name, value in results['breakdown'].items():
+                self.assertAlmostEqual(table[name][row], value, places=6)
+
+        # Only the unit costs change: the cached coordinates and distances are kept
+        evaluator.update_params(dict(self.cost_params, cost_per_km=50))
+        self.assertIs(evaluator.coordinates, coordinates)
+        self.assertIsNotNone(evaluator.distances)
+        evaluator.update_params(dict(self.cost_params, hq_point=QgsPointXY(39.0, 8.5)))
+        self.assertIsNone(evaluator.distances)
+
+        # Tours are planned once per samples_per_day value
+        evaluator = CostEvaluator(self.sampling_layer, dict(self.cost_params, logistics_mode=LOGISTICS_TOURS))
+        table = evaluator.evaluate_grid(grid)
+        self.assertEqual(sorted(evaluator.tours_by_capacity), [15, 40])
+        self.assertTrue(np.all(table['field_days'][table['samples_per_day'] == 15] == 8))
+
+        with self.assertRaises(ValueError):
+            evaluator.evaluate_grid({'cost_per_mile': [1]})
+        print("--- Test completed successfully ---")
+
+    def test_evaluate_grid_benchmark(self):
+        print("\n--- Running test_evaluate_grid_benchmark ---")
+        evaluator = CostEvaluator(self.sampling_layer, self.cost_params)
+        evaluator.point_distances() # Read once, as after a first evaluation
+        grid = {name: np.linspace(1, 100, 8) for name in COST_PARAMETERS}
+        start = time.perf_counter()
+        table = evaluator.evaluate_grid(grid, as_dataframe=pandas is not None)
+        seconds = time.perf_counter() - start
+        print(f"{len(table['total_cost'])} combinations evaluated in {seconds:.3f} s")
+        self.assertEqual(len(table['total_cost']), 8 ** len(COST_PARAMETERS))
+        self.assertLess(seconds, MAX_GRID_SECONDS)
+        print("--- Test completed successfully ---")
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from osgeo import gdal, osr
+from qgis.core import QgsApplication, QgsVectorLayer, QgsRasterLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsProject
+
+# Import the modules we want to test
+from ..utils import cost_surface
+from ..plugin.cost_evaluator import CostEvaluator, LOGISTICS_FRICTION
+
+# Cells per side of the benchmark friction raster
+BENCHMARK_CELLS = int(os.environ.get('ETHIORISKSURV_BENCHMARK_CELLS', 1000))
+MAX_SURFACE_SECONDS = 30
+
+CELL_SIZE = 100 # metres
+WALKING = 0.01 # minutes per metre, 6 km/h
+
+def write_friction(path, friction, nodata=-1.0):
+    """Single-band GeoTIFF in UTM 37N with its top-left corner at (0, 100 km)."""
+    dataset = gdal.GetDriverByName('GTiff').Create(path, friction.shape[1], friction.shape[0], 1, gdal.GDT_Float32)
+    dataset.SetGeoTransform((0, CELL_SIZE, 0, 100000, 0, -CELL_SIZE))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32637)
+    dataset.SetProjection(srs.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    band.WriteArray(friction)
+    dataset = None
+    return QgsRasterLayer(path, os.path.basename(path))
+
+def make_points_layer(points):
+    layer = QgsVectorLayer("Point?crs=epsg:32637", "TestSamplingPlan", "memory")
+    features = []
+    for x, y in points:
+        feat = QgsFeature()
+        feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+def cell_center(row, column):
+    return QgsPointXY((column + 0.5) * CELL_SIZE, 100000 - (row + 0.5) * CELL_SIZE)
+
+class TestCostSurface(unittest.TestCase):
+    """Test suite for travel time over a friction raster."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        QgsProject.instance().setEllipsoid('NONE') # Planar metres in UTM
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        cost_surface.clear_cache()
+        self.temp_dir = tempfile.mkdtemp()
+        self.uniform = write_friction(os.path.join(self.temp_dir, "uniform.tif"), np.full((50, 50), WALKING, dtype=np.float32))
+        self.crs = self.uniform.crs()
+
+    def tearDown(self):
+        cost_surface.clear_cache()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_uniform_friction(self):
+        """
+        On a uniform raster, travel times along rows and diagonals are exact,
+        and no direction is more than 8.3% (the 8-neighbour worst case) slow.
+        """
+        print("\n--- Running test_uniform_friction ---")
+        hq = cell_center(25, 25)
+        surface = cost_surface.cost_surface(self.uniform, hq, self.crs)
+        targets = [cell_center(25, 45), cell_center(5, 25), cell_center(10, 10), cell_center(40, 32)]
+        times = surface.times_to(np.array([p.x() for p in targets]), np.array([p.y() for p in targets]), self.crs)
+        expected = np.array([hq.distance(p) for p in targets]) * WALKING
+        np.testing.assert_allclose(times[:3], expected[:3], rtol=1e-5)
+        self.assertGreaterEqual(times[3], expected[3] * (1 - 1e-5))
+        self.assertLessEqual(times[3], expected[3] * 1.083)
+        self.assertEqual(surface.times_to(np.array([-500.0]), np.array([99000.0]), self.crs)[0], np.inf)
+        print("--- Test completed successfully ---")
+
+    def test_barrier(self):
+        """A river of NoData cells is crossed at its ford; without one, points beyond are unreachable."""
+        print("\n--- Running test_barrier ---")
+        friction = np.full((50, 50), WALKING, dtype=np.float32)
+        friction[:, 30] = -1
+        river = write_friction(os.path.join(self.temp_dir, "river.tif"), friction)
+        friction[45, 30] = WALKING
+        ford = write_friction(os.path.join(self.temp_dir, "ford.tif"), friction)
+        hq, target = cell_center(5, 20), cell_center(5, 40)
+
+        crossing = cost_surface.cost_surface(ford, hq, self.crs).times_to(np.array([target.x()]), np.array([target.y()]), self.crs)[0]
+        self.assertGreater(crossing, 2 * 40 * CELL_SIZE * WALKING, "The ford is a long detour")
+        blocked = cost_surface.cost_surface(river, hq, self.crs).times_to(np.array([target.x()]), np.array([target.y()]), self.crs)[0]
+        self.assertEqual(blocked, np.inf)
+
+        with self.assertRaises(ValueError):
+            cost_surface.cost_surface(river, cell_center(5, 30), self.crs)
+        with self.assertRaises(ValueError):
+            cost_surface.cost_surface(river, QgsPointXY(-1000, 0), self.crs)
+        print("--- Test completed successfully ---")
+
+    def test_cost_evaluator_friction(self):
+        """
+        Walking time is costed per hour, and a new sampling plan with the
+        same raster and HQ reuses the cached surface.
+        """
+        print("\n--- Running test_cost_evaluator_friction ---")
+        hq = cell_center(25, 25)
+        layer = make_points_layer([(cell_center(25, 45).x(), cell_center(25, 45).y()), (cell_center(5, 25).x(), cell_center(5, 25).y())])
+        params = {'cost_per_diem': 1000, 'team_size': 2, 'samples_per_day': 10, 'cost_per_km': 20, 'cost_per_hour': 150,
+                  'hq_point': hq, 'logistics_mode': LOGISTICS_FRICTION, 'friction_raster': self.uniform}
+        results = CostEvaluator(layer, params).calculate_total_cost()
+        hours = 2 * (2000 + 2000) * WALKING / 60
+        self.assertAlmostEqual(results['travel_hours'], hours, places=4)
+        self.assertAlmostEqual(results['breakdown']['logistics_costs'], hours * 150, places=2)
+
+        grid = CostEvaluator(layer, params).evaluate_grid({'cost_per_hour': [100, 150]})
+        np.testing.assert_allclose(grid['logistics_costs'], [hours * 100, hours * 150], rtol=1e-5)
+
+        other_plan = make_points_layer([(cell_center(40, 40).x(), cell_center(40, 40).y()), (500.0, 100500.0)])
+        with mock.patch.object(cost_surface.FrictionGrid, 'dijkstra', side_effect=AssertionError("Surface recomputed")):
+            evaluator = CostEvaluator(other_plan, params)
+            times = evaluator.point_travel_times()
+        # The second point lies outside the raster: straight line at the median friction
+        self.assertAlmostEqual(times[1], hq.distance(QgsPointXY(500, 100500)) * WALKING, places=3)
+        print("--- Test completed successfully ---")
+
+    def test_surface_benchmark(self):
+        print("\n--- Running test_surface_benchmark ---")
+        rng = np.random.default_rng(0)
+        friction = rng.uniform(0.5, 2.0, (BENCHMARK_CELLS, BENCHMARK_CELLS)).astype(np.float32) * WALKING
+        layer = write_friction(os.path.join(self.temp_dir, "benchmark.tif"), friction)
+        start = time.perf_counter()
+        surface = cost_surface.cost_surface(layer, cell_center(BENCHMARK_CELLS // 2, BENCHMARK_CELLS // 2), self.crs)
+        seconds = time.perf_counter() - start
+        print(f"{BENCHMARK_CELLS}x{BENCHMARK_CELLS} travel time surface in {seconds:.2f} s")
+        self.assertTrue(np.isfinite(surface.times).all())
+        self.assertLess(seconds, MAX_SURFACE_SECONDS * max(1, (BENCHMARK_CELLS / 1000) ** 2))
+
+        start = time.perf_counter()
+        x, y = rng.uniform(0, BENCHMARK_CELLS * CELL_SIZE, 100000), 100000 - rng.uniform(0, BENCHMARK_CELLS * CELL_SIZE, 100000)
+        surface.times_to(x, y, self.crs)
+        print(f"100000 lookups in {time.perf_counter() - start:.3f} s")
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+import numpy as np
+from qgis.core import QgsApplication, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY
+
+# Import the modules we want to test
+from ..plugin.cost_evaluator import CostEvaluator, LOGISTICS_TOURS
+from ..plugin.cost_uncertainty import simulate_costs, normalize_distribution, sample, DEFAULT_DRAWS
+
+MAX_SIMULATION_SECONDS = 2.0
+
+class TestCostUncertainty(unittest.TestCase):
+    """Test suite for the Monte Carlo cost simulation."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        self.sampling_layer = QgsVectorLayer("Point?crs=epsg:4326", "TestSamplingPlan", "memory")
+        features = []
+        for i in range(120):
+            feat = QgsFeature()
+            feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(37.5 + 0.1 * (i % 12), 8.0 + 0.1 * (i // 12))))
+            features.append(feat)
+        self.sampling_layer.dataProvider().addFeatures(features)
+        self.cost_params = {'cost_per_sample': 500, 'cost_per_diem': 1000, 'team_size': 2, 'samples_per_day': 40,
+                            'cost_per_km': 20, 'hq_point': QgsPointXY(38.74, 9.03)}
+        self.distributions = {
+            'cost_per_sample': {'distribution': 'pert', 'low': 400, 'mode': 500, 'high': 800},
+            'cost_per_diem': {'distribution': 'normal', 'mean': 1000, 'sd': 150},
+            'cost_per_km': {'distribution': 'triangular', 'low': 15, 'mode': 20, 'high': 35},
+            'samples_per_day': {'distribution': 'choice', 'values': [20, 30, 40], 'weights': [1, 2, 1]}
+        }
+
+    def test_point_estimates(self):
+        """Fixed values reproduce calculate_total_cost exactly."""
+        print("\n--- Running test_point_estimates ---")
+        evaluator = CostEvaluator(self.sampling_layer, self.cost_params)
+        expected = evaluator.calculate_total_cost()
+        result = simulate_costs(evaluator, {}, draws=1000, seed=1)
+        for percentile, value in result['percentiles']['total_cost'].items():
+            self.assertAlmostEqual(value, expected['total_cost'], places=6)
+        self.assertAlmostEqual(result['mean']['logistics_costs'], expected['breakdown']['logistics_costs'], places=6)
+        print("--- Test completed successfully ---")
+
+    def test_reproducible_and_parallel(self):
+        """
+        A fixed seed gives identical results, also when the draws are spread
+        over worker processes.
+        """
+        print("\n--- Running test_reproducible_and_parallel ---")
+        evaluator = CostEvaluator(self.sampling_layer, self.cost_params)
+        first = simulate_costs(evaluator, self.distributions, seed=42, return_samples=True)
+        second = simulate_costs(evaluator, self.distributions, seed=42)
+        parallel = simulate_costs(evaluator, self.distributions, seed=42, jobs=2, return_samples=True)
+        other = simulate_costs(evaluator, self.distributions, seed=43)
+
+        self.assertEqual(first['percentiles'], second['percentiles'])
+        self.assertEqual(first['percentiles'], parallel['percentiles'])
+        np.testing.assert_array_equal(first['samples']['total_cost'], parallel['samples']['total_cost'])
+        self.assertNotEqual(first['percentiles'], other['percentiles'])
+
+        percentiles = first['percentiles']['total_cost']
+        self.assertEqual(len(first['samples']['total_cost']), DEFAULT_DRAWS)
+        self.assertTrue(percentiles[5] < percentiles[50] < percentiles[95])
+        self.assertEqual(set(np.unique(first['samples']['samples_per_day'])), {20.0, 30.0, 40.0})
+        print(f"  - Total cost P5/P50/P95: {percentiles[5]:.0f} / {percentiles[50]:.0f} / {percentiles[95]:.0f} ETB")
+        print("--- Test completed successfully ---")
+
+    def test_speed(self):
+        print("\n--- Running test_speed ---")
+        evaluator = CostEvaluator(self.sampling_layer, self.cost_params)
+        evaluator.point_distances() # Cached, as after a first evaluation
+        start = time.perf_counter()
+        simulate_costs(evaluator, self.distributions, draws=DEFAULT_DRAWS, seed=0)
+        seconds = time.perf_counter() - start
+        print(f"{DEFAULT_DRAWS} draws in {seconds:.3f} s")
+        self.assertLess(seconds, MAX_SIMULATION_SECONDS)
+        print("--- Test completed successfully ---")
+
+    def test_distributions(self):
+        print("\n--- Running test_distributions ---")
+        rng = np.random.default_rng(0)
+        lognormal = sample(normalize_distribution({'distribution': 'lognormal', 'mean': 20, 'sd': 5}), 200000, rng)
+        self.assertAlmostEqual(lognormal.mean(), 20, delta=0.1)
+        self.assertAlmostEqual(lognormal.std(), 5, delta=0.1)
+        pert = sample(normalize_distribution({'distribution': 'pert', 'low': 0, 'mode': 10, 'high': 40}), 200000, rng)
+        self.assertAlmostEqual(pert.mean(), (0 + 4 * 10 + 40) / 6, delta=0.1)
+        self.assertTrue(np.all(sample(normalize_distribution({'distribution': 'normal', 'mean': 1, 'sd': 5}), 1000, rng) >= 0))
+
+        for invalid in ({'distribution': 'gamma'}, {'distribution': 'uniform', 'low': 5}, {'distribution': 'triangular', 'low': 5, 'mode': 1, 'high': 9}, 'high'):
+            with self.assertRaises(ValueError):
+                normalize_distribution(invalid)
+        evaluator = CostEvaluator(self.sampling_layer, dict(self.cost_params, logistics_mode=LOGISTICS_TOURS))
+        with self.assertRaises(ValueError):
+            simulate_costs(evaluator, {'samples_per_day': {'distribution': 'normal', 'mean': 30, 'sd': 5}})
+        print("--- Test completed successfully ---")
+
+    def test_tours(self):
+        """With daily tours, each sampled samples_per_day uses its own tour plan."""
+        print("\n--- Running test_tours ---")
+        evaluator = CostEvaluator(self.sampling_layer, dict(self.cost_params, logistics_mode=LOGISTICS_TOURS))
+        result = simulate_costs(evaluator, {'samples_per_day': {'distribution': 'uniform', 'low': 20, 'high': 24}},
+                                draws=5000, seed=3, return_samples=True)
+        self.assertEqual(sorted(evaluator.tours_by_capacity), [20, 21, 22, 23, 24])
+        days = result['samples']['personnel_costs'] / (2 * 1000)
+        self.assertTrue(set(np.unique(days)) <= {5.0, 6.0})
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
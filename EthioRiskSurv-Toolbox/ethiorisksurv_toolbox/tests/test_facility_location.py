@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import os
+import time
+import unittest
+
+import numpy as np
+from qgis.core import QgsApplication, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsProject
+
+# Import the modules we want to test
+from ..utils import facility_location
+from ..utils.gis_utils import interior_point
+from ..plugin.cost_evaluator import CostEvaluator, LOGISTICS_TOURS
+
+# Candidates and sampling points of the benchmark; set
+# ETHIORISKSURV_BENCHMARK_POINTS to e.g. 20000 for a national survey.
+BENCHMARK_POINTS = int(os.environ.get('ETHIORISKSURV_BENCHMARK_POINTS', 5000))
+BENCHMARK_CANDIDATES = 2000
+MAX_CHOICE_SECONDS = 5 # Without the optional lower bound
+
+UTM_37N = "epsg:32637"
+
+def make_layer(geometry_type, geometries, crs=UTM_37N):
+    """In-memory layer with one feature per geometry."""
+    layer = QgsVectorLayer(f"{geometry_type}?crs={crs}", geometry_type, "memory")
+    features = []
+    for geometry in geometries:
+        feat = QgsFeature()
+        feat.setGeometry(geometry)
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+def make_points_layer(points, crs=UTM_37N):
+    return make_layer("Point", [QgsGeometry.fromPointXY(QgsPointXY(x, y)) for x, y in points], crs)
+
+class TestFacilityLocation(unittest.TestCase):
+    """Test suite for the choice of field bases."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        QgsProject.instance().setEllipsoid('NONE') # Planar metres in UTM
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        # Two villages 60 km apart; candidates in each, one in between and one far away
+        self.points = np.concatenate((rng.normal((0, 0), 2000, (60, 2)), rng.normal((60000, 0), 2000, (40, 2))))
+        self.candidates = [(500, 500), (30000, 0), (59000, -500), (0, 90000)]
+        self.params = {'cost_per_diem': 1000, 'team_size': 2, 'samples_per_day': 10, 'cost_per_km': 20, 'hq_point': QgsPointXY(30000, 40000)}
+
+    def test_matches_brute_force(self):
+        """On small instances the heuristic finds the optimum, and the bound does not exceed it."""
+        print("\n--- Running test_matches_brute_force ---")
+        rng = np.random.default_rng(11)
+        for trial in range(5):
+            matrix = rng.uniform(0, 1000, (10, 40)).astype(np.float32)
+            for p in (1, 2, 3):
+                optimum = min(matrix[list(bases)].min(axis=0).sum(dtype=np.float64) for bases in itertools.combinations(range(10), p))
+                solution = facility_location.solve(matrix, p, lower_bound=True)
+                self.assertEqual(len(set(solution.bases)), p)
+                self.assertAlmostEqual(solution.total, optimum, delta=1e-3 * optimum)
+                self.assertLessEqual(solution.lower_bound, optimum + 1e-3)
+                self.assertGreaterEqual(solution.gap, 0)
+        print("--- Test completed successfully ---")
+
+    def test_choose_bases(self):
+        """
+        Two bases serve two villages from a candidate in each; a third base
+        saves nothing, and a high cost per base keeps a single one, at the
+        larger village.
+        """
+        print("\n--- Running test_choose_bases ---")
+        layer = make_points_layer(self.points)
+        candidates = make_points_layer(self.candidates)
+
+        evaluator = CostEvaluator(layer, dict(self.params))
+        single = evaluator.calculate_total_cost()
+        choice = evaluator.choose_bases(candidates, max_bases=3)
+        self.assertEqual(choice['num_bases'], 2)
+        self.assertEqual(sorted(choice['candidates']), [0, 2])
+        self.assertEqual(len(choice['by_num_bases']), 3)
+        self.assertEqual(len(evaluator.hq_points()), choice['num_bases'])
+        results = evaluator.calculate_total_cost()
+        self.assertEqual(results['base_choice'], choice)
+        self.assertLess(results['breakdown']['logistics_costs'], single['breakdown']['logistics_costs'] / 10)
+        self.assertLess(evaluator.point_distances().max(), 10000, "Every point is measured from its nearest base")
+
+        costly = CostEvaluator(layer, dict(self.params)).choose_bases(candidates, max_bases=3, cost_per_base=10 ** 9)
+        self.assertEqual(costly['candidates'], [0])
+        self.assertEqual(costly['samples_per_base'], [100])
+        self.assertIsNone(costly['gap'], "The bound is only computed on request")
+        bounded = CostEvaluator(layer, dict(self.params)).choose_bases(candidates, max_bases=3, compute_bound=True)
+        self.assertGreaterEqual(bounded['gap'], 0)
+        self.assertLess(bounded['gap'], 0.05)
+        print("--- Test completed successfully ---")
+
+    def test_tours_from_bases(self):
+        print("\n--- Running test_tours_from_bases ---")
+        layer = make_points_layer(self.points)
+        evaluator = CostEvaluator(layer, dict(self.params, logistics_mode=LOGISTICS_TOURS))
+        evaluator.choose_bases(make_points_layer(self.candidates), max_bases=2)
+        results = evaluator.calculate_total_cost()
+        self.assertEqual(results['field_days'], 6 + 4)
+        visited = np.sort(np.concatenate([tour.points for tour in evaluator.tours]))
+        np.testing.assert_array_equal(visited, np.arange(100))
+        print("--- Test completed successfully ---")
+
+    def test_interior_point(self):
+        """The default HQ of a U-shaped study area lies inside it, unlike its extent centre."""
+        print("\n--- Running test_interior_point ---")
+        ring = [QgsPointXY(x, y) for x, y in [(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (1, 1), (1, 3), (0, 3), (0, 0)]]
+        area = make_layer("Polygon", [QgsGeometry.fromPolygonXY([ring])])
+        point = interior_point(area)
+        self.assertFalse(area.getFeature(1).geometry().contains(QgsGeometry.fromPointXY(area.extent().center())))
+        self.assertTrue(area.getFeature(1).geometry().contains(QgsGeometry.fromPointXY(point)))
+        square = make_layer("Polygon", [QgsGeometry.fromRect(area.extent())])
+        self.assertEqual(interior_point(square), square.extent().center())
+        print("--- Test completed successfully ---")
+
+    def test_choice_benchmark(self):
+        print("\n--- Running test_choice_benchmark ---")
+        rng = np.random.default_rng(0)
+        layer = make_points_layer(rng.uniform(0, 300000, (BENCHMARK_POINTS, 2)))
+        candidates = make_points_layer(rng.uniform(0, 300000, (BENCHMARK_CANDIDATES, 2)))
+        evaluator = CostEvaluator(layer, dict(self.params))
+        start = time.perf_counter()
+        choice = evaluator.choose_bases(candidates, max_bases=5)
+        seconds = time.perf_counter() - start
+        print(f"{choice['num_bases']} of {BENCHMARK_CANDIDATES} candidates for {BENCHMARK_POINTS} points chosen in {seconds:.2f} s")
+        self.assertEqual(choice['num_bases'], 5)
+        self.assertLess(seconds, MAX_CHOICE_SECONDS * max(1, BENCHMARK_POINTS / 5000))
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import unittest
+import tempfile
+import shutil
+
+from qgis.core import QgsApplication
+
+# Import the class we want to test
+from ..utils.factor_cache import FactorCache, FINGERPRINT_HASH
+
+class TestFactorCache(unittest.TestCase):
+    """Test suite for the FactorCache class."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        """
+        Create a fresh cache directory and a fake source raster for each test.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.source_path = os.path.join(self.temp_dir, 'factor.tif')
+        with open(self.source_path, 'wb') as f:
+            f.write(b'\0' * 1024)
+        self.extent = (0.0, 0.0, 1000.0, 1000.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_entry(self, cache, key, size):
+        with open(cache.staging_path(key), 'wb') as f:
+            f.write(b'\0' * size)
+        cache.commit(key)
+
+    def test_key_depends_on_inputs(self):
+        """
+        The key must change with the grid, the correlation and the source file.
+        """
+        print("\n--- Running test_key_depends_on_inputs ---")
+        cache = FactorCache(self.cache_dir)
+        key = cache.key(self.source_path, self.extent, 100, 'EPSG:20137', False)
+
+        self.assertEqual(key, cache.key(self.source_path, self.extent, 100, 'EPSG:20137', False))
+        self.assertNotEqual(key, cache.key(self.source_path, self.extent, 30, 'EPSG:20137', False))
+        self.assertNotEqual(key, cache.key(self.source_path, self.extent, 100, 'EPSG:20137', True))
+        self.assertNotEqual(key, cache.key(self.source_path, (0.0, 0.0, 500.0, 500.0), 100, 'EPSG:20137', False))
+
+        # Touching the source invalidates an mtime-based key
+        later = time.time() + 10
+        os.utime(self.source_path, (later, later))
+        self.assertNotEqual(key, cache.key(self.source_path, self.extent, 100, 'EPSG:20137', False))
+
+        # Non-file sources cannot be cached
+        self.assertIsNone(cache.key('memory?geometry=Point', self.extent, 100, 'EPSG:20137', False))
+
+    def test_hash_fingerprint_ignores_mtime(self):
+        print("\n--- Running test_hash_fingerprint_ignores_mtime ---")
+        cache = FactorCache(self.cache_dir, fingerprint=FINGERPRINT_HASH)
+        key = cache.key(self.source_path, self.extent, 100, 'EPSG:20137', False)
+        later = time.time() + 10
+        os.utime(self.source_path, (later, later))
+        self.assertEqual(key, cache.key(self.source_path, self.extent, 100, 'EPSG:20137', False))
+
+    def test_lru_eviction(self):
+        """
+        Once the size limit is exceeded, the least recently used entry goes first.
+        """
+        print("\n--- Running test_lru_eviction ---")
+        cache = FactorCache(self.cache_dir, max_size_mb=2.5 / 1024)  # 2.5 KB
+        self._write_entry(cache, 'a', 1024)
+        time.sleep(0.01)
+        self._write_entry(cache, 'b', 1024)
+        time.sleep(0.01)
+        self.assertIsNotNone(cache.get('a'))  # 'a' is now more recent than 'b'
+        time.sleep(0.01)
+        self._write_entry(cache, 'c', 1024)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.size_bytes(), 2.5 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
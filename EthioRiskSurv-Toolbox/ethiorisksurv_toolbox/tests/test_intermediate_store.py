@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+import tempfile
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from osgeo import gdal
+from qgis.core import QgsApplication
+
+# Import the class we want to test
+from ..utils.intermediate_store import IntermediateStore, STORAGE_PROJECT, STORAGE_SCRATCH, STORAGE_MEMORY
+
+class TestIntermediateStore(unittest.TestCase):
+    """Test suite for the IntermediateStore class."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, path):
+        dataset = gdal.GetDriverByName('GTiff').Create(path, 4, 4, 1, gdal.GDT_Float32)
+        dataset = None
+
+    def test_project_backend_keeps_files(self):
+        print("\n--- Running test_project_backend_keeps_files ---")
+        with IntermediateStore(STORAGE_PROJECT, project_home=self.temp_dir) as store:
+            path = store.path('norm', 0, 'Livestock Density')
+            self._write(path)
+        self.assertEqual(path, os.path.join(self.temp_dir, 'norm_0_Livestock_Density.tif'))
+        self.assertTrue(os.path.exists(path))
+
+    def test_scratch_backend_cleans_up(self):
+        print("\n--- Running test_scratch_backend_cleans_up ---")
+        with IntermediateStore(STORAGE_SCRATCH, scratch_dir=self.temp_dir) as store:
+            path = store.path('temp', 1, 'roads')
+            self._write(path)
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path))
+
+    def test_memory_backend_budget_and_fallback(self):
+        """
+        In-process intermediates go to /vsimem/ until the budget is used up;
+        external-process ones and anything over budget go to scratch disk.
+        """
+        print("\n--- Running test_memory_backend_budget_and_fallback ---")
+        store = IntermediateStore(STORAGE_MEMORY, scratch_dir=self.temp_dir, memory_budget_mb=1)
+        in_memory = store.path('norm', 0, 'dem', estimated_bytes=600 * 1024)
+        over_budget = store.path('norm', 1, 'markets', estimated_bytes=600 * 1024)
+        external = store.path('temp', 2, 'roads', in_process=False)
+
+        self.assertTrue(in_memory.startswith('/vsimem/'))
+        self.assertFalse(over_budget.startswith('/vsimem/'))
+        self.assertFalse(external.startswith('/vsimem/'))
+
+        for path in (in_memory, over_budget, external):
+            self._write(path)
+        self.assertIsNotNone(gdal.VSIStatL(in_memory))
+
+        store.cleanup()
+        self.assertIsNone(gdal.VSIStatL(in_memory))
+        self.assertFalse(os.path.exists(over_budget))
+        self.assertFalse(os.path.exists(external))
+
+    def test_concurrent_paths(self):
+        """
+        Factors prepared on a thread pool never overrun the memory budget
+        and share a single scratch directory, which cleanup() removes.
+        """
+        print("\n--- Running test_concurrent_paths ---")
+        store = IntermediateStore(STORAGE_MEMORY, scratch_dir=self.temp_dir, memory_budget_mb=1)
+        start = threading.Barrier(8)
+
+        def request(index):
+            start.wait()
+            return store.path('norm', index, 'factor', estimated_bytes=300 * 1024)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(request, range(8)))
+        in_memory = [path for path in paths if path.startswith('/vsimem/')]
+        self.assertEqual(len(in_memory), 3)
+        self.assertLessEqual(store.memory_used_bytes, store.memory_budget_bytes)
+        self.assertEqual({os.path.dirname(path) for path in paths if path not in in_memory}, {store.scratch_dir()})
+        self.assertEqual(len(os.listdir(self.temp_dir)), 1)
+
+        store.cleanup()
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
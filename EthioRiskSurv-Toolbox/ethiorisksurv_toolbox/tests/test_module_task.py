@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import unittest
+import tempfile
+import shutil
+
+from qgis.PyQt.QtCore import QEventLoop, QTimer
+from qgis.core import QgsApplication, QgsVectorLayer, QgsRasterLayer, QgsProject
+
+# Import the classes we want to test
+from ..plugin.module_task import ModuleTask, start_task
+from ..plugin.risk_analyzer import RiskAnalyzer, ENGINE_NUMPY
+from ..plugin.cost_evaluator import CostEvaluator
+from ..utils.gis_utils import detach_layer
+from . import synthetic_data
+
+MAX_EVENT_LOOP_LATENCY_MS = 100
+TIMER_INTERVAL_MS = 10
+
+class TestModuleTask(unittest.TestCase):
+    """Test suite for running the modules as background QgsTasks."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.project = QgsProject.instance()
+        cls.study_area_path, cls.raster_path, cls.points_path = synthetic_data.write_inputs(cls.temp_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application and temporary files. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        self.project.setHomePath(self.temp_dir)
+        self.study_area_layer = QgsVectorLayer(self.study_area_path, "study_area", "ogr")
+        self.assertTrue(self.study_area_layer.isValid(), "Test study area layer failed to load.")
+        self.project.addMapLayer(self.study_area_layer)
+
+    def tearDown(self):
+        self.project.clear()
+
+    def _run(self, task, timeout_s=600, on_tick=None):
+        """
+        Runs a task through the task manager while the event loop spins, as in
+        the QGIS GUI. A timer fires every TIMER_INTERVAL_MS; the longest delay
+        between two ticks beyond that interval is the event loop latency.
+        :return: Maximum event loop latency in milliseconds.
+        """
+        loop = QEventLoop()
+        task.taskCompleted.connect(loop.quit)
+        task.taskTerminated.connect(loop.quit)
+        ticks = []
+
+        def tick():
+            ticks.append(time.perf_counter())
+            if on_tick is not None:
+                on_tick(len(ticks))
+        timer = QTimer()
+        timer.setInterval(TIMER_INTERVAL_MS)
+        timer.timeout.connect(tick)
+        timer.start()
+        QTimer.singleShot(timeout_s * 1000, loop.quit)
+        start_task(task)
+        loop.exec_()
+        timer.stop()
+        QgsApplication.processEvents() # Delivers finished() and on_finished
+        gaps = [(later - earlier) * 1000 - TIMER_INTERVAL_MS for earlier, later in zip(ticks, ticks[1:])]
+        return max(gaps) if gaps else 0.0
+
+    def test_ui_stays_responsive_during_analysis(self):
+        """
+        The event loop keeps serving timer events within 100 ms while a
+        multi-second risk analysis runs in a ModuleTask.
+        """
+        print("\n--- Running test_ui_stays_responsive_during_analysis ---")
+        risk_factors = [
+            {'layer': QgsRasterLayer(self.raster_path, "raster"), 'weight': 4, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': QgsVectorLayer(self.points_path, "points", "ogr"), 'weight': 6, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        analyzer = RiskAnalyzer(detach_layer(self.study_area_layer), risk_factors, 100, "Responsive", engine=ENGINE_NUMPY)
+
+        def long_analysis(feedback):
+            path, start = None, time.perf_counter()
+            while time.perf_counter() - start < 3 and not feedback.isCanceled(): # Several runs make the task last long enough to measure
+                path = analyzer.produce(feedback)
+            return path
+        outcome = []
+        task = ModuleTask("Risk analysis", long_analysis, lambda success, path: outcome.append((success, path)))
+        latency = self._run(task)
+
+        print(f"Maximum event loop latency: {latency:.1f} ms")
+        self.assertLess(latency, MAX_EVENT_LOOP_LATENCY_MS)
+        self.assertEqual(len(outcome), 1)
+        success, path = outcome[0]
+        self.assertTrue(success)
+        self.assertTrue(os.path.exists(path))
+        success, risk_map = analyzer.load_risk_map(path)
+        self.assertTrue(success)
+        self.assertIn(risk_map.id(), self.project.mapLayers())
+        print("--- Test completed successfully ---")
+
+    def test_cancel(self):
+        print("\n--- Running test_cancel ---")
+        def wait_for_cancel(feedback):
+            while not feedback.isCanceled():
+                feedback.setProgress(50)
+                time.sleep(0.01)
+            return "not used"
+        outcome = []
+        task = ModuleTask("Cancelable", wait_for_cancel, lambda success, result: outcome.append(success))
+        self._run(task, timeout_s=30, on_tick=lambda ticks: task.cancel() if ticks == 20 else None)
+        self.assertEqual(outcome, [False])
+        print("--- Test completed successfully ---")
+
+    def test_results_and_errors(self):
+        """
+        Layers created by the task are usable from the main thread, and an
+        exception in the work function fails the task without raising.
+        """
+        print("\n--- Running test_results_and_errors ---")
+        points = QgsVectorLayer(self.points_path, "points", "ogr")
+        evaluator = CostEvaluator(detach_layer(points), {'cost_per_sample': 500, 'hq_point': self.study_area_layer.extent().center()})
+        outcome = []
+        self._run(ModuleTask("Cost evaluation", evaluator.calculate_total_cost, lambda success, results: outcome.append((success, results))))
+        self.assertTrue(outcome[0][0])
+        self.assertEqual(outcome[0][1]['num_samples'], points.featureCount())
+
+        outcome = []
+        self._run(ModuleTask("Load", lambda feedback: QgsVectorLayer(self.points_path, "task_points", "ogr"), lambda success, layer: outcome.append(layer)))
+        layer = outcome[0]
+        self.assertEqual(layer.thread(), QgsApplication.instance().thread())
+        self.project.addMapLayer(layer)
+        self.assertEqual(layer.featureCount(), points.featureCount())
+
+        def failing(feedback):
+            raise ValueError("broken input")
+        task = ModuleTask("Failing", failing, lambda success, result: outcome.append(success))
+        self._run(task)
+        self.assertIs(outcome[-1], False)
+        self.assertIsInstance(task.error, ValueError)
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsCoordinateReferenceSystem
+
+# Import the module we want to test
+from ..utils import raster_engine
+from ..utils.output_profile import OutputProfile, COMPRESS_DEFLATE, DATA_UINT16, UINT16_NODATA
+
+class TestOutputProfile(unittest.TestCase):
+    """Test suite for the GeoTIFF output profiles."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        """
+        A 600 x 500 grid with a smooth 0-1 surface and a NoData corner.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        crs_wkt = QgsCoordinateReferenceSystem('EPSG:32637').toWkt()
+        self.grid = raster_engine.RasterGrid(500000.0, 1000000.0, 30.0, 30.0, 600, 500, crs_wkt)
+        rows, cols = np.mgrid[0:500, 0:600]
+        self.array = ((rows + cols) / (500 + 600 - 2)).astype(np.float32)
+        self.array[:50, :50] = np.nan
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _read(self, path):
+        dataset = gdal.Open(path)
+        band = dataset.GetRasterBand(1)
+        raw = band.ReadAsArray()
+        values = raw.astype(np.float64) * (band.GetScale() or 1.0) + (band.GetOffset() or 0.0)
+        values[raw == band.GetNoDataValue()] = np.nan
+        info = {
+            'compression': dataset.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE'),
+            'layout': dataset.GetMetadataItem('LAYOUT', 'IMAGE_STRUCTURE'),
+            'block': band.GetBlockSize(),
+            'overviews': band.GetOverviewCount(),
+            'type': band.DataType
+        }
+        dataset = None
+        return values, info
+
+    def test_tiled_compressed_float32(self):
+        print("\n--- Running test_tiled_compressed_float32 ---")
+        profile = OutputProfile(compression=COMPRESS_DEFLATE, block_size=256)
+        path = raster_engine.write_array(os.path.join(self.temp_dir, 'float.tif'), self.array, self.grid, profile=profile)
+
+        values, info = self._read(path)
+        np.testing.assert_array_equal(values, self.array.astype(np.float64))
+        self.assertEqual(info['compression'], 'DEFLATE')
+        self.assertEqual(info['block'], [256, 256])
+        self.assertEqual(info['overviews'], len(profile.overview_levels(600, 500)))
+        self.assertGreater(info['overviews'], 0)
+
+        plain_path = raster_engine.write_array(os.path.join(self.temp_dir, 'plain.tif'), self.array, self.grid)
+        self.assertLess(os.path.getsize(path), os.path.getsize(plain_path))
+        print("--- Test completed successfully ---")
+
+    def test_scaled_uint16(self):
+        print("\n--- Running test_scaled_uint16 ---")
+        profile = OutputProfile(data_type=DATA_UINT16, block_size=256)
+        path = raster_engine.write_array(os.path.join(self.temp_dir, 'uint16.tif'), self.array, self.grid, profile=profile)
+
+        values, info = self._read(path)
+        self.assertEqual(info['type'], gdal.GDT_UInt16)
+        np.testing.assert_array_equal(np.isnan(values), np.isnan(self.array))
+        np.testing.assert_allclose(values, self.array, atol=profile.scale / 2 + 1e-9, equal_nan=True)
+        self.assertEqual(profile.encode(np.array([np.nan]))[0], UINT16_NODATA)
+        print("--- Test completed successfully ---")
+
+    def test_cog_layout_by_windows(self):
+        print("\n--- Running test_cog_layout_by_windows ---")
+        profile = OutputProfile(cog=True, block_size=256)
+        path = os.path.join(self.temp_dir, 'cog.tif')
+        dataset = raster_engine.create_output(path, self.grid, profile=profile)
+        for window in self.grid.iter_windows(100):
+            x, y, xs, ys = window
+            raster_engine.write_window(dataset, self.array[y:y + ys, x:x + xs], window, profile=profile)
+        raster_engine.close_output(dataset, path, profile=profile)
+        dataset = None
+
+        values, info = self._read(path)
+        np.testing.assert_array_equal(values, self.array.astype(np.float64))
+        self.assertEqual(info['layout'], 'COG')
+        self.assertGreater(info['overviews'], 0)
+        self.assertEqual(os.listdir(self.temp_dir), ['cog.tif'])
+        print("--- Test completed successfully ---")
+
+    def test_copy_matches_source(self):
+        print("\n--- Running test_copy_matches_source ---")
+        plain_path = raster_engine.write_array(os.path.join(self.temp_dir, 'plain.tif'), self.array, self.grid)
+        path = OutputProfile(block_size=128).copy(plain_path, os.path.join(self.temp_dir, 'copy.tif'))
+
+        values, info = self._read(path)
+        np.testing.assert_array_equal(values, self.array.astype(np.float64))
+        self.assertEqual(info['block'], [128, 128])
+        print("--- Test completed successfully ---")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+from qgis.PyQt.QtCore import QSize
+from qgis.core import (QgsApplication, QgsCoordinateReferenceSystem, QgsRasterLayer, QgsMapSettings,
+                       QgsMapRendererSequentialJob)
+
+# Import the module we want to test
+from ..utils import raster_engine
+from ..utils.output_profile import OutputProfile
+from ..utils.overviews import (overview_count, overview_levels, build_overviews, ensure_overviews,
+                               OVERVIEWS_SYNC, OVERVIEWS_ASYNC)
+
+# Side of the square raster rendered by the benchmark; set
+# ETHIORISKSURV_BENCHMARK_SIZE to e.g. 20000 for a national-scale map.
+BENCHMARK_SIZE = int(os.environ.get('ETHIORISKSURV_BENCHMARK_SIZE', 4000))
+
+class TestOverviews(unittest.TestCase):
+    """Test suite for risk map overview generation."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.crs_wkt = QgsCoordinateReferenceSystem('EPSG:32637').toWkt()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_risk_map(self, name, size):
+        """A size x size 0-1 risk surface written without overviews."""
+        grid = raster_engine.RasterGrid(500000.0, 1000000.0, 30.0, 30.0, size, size, self.crs_wkt)
+        rows, cols = np.mgrid[0:size, 0:size]
+        array = (np.sin(rows / 50.0) * np.cos(cols / 70.0) + 1.0) / 2.0
+        return raster_engine.write_array(os.path.join(self.temp_dir, name), array, grid)
+
+    def _render_seconds(self, path, repeats=3):
+        """Best-of time to render the full extent of a raster into an 800 x 600 image."""
+        best = None
+        for _ in range(repeats):
+            layer = QgsRasterLayer(path, 'risk')
+            settings = QgsMapSettings()
+            settings.setLayers([layer])
+            settings.setDestinationCrs(layer.crs())
+            settings.setExtent(layer.extent())
+            settings.setOutputSize(QSize(800, 600))
+            start = time.perf_counter()
+            job = QgsMapRendererSequentialJob(settings)
+            job.start()
+            job.waitForFinished()
+            elapsed = time.perf_counter() - start
+            self.assertFalse(job.renderedImage().isNull())
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def test_overview_levels(self):
+        print("\n--- Running test_overview_levels ---")
+        self.assertEqual(overview_levels(200, 100), [])
+        self.assertEqual(overview_levels(2048, 1000), [2, 4, 8])
+        print("--- Test completed successfully ---")
+
+    def test_build_and_ensure(self):
+        print("\n--- Running test_build_and_ensure ---")
+        path = self._write_risk_map('sync.tif', 1024)
+        self.assertEqual(overview_count(path), 0)
+
+        layer = QgsRasterLayer(path, 'risk')
+        self.assertIsNone(ensure_overviews(layer, OVERVIEWS_SYNC))
+        self.assertEqual(overview_count(path), len(overview_levels(1024, 1024)))
+        self.assertTrue(os.path.exists(path + '.ovr'))
+
+        # A raster with internal overviews from its output profile is left alone
+        grid = raster_engine.RasterGrid(500000.0, 1000000.0, 30.0, 30.0, 1024, 1024, self.crs_wkt)
+        profiled = raster_engine.write_array(os.path.join(self.temp_dir, 'profiled.tif'), np.zeros((1024, 1024)), grid,
+                                             profile=OutputProfile(block_size=256))
+        self.assertIsNone(ensure_overviews(QgsRasterLayer(profiled, 'risk'), OVERVIEWS_ASYNC))
+        self.assertFalse(os.path.exists(profiled + '.ovr'))
+        print("--- Test completed successfully ---")
+
+    def test_async_task(self):
+        print("\n--- Running test_async_task ---")
+        path = self._write_risk_map('async.tif', 1024)
+        task = ensure_overviews(QgsRasterLayer(path, 'risk'), OVERVIEWS_ASYNC)
+        self.assertIsNotNone(task)
+        task.waitForFinished()
+        self.assertGreater(overview_count(path), 0)
+        print("--- Test completed successfully ---")
+
+    def test_cancel_build(self):
+        print("\n--- Running test_cancel_build ---")
+        path = self._write_risk_map('cancel.tif', 1024)
+        self.assertFalse(build_overviews(path, is_canceled=lambda: True))
+        print("--- Test completed successfully ---")
+
+    def test_benchmark_render_with_and_without_overviews(self):
+        """
+        Benchmark: canvas render time of a full-extent view of a large risk
+        map, before and after building overviews.
+        """
+        print(f"\n--- Running test_benchmark_render_with_and_without_overviews ({BENCHMARK_SIZE} px) ---")
+        path = self._write_risk_map('benchmark.tif', BENCHMARK_SIZE)
+        without = self._render_seconds(path)
+
+        start = time.perf_counter()
+        self.assertTrue(build_overviews(path))
+        build = time.perf_counter() - start
+        with_overviews = self._render_seconds(path)
+
+        print(f"Render without overviews: {without * 1000:.1f} ms")
+        print(f"Overview build:           {build * 1000:.1f} ms")
+        print(f"Render with overviews:    {with_overviews * 1000:.1f} ms ({without / with_overviews:.1f}x faster)")
+        self.assertLess(with_overviews, without)
+        print("--- Test completed successfully ---")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import QgsApplication, QgsProcessingFeedback
+
+# Import the module we want to test
+from ..utils.pipeline import Pipeline, PipelineCanceled
+
+class TestPipeline(unittest.TestCase):
+    """Test suite for the weighted, cancellable pipeline stages."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def test_weighted_progress(self):
+        print("\n--- Running test_weighted_progress ---")
+        feedback = QgsProcessingFeedback()
+        with Pipeline("Test", feedback, {'factor0': 3, 'overlay': 1}) as pipeline:
+            with pipeline.stage('proximity', 'factor0', factor='roads', share=0.5) as stage:
+                stage.set_progress(50)
+                self.assertAlmostEqual(feedback.progress(), 100 * 3 * 0.25 / 4)
+                stage.feedback.setProgress(100) # As a processing algorithm would
+                self.assertAlmostEqual(feedback.progress(), 100 * 3 * 0.5 / 4)
+            self.assertAlmostEqual(feedback.progress(), 100 * 3 * 0.5 / 4)
+            pipeline.finish_part('factor0') # e.g. normalize skipped on a cache hit
+            self.assertAlmostEqual(feedback.progress(), 75.0)
+            with pipeline.stage('overlay', 'overlay'):
+                pass
+        self.assertEqual(feedback.progress(), 100.0)
+
+        summary = pipeline.summary()
+        self.assertFalse(summary['canceled'])
+        self.assertEqual([record['stage'] for record in summary['stages']], ['proximity', 'overlay'])
+        self.assertEqual(list(summary['by_factor']), ['roads'])
+        self.assertEqual(summary['slowest_factor'], 'roads')
+        self.assertGreaterEqual(summary['total_seconds'], summary['by_stage']['proximity'])
+        print("--- Test completed successfully ---")
+
+    def test_cancellation(self):
+        """
+        Canceling stops the run at the next check, cancels the running stage's
+        feedback and is swallowed by the pipeline.
+        """
+        print("\n--- Running test_cancellation ---")
+        feedback = QgsProcessingFeedback()
+        blocks = []
+        reached_end = []
+
+        def run():
+            with Pipeline("Test", feedback, {'overlay': 1}) as pipeline:
+                with pipeline.stage('overlay', 'overlay') as stage:
+                    for block in range(10):
+                        pipeline.check()
+                        blocks.append(block)
+                        if block == 3:
+                            feedback.cancel()
+                            self.assertTrue(stage.feedback.isCanceled())
+                reached_end.append(True)
+                return 'done'
+            return None
+        self.assertIsNone(run())
+        self.assertEqual(blocks, [0, 1, 2, 3])
+        self.assertEqual(reached_end, [])
+
+        pipeline = Pipeline("Test", feedback)
+        with self.assertRaises(PipelineCanceled):
+            pipeline.check()
+        print("--- Test completed successfully ---")
+
+    def test_errors_propagate(self):
+        print("\n--- Running test_errors_propagate ---")
+        with self.assertRaises(ValueError):
+            with Pipeline("Test", QgsProcessingFeedback(), {'overlay': 1}) as pipeline:
+                with pipeline.stage('overlay', 'overlay'):
+                    raise ValueError("broken")
+        self.assertEqual(pipeline.summary()['stages'][0]['stage'], 'overlay')
+
+        # A stage failing because the run was canceled counts as a cancellation
+        feedback = QgsProcessingFeedback()
+        with Pipeline("Test", feedback, {'overlay': 1}) as pipeline:
+            with pipeline.stage('overlay', 'overlay'):
+                feedback.cancel()
+                raise RuntimeError("Process was canceled")
+        self.assertTrue(pipeline.canceled)
+        print("--- Test completed successfully ---")
+
+    def test_concurrent_parts(self):
+        print("\n--- Running test_concurrent_parts ---")
+        feedback = QgsProcessingFeedback()
+        progress = []
+        feedback.progressChanged.connect(progress.append)
+        with Pipeline("Test", feedback, {f'factor{i}': 1 for i in range(8)}) as pipeline:
+            def work(index):
+                with pipeline.stage('normalize', f'factor{index}', factor=f'factor {index}') as stage:
+                    for percent in range(0, 101, 10):
+                        stage.set_progress(percent)
+                pipeline.finish_part(f'factor{index}')
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(work, range(8)))
+            self.assertAlmostEqual(pipeline.progress(), 100.0)
+        self.assertEqual(len(pipeline.summary()['by_factor']), 8)
+        self.assertEqual(progress[-1], 100.0)
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
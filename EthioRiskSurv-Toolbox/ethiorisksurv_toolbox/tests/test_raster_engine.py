@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsCoordinateReferenceSystem, QgsRectangle
+
+# Import the module we want to test
+from ..utils import raster_engine
+from ..utils.overviews import overview_count
+
+class TestRasterEngine(unittest.TestCase):
+    """Test suite for the GDAL/NumPy raster engine helpers."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        """
+        A 40 x 30 grid of 100 m pixels in UTM 37N and a few points on it.
+        """
+        crs_wkt = QgsCoordinateReferenceSystem('EPSG:32637').toWkt()
+        self.grid = raster_engine.RasterGrid(500000.0, 1000000.0, 100.0, 100.0, 40, 30, crs_wkt)
+        self.points = [(500150.0, 999850.0), (503050.0, 998550.0), (501250.0, 997150.0)]
+
+        self.layer = QgsVectorLayer("Point?crs=epsg:32637", "points", "memory")
+        features = []
+        for x, y in self.points:
+            feat = QgsFeature()
+            feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            features.append(feat)
+        self.layer.dataProvider().addFeatures(features)
+
+    def _brute_force_distances(self):
+        """Distance from each pixel centre to the centre of the nearest point's pixel."""
+        cols = np.arange(self.grid.width)
+        rows = np.arange(self.grid.height)
+        xs = self.grid.x_min + (cols + 0.5) * self.grid.pixel_width
+        ys = self.grid.y_max - (rows + 0.5) * self.grid.pixel_height
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        distances = np.full(grid_x.shape, np.inf)
+        for x, y in self.points:
+            col = int((x - self.grid.x_min) // self.grid.pixel_width)
+            row = int((self.grid.y_max - y) // self.grid.pixel_height)
+            distances = np.minimum(distances, np.hypot(grid_x - xs[col], grid_y - ys[row]))
+        return distances
+
+    def test_vector_distance_is_exact_euclidean(self):
+        print("\n--- Running test_vector_distance_is_exact_euclidean ---")
+        expected = self._brute_force_distances()
+        for method in (raster_engine.DISTANCE_AUTO, raster_engine.DISTANCE_GDAL):
+            distances = raster_engine.vector_distance(self.layer, self.grid, method)
+            self.assertEqual(distances.shape, (self.grid.height, self.grid.width))
+            np.testing.assert_allclose(distances, expected, rtol=1e-5, atol=0.01,
+                                       err_msg=f"Distances from the '{method}' method differ from brute force.")
+
+    def test_vector_distance_without_features(self):
+        print("\n--- Running test_vector_distance_without_features ---")
+        empty = QgsVectorLayer("Point?crs=epsg:32637", "empty", "memory")
+        self.assertIsNone(raster_engine.vector_distance(empty, self.grid))
+
+    def test_snapped_grid(self):
+        """
+        Snapped grids have exact resolution-sized pixels on the origin lattice
+        and cover the whole extent.
+        """
+        print("\n--- Running test_snapped_grid ---")
+        extent = QgsRectangle(500123.0, 997456.0, 503987.0, 999999.5)
+        grid = raster_engine.RasterGrid.snapped(extent, 100, self.grid.crs_wkt)
+
+        self.assertEqual((grid.x_min, grid.y_max), (500100.0, 1000000.0))
+        self.assertEqual((grid.pixel_width, grid.pixel_height), (100.0, 100.0))
+        x_min, y_min, x_max, y_max = grid.bounds
+        self.assertLessEqual(x_min, extent.xMinimum())
+        self.assertLessEqual(y_min, extent.yMinimum())
+        self.assertGreaterEqual(x_max, extent.xMaximum())
+        self.assertGreaterEqual(y_max, extent.yMaximum())
+        self.assertEqual((grid.width, grid.height), (39, 26))
+
+    def test_gdal_exceptions_are_scoped(self):
+        """
+        GDAL errors raise only inside gdal_exceptions(); the process-wide
+        mode is left as it was, and the None checks outside still work.
+        """
+        print("\n--- Running test_gdal_exceptions_are_scoped ---")
+        use_exceptions = gdal.GetUseExceptions()
+        with raster_engine.gdal_exceptions():
+            with self.assertRaises(RuntimeError):
+                gdal.Open('/vsimem/missing.tif')
+            self.assertFalse(raster_engine.is_aligned('/vsimem/missing.tif', self.grid))
+            self.assertEqual(overview_count('/vsimem/missing.tif'), 0)
+        self.assertEqual(gdal.GetUseExceptions(), use_exceptions)
+        self.assertFalse(raster_engine.is_aligned('/vsimem/missing.tif', self.grid))
+        self.assertEqual(overview_count('/vsimem/missing.tif'), 0)
+        self.grid.create_dataset('/vsimem/scoped.tif', driver_name='GTiff')
+        gdal.Unlink('/vsimem/scoped.tif')
+        self.assertEqual(gdal.GetUseExceptions(), use_exceptions)
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,17 +4,21 @@ import os
 import unittest
 import tempfile
 import shutil
+from unittest import mock
 
 # This setup is needed to run QGIS processing algorithms in a standalone script
-from qgis.core import QgsApplication, QgsVectorLayer, QgsRasterLayer, QgsProject
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsVectorLayer, QgsRasterLayer, QgsProject, QgsProcessingFeedback
 
 # Import the class we want to test
-from ..plugin.risk_analyzer import RiskAnalyzer
-
-# Set up the path to the fixtures directory
-# This assumes the test is run from the project's root directory
-# e.g., python3 -m unittest ethiosurv_risk_toolbox.tests.test_risk_analyzer
-TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+from ..utils.factor_cache import FactorCache
+from ..utils import raster_engine
+from ..utils.intermediate_store import STORAGE_MEMORY
+from ..utils.output_profile import OutputProfile, DATA_UINT16
+from ..utils.gis_utils import raster_min_max, normalize_raster, NORMALIZED_GTIFF, NORMALIZED_VRT
+from ..plugin.risk_analyzer import RiskAnalyzer, ENGINE_QGIS, ENGINE_NUMPY, ENGINE_STREAMING
+from . import synthetic_data
 
 class TestRiskAnalyzer(unittest.TestCase):
     """Test suite for the RiskAnalyzer class."""
@@ -34,14 +38,8 @@ class TestRiskAnalyzer(unittest.TestCase):
         # Create a temporary QGIS project instance to hold layers
         cls.project = QgsProject.instance()
         
-        # Load fixture data
-        cls.study_area_path = os.path.join(TEST_DATA_PATH, 'test_study_area.shp') # You should create this
-        cls.points_path = os.path.join(TEST_DATA_PATH, 'test_points.shp')
-        cls.raster_path = os.path.join(TEST_DATA_PATH, 'test_risk_map.tif')
-
-        # Check if fixture data exists
-        if not os.path.exists(cls.study_area_path) or not os.path.exists(cls.points_path) or not os.path.exists(cls.raster_path):
-            raise FileNotFoundError("Make sure test fixture data (test_study_area.shp, test_points.shp, test_risk_map.tif) exists in tests/fixtures/")
+        # Write the study area, risk factor raster and points
+        cls.study_area_path, cls.raster_path, cls.points_path = synthetic_data.write_inputs(cls.temp_dir)
 
     @classmethod
     def tearDownClass(cls):
@@ -117,6 +115,357 @@ class TestRiskAnalyzer(unittest.TestCase):
 
         print("--- Test completed successfully ---")
 
+    def test_numpy_engine_matches_qgis_engine(self):
+        """
+        The in-memory NumPy engine should reproduce the QgsRasterCalculator output.
+        """
+        print("\n--- Running test_numpy_engine_matches_qgis_engine ---")
+
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 8, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.raster_layer, 'weight': 3, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        arrays = {}
+        for engine in (ENGINE_QGIS, ENGINE_NUMPY):
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Engine_{engine}", engine=engine)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success, f"RiskAnalyzer.run() should succeed with the '{engine}' engine.")
+
+            dataset = gdal.Open(final_risk_map.source())
+            band = dataset.GetRasterBand(1)
+            array = band.ReadAsArray().astype(np.float64)
+            array[array == band.GetNoDataValue()] = np.nan
+            arrays[engine] = array
+            dataset = None
+
+        self.assertEqual(arrays[ENGINE_QGIS].shape, arrays[ENGINE_NUMPY].shape)
+        np.testing.assert_allclose(arrays[ENGINE_NUMPY], arrays[ENGINE_QGIS], rtol=0, atol=1e-6, equal_nan=True)
+
+        # Only the clipped map should have been written by the NumPy engine
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, f"Engine_{ENGINE_NUMPY}_RiskMap.tif")))
+        print("--- Test completed successfully ---")
+
+    def test_streaming_engine_matches_numpy_engine(self):
+        """
+        A small block size forces many windows; the result must not depend on it.
+        """
+        print("\n--- Running test_streaming_engine_matches_numpy_engine ---")
+
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 5, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.raster_layer, 'weight': 2, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        arrays = {}
+        for engine in (ENGINE_NUMPY, ENGINE_STREAMING):
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Blocks_{engine}", engine=engine, block_size=7)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success, f"RiskAnalyzer.run() should succeed with the '{engine}' engine.")
+
+            dataset = gdal.Open(final_risk_map.source())
+            arrays[engine] = dataset.GetRasterBand(1).ReadAsArray()
+            dataset = None
+
+        np.testing.assert_array_equal(arrays[ENGINE_STREAMING], arrays[ENGINE_NUMPY])
+        print("--- Test completed successfully ---")
+
+    def test_output_profile(self):
+        """
+        A COG UInt16 risk map from every engine decodes to the plain Float32 map
+        within half a quantization step.
+        """
+        print("\n--- Running test_output_profile ---")
+
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 3, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.points_layer, 'weight': 2, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        profile = OutputProfile(data_type=DATA_UINT16, cog=True, block_size=256)
+
+        def read(path):
+            dataset = gdal.Open(path)
+            band = dataset.GetRasterBand(1)
+            raw = band.ReadAsArray()
+            values = raw * (band.GetScale() or 1.0) + (band.GetOffset() or 0.0)
+            values[raw == band.GetNoDataValue()] = np.nan
+            layout = dataset.GetMetadataItem('LAYOUT', 'IMAGE_STRUCTURE')
+            dataset = None
+            return values, layout
+
+        analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, "Profile_plain", engine=ENGINE_NUMPY, output_profile=OutputProfile.plain())
+        analyzer.project.setHomePath(self.temp_dir)
+        success, final_risk_map = analyzer.run()
+        self.assertTrue(success)
+        expected, _ = read(final_risk_map.source())
+
+        for engine in (ENGINE_QGIS, ENGINE_NUMPY, ENGINE_STREAMING):
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Profile_{engine}", engine=engine, output_profile=profile)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success, f"RiskAnalyzer.run() should succeed with the '{engine}' engine.")
+
+            values, layout = read(final_risk_map.source())
+            self.assertEqual(layout, 'COG')
+            np.testing.assert_allclose(values, expected, rtol=0, atol=profile.scale / 2 + 1e-6, equal_nan=True)
+        print("--- Test completed successfully ---")
+
+    def test_clip_during_overlay(self):
+        """
+        Every engine clips while overlaying: NoData exactly outside the
+        rasterized study area and no unclipped overlay left on disk.
+        """
+        print("\n--- Running test_clip_during_overlay ---")
+
+        risk_factors = [{'layer': self.raster_layer, 'weight': 1, 'correlation': 'Higher values = Higher Risk'}]
+        for engine in (ENGINE_QGIS, ENGINE_NUMPY, ENGINE_STREAMING):
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Clip_{engine}", engine=engine, block_size=5)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success, f"RiskAnalyzer.run() should succeed with the '{engine}' engine.")
+
+            inside = raster_engine.rasterize_mask(self.study_area_layer, analyzer._target_grid())
+            dataset = gdal.Open(final_risk_map.source())
+            band = dataset.GetRasterBand(1)
+            nodata = band.ReadAsArray() == band.GetNoDataValue()
+            dataset = None
+            np.testing.assert_array_equal(nodata[~inside], True)
+            self.assertFalse(os.path.exists(os.path.join(self.temp_dir, f"overlay_0_Clip_{engine}_RiskMap.tif")))
+        print("--- Test completed successfully ---")
+
+    def test_progress_cancellation_and_timing_summary(self):
+        """
+        Every engine reports monotonic progress up to 100 %, times each stage of
+        each factor, and stops without a risk map when canceled between blocks.
+        """
+        print("\n--- Running test_progress_cancellation_and_timing_summary ---")
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 5, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.points_layer, 'weight': 2, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        for engine in (ENGINE_QGIS, ENGINE_NUMPY, ENGINE_STREAMING):
+            feedback = QgsProcessingFeedback()
+            progress = []
+            feedback.progressChanged.connect(progress.append)
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Stages_{engine}", engine=engine, block_size=7)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, _ = analyzer.run(feedback)
+            self.assertTrue(success, f"RiskAnalyzer.run() should succeed with the '{engine}' engine.")
+            self.assertEqual(progress[-1], 100.0)
+
+            summary = analyzer.timing_summary
+            self.assertFalse(summary['canceled'])
+            self.assertEqual(set(summary['by_factor']), {'raster', 'points'})
+            self.assertIn('proximity', summary['by_stage'])
+            self.assertIn('overlay', summary['by_stage'])
+            self.assertIn('invert' if engine == ENGINE_QGIS else 'normalize', summary['by_stage'])
+            self.assertIn(summary['slowest_factor'], ('raster', 'points'))
+            self.assertLessEqual(sum(summary['by_stage'].values()), summary['total_seconds'] + 1e-6)
+
+        # Cancel from the streaming overlay, once its blocks are being written
+        feedback = QgsProcessingFeedback()
+        feedback.progressChanged.connect(lambda value: feedback.cancel() if value > 70 else None)
+        analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, "Canceled", engine=ENGINE_STREAMING, block_size=3)
+        analyzer.project.setHomePath(self.temp_dir)
+        success, risk_map = analyzer.run(feedback)
+        self.assertFalse(success)
+        self.assertIsNone(risk_map)
+        self.assertTrue(analyzer.timing_summary['canceled'])
+        self.assertFalse(os.path.exists(analyzer._clipped_risk_map_path()))
+        print("--- Test completed successfully ---")
+
+    def test_streaming_error_leaves_no_risk_map(self):
+        """A write error in the middle of the streaming overlay discards the partial risk map."""
+        print("\n--- Running test_streaming_error_leaves_no_risk_map ---")
+        risk_factors = [{'layer': self.raster_layer, 'weight': 1, 'correlation': 'Higher values = Higher Risk'}]
+        write_window = raster_engine.write_window
+        calls = []
+
+        def failing_write_window(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError("Disk full")
+            return write_window(*args, **kwargs)
+
+        analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, "Write_Error", engine=ENGINE_STREAMING, block_size=3)
+        analyzer.project.setHomePath(self.temp_dir)
+        with mock.patch.object(raster_engine, 'write_window', side_effect=failing_write_window):
+            with self.assertRaises(RuntimeError):
+                analyzer.run()
+        self.assertEqual(len(calls), 3)
+        self.assertFalse(os.path.exists(analyzer._clipped_risk_map_path()))
+        print("--- Test completed successfully ---")
+
+    def test_parallel_factor_preparation(self):
+        """
+        Preparing factors on a worker pool must give the same map as doing it serially.
+        """
+        print("\n--- Running test_parallel_factor_preparation ---")
+
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 4, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.points_layer, 'weight': 6, 'correlation': 'Lower values = Higher Risk'},
+            {'layer': self.raster_layer, 'weight': 1, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        arrays = {}
+        for workers in (1, 4):
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Workers_{workers}", workers=workers)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success, f"RiskAnalyzer.run() should succeed with {workers} workers.")
+            self.assertEqual(len(analyzer.factor_timings), len(risk_factors))
+
+            dataset = gdal.Open(final_risk_map.source())
+            arrays[workers] = dataset.GetRasterBand(1).ReadAsArray()
+            dataset = None
+
+        np.testing.assert_array_equal(arrays[4], arrays[1])
+        print("--- Test completed successfully ---")
+
+    def test_factor_cache_reuse(self):
+        """
+        A second run with new weights should read every factor from the cache
+        and give the same map as an uncached run with those weights.
+        """
+        print("\n--- Running test_factor_cache_reuse ---")
+
+        cache = FactorCache(os.path.join(self.temp_dir, 'factor_cache'))
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 8, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.raster_layer, 'weight': 3, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, "Cache_First", engine=ENGINE_NUMPY, cache=cache)
+        analyzer.project.setHomePath(self.temp_dir)
+        success, _ = analyzer.run()
+        self.assertTrue(success)
+        self.assertEqual(len([n for n in os.listdir(cache.cache_dir) if n.endswith('.tif')]), 2)
+
+        reweighted = [dict(factor, weight=factor['weight'] + 1) for factor in risk_factors]
+        arrays = {}
+        for name, factor_cache in (("Cache_Second", cache), ("Cache_None", None)):
+            analyzer = RiskAnalyzer(self.study_area_layer, reweighted, 1000, name, engine=ENGINE_NUMPY, cache=factor_cache)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success)
+            dataset = gdal.Open(final_risk_map.source())
+            arrays[name] = dataset.GetRasterBand(1).ReadAsArray()
+            dataset = None
+
+        np.testing.assert_array_equal(arrays["Cache_Second"], arrays["Cache_None"])
+        print("--- Test completed successfully ---")
+
+    def test_min_max_modes(self):
+        """
+        Exact, cached and QGIS statistics must agree. The cached mode keeps
+        the range in the factor cache, not next to the raster, and an edit
+        of the raster invalidates it.
+        """
+        print("\n--- Running test_min_max_modes ---")
+
+        raster_copy = os.path.join(self.temp_dir, 'minmax_copy.tif')
+        shutil.copyfile(self.raster_path, raster_copy)
+        layer = QgsRasterLayer(raster_copy, "minmax_copy")
+
+        exact = raster_engine.band_min_max(raster_copy)
+        self.assertEqual(raster_min_max(layer), exact)
+        cache = FactorCache(os.path.join(self.temp_dir, 'minmax_cache'))
+        self.assertEqual(raster_engine.band_min_max(raster_copy, mode=raster_engine.MINMAX_CACHED, cache=cache), exact)
+        self.assertEqual(cache.get_min_max(raster_copy), exact)
+        self.assertFalse(os.path.exists(raster_copy + '.aux.xml'), "The source raster's directory must not be written to.")
+
+        stats = layer.dataProvider().bandStatistics(1)
+        self.assertAlmostEqual(exact[0], stats.minimumValue, places=5)
+        self.assertAlmostEqual(exact[1], stats.maximumValue, places=5)
+
+        # Edit the raster: the recorded range (and any statistics QGIS stored) is now stale
+        dataset = gdal.Open(raster_copy, gdal.GA_Update)
+        dataset.GetRasterBand(1).WriteArray(np.array([[1000.0]], dtype=np.float32), 50, 50)
+        dataset = None
+        stat = os.stat(raster_copy)
+        os.utime(raster_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(cache.get_min_max(raster_copy))
+        self.assertEqual(raster_engine.band_min_max(raster_copy, mode=raster_engine.MINMAX_CACHED, cache=cache), (exact[0], 1000.0))
+
+        approximate = raster_engine.band_min_max(raster_copy, mode=raster_engine.MINMAX_APPROXIMATE)
+        self.assertIsNotNone(approximate[0])
+        print("--- Test completed successfully ---")
+
+    def test_fused_normalize_and_invert(self):
+        """
+        normalize_raster(invert=True) must equal 1 - normalized, for both the
+        written GeoTIFF and the virtual VRT output.
+        """
+        print("\n--- Running test_fused_normalize_and_invert ---")
+
+        def read(layer):
+            dataset = gdal.Open(layer.source())
+            band = dataset.GetRasterBand(1)
+            array = band.ReadAsArray().astype(np.float64)
+            if band.GetNoDataValue() is not None:
+                array[array == band.GetNoDataValue()] = np.nan
+            dataset = None
+            return array
+
+        normalized = read(normalize_raster(self.raster_layer, os.path.join(self.temp_dir, 'fused_norm.tif')))
+        for output_format, name in ((NORMALIZED_GTIFF, 'fused_inv.tif'), (NORMALIZED_VRT, 'fused_inv.vrt')):
+            inverted_layer = normalize_raster(self.raster_layer, os.path.join(self.temp_dir, name), invert=True, output_format=output_format)
+            self.assertTrue(inverted_layer.isValid(), f"Inverted {output_format} output should be valid.")
+            np.testing.assert_allclose(read(inverted_layer), 1.0 - normalized, rtol=0, atol=1e-6, equal_nan=True)
+
+        # The VRT output writes no pixels
+        self.assertLess(os.path.getsize(os.path.join(self.temp_dir, 'fused_inv.vrt')), 64 * 1024)
+        print("--- Test completed successfully ---")
+
+    def test_memory_storage_leaves_no_intermediates(self):
+        """
+        With in-memory intermediates only the clipped risk map is left in the project home.
+        """
+        print("\n--- Running test_memory_storage_leaves_no_intermediates ---")
+
+        home = os.path.join(self.temp_dir, 'memory_storage_home')
+        os.makedirs(home)
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 8, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.points_layer, 'weight': 10, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, "Memory_Storage", storage=STORAGE_MEMORY)
+        analyzer.project.setHomePath(home)
+        success, final_risk_map = analyzer.run()
+
+        self.assertTrue(success)
+        self.assertEqual([n for n in os.listdir(home) if n.endswith('.tif')], ["Memory_Storage_RiskMap_Clipped.tif"])
+        print("--- Test completed successfully ---")
+
+    def test_aligned_factor_cache(self):
+        """
+        With align_factors and a cache, each raster factor is warped once onto
+        the snapped grid; a second run reuses the aligned rasters.
+        """
+        print("\n--- Running test_aligned_factor_cache ---")
+
+        cache = FactorCache(os.path.join(self.temp_dir, 'aligned_cache'))
+        risk_factors = [
+            {'layer': self.raster_layer, 'weight': 2, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.raster_layer, 'weight': 1, 'correlation': 'Lower values = Higher Risk'}
+        ]
+        results = []
+        for run in range(2):
+            analyzer = RiskAnalyzer(self.study_area_layer, risk_factors, 1000, f"Aligned_{run}", resampling='bilinear',
+                                    snap_origin=(0.0, 0.0), align_factors=True, cache=cache)
+            analyzer.project.setHomePath(self.temp_dir)
+            success, final_risk_map = analyzer.run()
+            self.assertTrue(success)
+            dataset = gdal.Open(final_risk_map.source())
+            results.append(dataset.GetRasterBand(1).ReadAsArray())
+            self.assertEqual(dataset.GetGeoTransform()[1], 1000.0)
+            dataset = None
+            if run == 0:
+                entries = sorted(os.listdir(cache.cache_dir))
+
+        self.assertEqual(sorted(os.listdir(cache.cache_dir)), entries, "The second run should only hit the cache.")
+        np.testing.assert_array_equal(results[0], results[1])
+        print("--- Test completed successfully ---")
+
 
 if __name__ == '__main__':
     # This allows you to run the test script directly
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+import tempfile
+import shutil
+
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsVectorLayer, QgsRasterLayer, QgsProject
+
+# Import the classes we want to test
+from ..plugin.risk_analyzer import RiskAnalyzer, ENGINE_NUMPY
+from ..plugin.risk_preview import RiskPreview, preview_resolutions
+from ..utils.output_profile import OutputProfile
+from . import synthetic_data
+
+class TestRiskPreview(unittest.TestCase):
+    """Test suite for the coarse-to-fine RiskPreview."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.project = QgsProject.instance()
+        cls.study_area_path, cls.raster_path, cls.points_path = synthetic_data.write_inputs(cls.temp_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application and temporary files. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        self.study_area_layer = QgsVectorLayer(self.study_area_path, "study_area", "ogr")
+        self.points_layer = QgsVectorLayer(self.points_path, "points", "ogr")
+        self.raster_layer = QgsRasterLayer(self.raster_path, "raster")
+        self.assertTrue(self.study_area_layer.isValid(), "Test study area layer failed to load.")
+        self.project.setHomePath(self.temp_dir)
+        self.risk_factors = [
+            {'layer': self.raster_layer, 'weight': 4, 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.points_layer, 'weight': 6, 'correlation': 'Lower values = Higher Risk'}
+        ]
+
+    def tearDown(self):
+        self.project.clear()
+
+    def _read(self, path):
+        dataset = gdal.Open(path)
+        band = dataset.GetRasterBand(1)
+        array = band.ReadAsArray().astype(np.float64)
+        array[array == band.GetNoDataValue()] = np.nan
+        dataset = None
+        return array
+
+    def test_preview_resolutions(self):
+        print("\n--- Running test_preview_resolutions ---")
+        self.assertEqual(preview_resolutions(30, 1000), [960, 480, 240, 120, 60, 30])
+        self.assertEqual(preview_resolutions(1000, 1000), [1000])
+        self.assertEqual(preview_resolutions(5000, 1000), [5000])
+        print("--- Test completed successfully ---")
+
+    def test_refines_to_full_run(self):
+        """
+        The last preview level must be the map a full NumPy run produces.
+        """
+        print("\n--- Running test_refines_to_full_run ---")
+
+        analyzer = RiskAnalyzer(self.study_area_layer, self.risk_factors, 250, "Preview")
+        preview = RiskPreview(analyzer, coarsest_resolution=1000)
+        shown = []
+        preview.levelFinished.connect(lambda resolution, path: shown.append(resolution))
+
+        layer = preview.start(self.project, background=False)
+        self.assertIsNotNone(layer)
+        self.assertEqual(shown, [500.0, 250.0])
+        self.assertEqual(preview.current_resolution, 250)
+        self.assertTrue(layer.isValid())
+
+        full = RiskAnalyzer(self.study_area_layer, self.risk_factors, 250, "Preview_Full", engine=ENGINE_NUMPY,
+                            output_profile=OutputProfile.plain())
+        success, final_risk_map = full.run()
+        self.assertTrue(success)
+        np.testing.assert_allclose(self._read(layer.source()), self._read(final_risk_map.source()), rtol=0, atol=1e-6, equal_nan=True)
+
+        preview_dir = preview.preview_dir
+        preview.close(self.project)
+        self.assertFalse(os.path.exists(preview_dir))
+        print("--- Test completed successfully ---")
+
+    def test_background_refinement(self):
+        print("\n--- Running test_background_refinement ---")
+        analyzer = RiskAnalyzer(self.study_area_layer, self.risk_factors, 500, "Preview_Task")
+        preview = RiskPreview(analyzer, coarsest_resolution=1000)
+        layer = preview.start(self.project)
+        self.assertEqual(preview.current_resolution, 1000)
+
+        preview.task.waitForFinished()
+        QgsApplication.processEvents() # Delivers the queued levelFinished signal
+        self.assertEqual(preview.current_resolution, 500)
+        self.assertTrue(layer.isValid())
+        preview.close(self.project)
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
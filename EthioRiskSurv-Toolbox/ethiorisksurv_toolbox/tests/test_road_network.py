@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+import numpy as np
+from qgis.core import QgsApplication, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsProject
+
+# Import the modules we want to test
+from ..utils import road_network
+from ..plugin.cost_evaluator import CostEvaluator, LOGISTICS_ROAD_NETWORK
+
+UTM_37N = "epsg:32637"
+
+def make_layer(geometry_type, geometries, crs=UTM_37N):
+    """In-memory layer with one feature per geometry."""
+    layer = QgsVectorLayer(f"{geometry_type}?crs={crs}", geometry_type, "memory")
+    features = []
+    for geometry in geometries:
+        feat = QgsFeature()
+        feat.setGeometry(geometry)
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+def polyline(*points):
+    return QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in points])
+
+class TestRoadNetwork(unittest.TestCase):
+    """Test suite for road network routing."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        QgsProject.instance().setEllipsoid('NONE') # Planar metres in UTM, so distances are exact
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def setUp(self):
+        road_network.clear_cache()
+        # An L-shaped road from HQ, a loop with a shortcut, and an isolated track
+        self.roads = make_layer("LineString", [
+            polyline((0, 0), (1000, 0), (1000, 1000)),
+            polyline((1000, 1000), (1000, 2000), (0, 2000)),
+            polyline((1000, 1000), (0, 2000)),
+            polyline((5000, 5000), (6000, 5000))
+        ])
+        self.hq = QgsPointXY(0, -5)
+
+    def test_graph(self):
+        print("\n--- Running test_graph ---")
+        graph = road_network.RoadGraph.from_layer(self.roads, 'NONE')
+        self.assertEqual(graph.node_count, 7) # Shared endpoints are merged
+        self.assertEqual(graph.edge_count, 6)
+        self.assertEqual(len(graph.indptr), graph.node_count + 1)
+
+        node = int(graph.nearest_nodes([1000.0], [1000.0])[0][0])
+        neighbours = graph.indices[graph.indptr[node]:graph.indptr[node + 1]]
+        self.assertEqual(len(neighbours), 3)
+
+        self.assertIsNone(road_network.RoadGraph.from_layer(make_layer("LineString", []), 'NONE'))
+        print("--- Test completed successfully ---")
+
+    def test_shortest_path_tree(self):
+        print("\n--- Running test_shortest_path_tree ---")
+        crs = self.roads.crs()
+        tree = road_network.shortest_path_tree(self.roads, self.hq, crs, 'NONE')
+        distances = tree.distances_to([1000, 10, 5500, 1000], [1010, 2000, 5000, -20], crs)
+
+        self.assertAlmostEqual(distances[0], 5 + 2000 + 10)
+        self.assertAlmostEqual(distances[1], 5 + 2000 + np.hypot(1000, 1000) + 10) # Through the shortcut
+        self.assertTrue(np.isinf(distances[2])) # Isolated track
+        self.assertAlmostEqual(distances[3], 5 + 1000 + 20)
+
+        end = int(tree.graph.nearest_nodes([0.0], [2000.0])[0][0])
+        route = [(tree.graph.x[node], tree.graph.y[node]) for node in tree.route(end)]
+        self.assertEqual(route, [(0, 0), (1000, 0), (1000, 1000), (0, 2000)])
+
+        # Cached per road layer and HQ
+        self.assertIs(road_network.shortest_path_tree(self.roads, self.hq, crs, 'NONE'), tree)
+        self.assertIsNot(road_network.shortest_path_tree(self.roads, QgsPointXY(1000, 2000), crs, 'NONE'), tree)
+        print("--- Test completed successfully ---")
+
+    def test_dijkstra_without_scipy(self):
+        print("\n--- Running test_dijkstra_without_scipy ---")
+        graph = road_network.RoadGraph.from_layer(self.roads, 'NONE')
+        source = int(graph.nearest_nodes([0.0], [0.0])[0][0])
+        expected, _ = graph.dijkstra(source)
+        with mock.patch.object(road_network, 'csgraph_dijkstra', None), mock.patch.object(road_network, 'cKDTree', None):
+            distances, predecessors = graph.dijkstra(source)
+            nodes, access = graph.nearest_nodes([1000.0], [1010.0])
+        np.testing.assert_allclose(distances, expected)
+        self.assertEqual(predecessors[source], road_network.NO_PREDECESSOR)
+        self.assertAlmostEqual(access[0], 10.0)
+        print("--- Test completed successfully ---")
+
+    def test_cost_evaluator_road_mode(self):
+        """
+        Road distances make logistics more expensive than straight lines, and
+        points off the network fall back to the straight line.
+        """
+        print("\n--- Running test_cost_evaluator_road_mode ---")
+        points = make_layer("Point", [QgsGeometry.fromPointXY(QgsPointXY(x, y)) for x, y in [(10, 2000), (5500, 5000)]])
+        params = {'cost_per_km': 20, 'hq_point': self.hq}
+        straight = CostEvaluator(points, params).calculate_total_cost()
+        by_road = CostEvaluator(points, dict(params, logistics_mode=LOGISTICS_ROAD_NETWORK, road_layer=self.roads)).calculate_total_cost()
+
+        road_km = (5 + 2000 + np.hypot(1000, 1000) + 10 + np.hypot(5500, 5005)) / 1000
+        self.assertAlmostEqual(by_road['breakdown']['logistics_costs'], 2 * road_km * 20, places=6)
+        self.assertGreater(by_road['breakdown']['logistics_costs'], straight['breakdown']['logistics_costs'])
+        self.assertEqual(by_road['logistics_mode'], LOGISTICS_ROAD_NETWORK)
+
+        with self.assertRaises(ValueError):
+            CostEvaluator(points, dict(params, logistics_mode=LOGISTICS_ROAD_NETWORK)).calculate_total_cost()
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import unittest
+import tempfile
+import shutil
+
+from qgis.core import QgsApplication, QgsProject
+
+# Import the module we want to test
+from ..plugin.scenario import load_scenario, ScenarioRunner, ScenarioError, correlation_label
+from ..plugin.risk_analyzer import LOWER_IS_HIGHER_RISK
+from . import synthetic_data
+
+class TestScenario(unittest.TestCase):
+    """Test suite for the headless scenario runner."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application and the processing framework. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        from processing.core.Processing import Processing
+        Processing.initialize()
+        cls.data_dir = tempfile.mkdtemp()
+        cls.study_area_path, cls.raster_path, cls.points_path = synthetic_data.write_inputs(cls.data_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application and the test data. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+        shutil.rmtree(cls.data_dir)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        QgsProject.instance().clear()
+        shutil.rmtree(self.temp_dir)
+
+    def _write_scenario(self, scenario, name='scenario.json'):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(scenario, f)
+        return path
+
+    def test_load_scenario_resolves_paths(self):
+        print("\n--- Running test_load_scenario_resolves_paths ---")
+        path = self._write_scenario({
+            'study_area': 'data/area.gpkg|layername=woreda',
+            'risk_analysis': {'factors': [{'path': 'data/roads.shp', 'weight': 2, 'correlation': 'lower'}]}
+        }, 'woreda_01.json')
+        scenario = load_scenario(path)
+        self.assertEqual(scenario['name'], 'woreda_01')
+        self.assertEqual(scenario['study_area'], os.path.join(self.temp_dir, 'data', 'area.gpkg') + '|layername=woreda')
+        self.assertEqual(scenario['risk_analysis']['factors'][0]['path'], os.path.join(self.temp_dir, 'data', 'roads.shp'))
+        self.assertEqual(scenario['output_dir'], os.path.join(self.temp_dir, 'results', 'woreda_01'))
+        self.assertEqual(correlation_label('lower'), LOWER_IS_HIGHER_RISK)
+
+        with self.assertRaises(ScenarioError):
+            load_scenario(self._write_scenario({'name': 'no_study_area'}, 'bad.json'))
+        print("--- Test completed successfully ---")
+
+    def test_run_scenario(self):
+        """
+        A complete scenario runs headlessly and writes the risk map, the
+        sampling points, the report and a summary.
+        """
+        print("\n--- Running test_run_scenario ---")
+        scenario = load_scenario(self._write_scenario({
+            'name': 'Headless',
+            'output_dir': 'out',
+            'study_area': self.study_area_path,
+            'risk_analysis': {
+                'resolution': 1000,
+                'engine': 'numpy',
+                'factors': [
+                    {'path': self.raster_path, 'weight': 3, 'correlation': 'higher'},
+                    {'path': self.points_path, 'weight': 1, 'correlation': 'lower'}
+                ]
+            },
+            'sampling': {'strategy': 'random', 'count': 25},
+            'cost': {'cost_per_sample': 500, 'cost_per_diem': 1000, 'team_size': 2, 'samples_per_day': 10, 'cost_per_km': 20},
+            'report': {'title': 'Headless test'}
+        }))
+        summary = ScenarioRunner(scenario).run()
+
+        self.assertEqual(summary['status'], 'ok', summary.get('error'))
+        self.assertTrue(os.path.exists(summary['risk_map']))
+        self.assertEqual(summary['sampling']['num_samples'], 25)
+        self.assertTrue(os.path.exists(summary['sampling']['output']))
+        self.assertGreater(summary['cost']['total_cost'], 0)
+        self.assertTrue(os.path.exists(summary['report']))
+        with open(os.path.join(scenario['output_dir'], 'summary.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['status'], 'ok')
+        print("--- Test completed successfully ---")
+
+    def test_failed_stage_is_reported(self):
+        print("\n--- Running test_failed_stage_is_reported ---")
+        scenario = load_scenario(self._write_scenario({
+            'name': 'Broken',
+            'study_area': self.study_area_path,
+            'risk_analysis': {'factors': [{'path': 'missing.tif'}]}
+        }))
+        summary = ScenarioRunner(scenario).run()
+        self.assertEqual(summary['status'], 'failed')
+        self.assertIn('missing.tif', summary['error'])
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+import tempfile
+import shutil
+
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsVectorLayer
+
+# Import the module we want to test
+from ..plugin.shard_runner import ShardRunner, list_shards, shard_scenario, safe_name, STATUS_OK, STATUS_FAILED
+from . import synthetic_data
+
+CRASHING_SHARD = 'Dendi'
+
+def crashing_worker(scenario, shard, log_level='warning'):
+    """Worker that kills its process for CRASHING_SHARD and succeeds without running anything otherwise."""
+    if shard == CRASHING_SHARD:
+        os._exit(1)
+    return shard, {'name': scenario['name'], 'status': STATUS_OK, 'timings': {'risk_analysis': 0.1}}
+
+class TestShardRunner(unittest.TestCase):
+    """Test suite for the per-study-area process pool runner."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        cls.data_dir = tempfile.mkdtemp()
+        cls.raster_path = synthetic_data.write_risk_raster(os.path.join(cls.data_dir, 'risk_factor.tif'))
+        cls.points_path = synthetic_data.write_points(os.path.join(cls.data_dir, 'points.gpkg'))
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application and the test data. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+        shutil.rmtree(cls.data_dir)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.study_areas_path = self._write_study_areas(['Ada Berga', 'Dendi', "Ejere's"])
+        self.scenario = {
+            'name': 'Zone',
+            'output_dir': os.path.join(self.temp_dir, 'out'),
+            'study_area': self.study_areas_path + '|layername=woredas',
+            'risk_analysis': {
+                'resolution': 1000,
+                'engine': 'numpy',
+                'factors': [
+                    {'path': self.raster_path, 'weight': 3, 'correlation': 'higher'},
+                    {'path': self.points_path, 'weight': 1, 'correlation': 'lower'}
+                ]
+            },
+            'sampling': {'strategy': 'random', 'count': 10},
+            'cost': {'cost_per_sample': 500, 'cost_per_diem': 1000, 'team_size': 2, 'samples_per_day': 10, 'cost_per_km': 20}
+        }
+        self.output_path = os.path.join(self.temp_dir, 'zone.gpkg')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_study_areas(self, names):
+        """One square woreda per name, side by side, in a GeoPackage layer with a 'woreda' field."""
+        return synthetic_data.write_study_areas(os.path.join(self.temp_dir, 'woredas.gpkg'), names, 'woreda', 'woredas')
+
+    def _shard_rows(self):
+        datasource = gdal.OpenEx(self.output_path, gdal.OF_VECTOR)
+        rows = {feature.GetField('shard'): feature.GetField('status') for feature in datasource.GetLayerByName('shards')}
+        datasource = None
+        return rows
+
+    def test_shard_scenario(self):
+        print("\n--- Running test_shard_scenario ---")
+        self.assertEqual(list_shards(self.scenario['study_area'], 'woreda'), ['Ada Berga', 'Dendi', "Ejere's"])
+        with self.assertRaises(ValueError):
+            list_shards(self.scenario['study_area'], 'missing')
+
+        shard = shard_scenario(self.scenario, 'woreda', "Ejere's", os.path.join(self.temp_dir, 'shards'))
+        self.assertEqual(shard['name'], 'Zone_Ejere_s')
+        self.assertEqual(shard['output_dir'], os.path.join(self.temp_dir, 'shards', 'Ejere_s'))
+        layer = QgsVectorLayer(shard['study_area'], "shard", "ogr")
+        self.assertTrue(layer.isValid())
+        self.assertEqual(layer.featureCount(), 1)
+        self.assertEqual(self.scenario['study_area'], self.study_areas_path + '|layername=woredas') # Not modified
+        self.assertEqual(safe_name('  '), 'shard')
+        print("--- Test completed successfully ---")
+
+    def test_run_merge_and_resume(self):
+        """
+        Every study area is run in a worker and merged into one GeoPackage;
+        a second run skips them all.
+        """
+        print("\n--- Running test_run_merge_and_resume ---")
+        reported = []
+        runner = ShardRunner(self.scenario, 'woreda', self.output_path, jobs=2,
+                             progress=lambda done, total, shard, summary: reported.append((done, total, shard)))
+        counts = runner.run()
+
+        self.assertEqual(counts, {'total': 3, 'skipped': 0, STATUS_OK: 3, STATUS_FAILED: 0})
+        self.assertEqual([(done, total) for done, total, _ in reported], [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(self._shard_rows(), {'Ada Berga': STATUS_OK, 'Dendi': STATUS_OK, "Ejere's": STATUS_OK})
+
+        points = QgsVectorLayer(self.output_path + '|layername=sampling_points', "points", "ogr")
+        self.assertEqual(points.featureCount(), 30)
+        self.assertEqual(set(points.uniqueValues(points.fields().indexOf('shard'))), {'Ada Berga', 'Dendi', "Ejere's"})
+        raster = gdal.Open(f"GPKG:{self.output_path}:risk_map_Dendi")
+        self.assertIsNotNone(raster)
+        raster = None
+
+        resumed = ShardRunner(self.scenario, 'woreda', self.output_path, progress=lambda *args: self.fail("Nothing should run")).run()
+        self.assertEqual(resumed, {'total': 3, 'skipped': 3, STATUS_OK: 0, STATUS_FAILED: 0})
+        print("--- Test completed successfully ---")
+
+    def test_failed_shard_is_isolated_and_retried(self):
+        print("\n--- Running test_failed_shard_is_isolated_and_retried ---")
+        runner = ShardRunner(self.scenario, 'woreda', self.output_path, progress=lambda *args: None)
+        runner.merge('Dendi', {'name': 'Zone_Dendi', 'status': STATUS_FAILED, 'error': "Out of disk", 'timings': {}})
+        self.assertEqual(self._shard_rows(), {'Dendi': STATUS_FAILED})
+        self.assertEqual(runner.completed_shards(), set())
+
+        ran = []
+        runner._execute = lambda shards: ((shard, {'name': shard, 'status': STATUS_OK, 'timings': {}}) for shard in shards if not ran.append(shard))
+        counts = runner.run()
+        self.assertEqual(ran, ['Ada Berga', 'Dendi', "Ejere's"])
+        self.assertEqual(counts[STATUS_OK], 3)
+        self.assertEqual(self._shard_rows()['Dendi'], STATUS_OK) # The failed row is replaced, not duplicated
+
+        runner.merge('Dendi', {'name': 'Zone_Dendi', 'status': STATUS_FAILED, 'error': "Crashed", 'timings': {}})
+        self.assertEqual(runner.completed_shards(), {'Ada Berga', "Ejere's"})
+        ran.clear()
+        runner.run()
+        self.assertEqual(ran, ['Dendi'])
+        print("--- Test completed successfully ---")
+
+    def test_remerge_replaces_risk_map(self):
+        """
+        Merging a shard again replaces its raster table instead of keeping
+        the stale one; a failed re-merge leaves no raster behind.
+        """
+        print("\n--- Running test_remerge_replaces_risk_map ---")
+        runner = ShardRunner(self.scenario, 'woreda', self.output_path, progress=lambda *args: None)
+        runner.merge('Dendi', {'name': 'Zone_Dendi', 'status': STATUS_OK, 'risk_map': self.raster_path, 'timings': {}})
+
+        replacement_path = os.path.join(self.temp_dir, 'replacement.tif')
+        replacement = gdal.GetDriverByName('GTiff').CreateCopy(replacement_path, gdal.Open(self.raster_path))
+        replacement.GetRasterBand(1).Fill(7.0)
+        replacement = None
+        runner.merge('Dendi', {'name': 'Zone_Dendi', 'status': STATUS_OK, 'risk_map': replacement_path, 'timings': {}})
+
+        raster = gdal.Open(f"GPKG:{self.output_path}:risk_map_Dendi")
+        self.assertEqual(raster.GetRasterBand(1).ComputeRasterMinMax(False), (7.0, 7.0))
+        raster = None
+        self.assertEqual(self._shard_rows(), {'Dendi': STATUS_OK})
+
+        runner.merge('Dendi', {'name': 'Zone_Dendi', 'status': STATUS_FAILED, 'error': "Out of disk", 'timings': {}})
+        self.assertIsNone(gdal.Open(f"GPKG:{self.output_path}:risk_map_Dendi"))
+        self.assertEqual(self._shard_rows(), {'Dendi': STATUS_FAILED})
+        print("--- Test completed successfully ---")
+
+    def test_crashed_worker_is_recorded(self):
+        """
+        A worker process that dies fails only its own shard, which is merged
+        and counted as failed; the pool is recreated for the remaining shards.
+        """
+        print("\n--- Running test_crashed_worker_is_recorded ---")
+        reported = []
+        runner = ShardRunner(self.scenario, 'woreda', self.output_path, jobs=1,
+                             progress=lambda done, total, shard, summary: reported.append((done, shard, summary['status'])))
+        runner.worker = crashing_worker
+        counts = runner.run()
+
+        self.assertEqual(counts, {'total': 3, 'skipped': 0, STATUS_OK: 2, STATUS_FAILED: 1})
+        self.assertEqual(reported, [(1, 'Ada Berga', STATUS_OK), (2, CRASHING_SHARD, STATUS_FAILED), (3, "Ejere's", STATUS_OK)])
+        self.assertEqual(self._shard_rows(), {'Ada Berga': STATUS_OK, CRASHING_SHARD: STATUS_FAILED, "Ejere's": STATUS_OK})
+        self.assertEqual(runner.completed_shards(), {'Ada Berga', "Ejere's"})
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
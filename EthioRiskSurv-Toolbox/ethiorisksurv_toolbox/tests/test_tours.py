@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import unittest
+
+import numpy as np
+from qgis.core import (QgsApplication, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsProject,
+                       QgsCoordinateReferenceSystem)
+
+# Import the modules we want to test
+from ..utils import tours
+from ..plugin.cost_evaluator import CostEvaluator, LOGISTICS_TOURS
+
+# Number of sampling points planned by the benchmark; set
+# ETHIORISKSURV_BENCHMARK_POINTS to e.g. 20000 for a national survey.
+BENCHMARK_POINTS = int(os.environ.get('ETHIORISKSURV_BENCHMARK_POINTS', 5000))
+MAX_PLANNING_SECONDS = 10
+
+UTM_37N = QgsCoordinateReferenceSystem("EPSG:32637")
+
+def make_points_layer(points, crs="epsg:32637"):
+    """In-memory point layer with one feature per (x, y)."""
+    layer = QgsVectorLayer(f"Point?crs={crs}", "TestSamplingPlan", "memory")
+    features = []
+    for x, y in points:
+        feat = QgsFeature()
+        feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+class TestTours(unittest.TestCase):
+    """Test suite for the daily tour planning."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        QgsProject.instance().setEllipsoid('NONE') # Planar metres in UTM
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+
+    def test_order_tour(self):
+        """
+        Points on a circle around the HQ, given in a scrambled order, are
+        visited around the circle.
+        """
+        print("\n--- Running test_order_tour ---")
+        angles = np.random.default_rng(1).permutation(np.linspace(0, 2 * np.pi, 12, endpoint=False))
+        x = np.concatenate(([0.0], 1000 * np.cos(angles) + 5000))
+        y = np.concatenate(([0.0], 1000 * np.sin(angles)))
+        matrix = tours.distance_matrix(x, y, UTM_37N, 'NONE')
+
+        route, length = tours.order_tour(matrix)
+        self.assertEqual(route[0], 0)
+        self.assertEqual(route[-1], 0)
+        self.assertEqual(sorted(route[1:-1]), list(range(1, 13)))
+        visited = np.round(np.degrees(angles[route[1:-1] - 1])) % 360
+        steps = np.abs(np.diff(visited)) % 360
+        self.assertTrue(np.all((steps == 30) | (steps == 330)), "The circle is visited in order")
+        self.assertLessEqual(length, tours.route_length(tours.nearest_neighbour_route(matrix), matrix))
+        print("--- Test completed successfully ---")
+
+    def test_two_opt_removes_crossing(self):
+        print("\n--- Running test_two_opt_removes_crossing ---")
+        x = np.array([0.0, 0.0, 1000.0, 0.0, 1000.0])
+        y = np.array([0.0, 1000.0, 0.0, 2000.0, 2000.0])
+        matrix = tours.distance_matrix(x, y, UTM_37N, 'NONE')
+        crossing = np.array([0, 1, 2, 3, 4, 0])
+        route, improved = tours.two_opt(crossing.copy(), matrix)
+        self.assertTrue(improved)
+        self.assertLess(tours.route_length(route, matrix), tours.route_length(crossing, matrix))
+        print("--- Test completed successfully ---")
+
+    def test_cost_evaluator_tours(self):
+        """
+        Tours of samples_per_day points cost less travel than a round trip
+        to every point, and the per diem follows the planned days.
+        """
+        print("\n--- Running test_cost_evaluator_tours ---")
+        rng = np.random.default_rng(7)
+        # 200 points in one kebele, 40 km from HQ
+        layer = make_points_layer(zip(rng.uniform(40000, 43000, 200), rng.uniform(0, 3000, 200)))
+        params = {'cost_per_diem': 1000, 'team_size': 2, 'samples_per_day': 25, 'cost_per_km': 20, 'hq_point': QgsPointXY(0, 0)}
+
+        round_trips = CostEvaluator(layer, params).calculate_total_cost()
+        evaluator = CostEvaluator(layer, dict(params, logistics_mode=LOGISTICS_TOURS))
+        results = evaluator.calculate_total_cost()
+
+        self.assertEqual(results['field_days'], 8)
+        self.assertEqual(results['breakdown']['personnel_costs'], 8 * 2 * 1000)
+        self.assertEqual(sum(tour['num_samples'] for tour in results['tours']), 200)
+        self.assertTrue(all(tour['num_samples'] <= 25 for tour in results['tours']))
+        visited = np.sort(np.concatenate([tour.points for tour in evaluator.tours]))
+        np.testing.assert_array_equal(visited, np.arange(200))
+        # Each tour is at least the round trip to its farthest point
+        self.assertGreater(results['tours'][0]['distance_km'], 80)
+        self.assertLess(results['breakdown']['logistics_costs'], round_trips['breakdown']['logistics_costs'] / 10)
+        print(f"  - Logistics: {results['breakdown']['logistics_costs']:.0f} ETB in tours, "
+              f"{round_trips['breakdown']['logistics_costs']:.0f} ETB as round trips")
+        print("--- Test completed successfully ---")
+
+    def test_planning_benchmark(self):
+        print("\n--- Running test_planning_benchmark ---")
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(0, 300000, BENCHMARK_POINTS), rng.uniform(0, 300000, BENCHMARK_POINTS)
+        start = time.perf_counter()
+        planned = tours.plan_tours(x, y, QgsPointXY(150000, 150000), UTM_37N, 'NONE', 40)
+        seconds = time.perf_counter() - start
+        print(f"{BENCHMARK_POINTS} points in {len(planned)} tours planned in {seconds:.2f} s")
+        self.assertEqual(sum(len(tour) for tour in planned), BENCHMARK_POINTS)
+        self.assertLess(seconds, MAX_PLANNING_SECONDS * max(1, BENCHMARK_POINTS / 5000))
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+import tempfile
+import shutil
+
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsVectorLayer, QgsRasterLayer, QgsProject
+
+# Import the classes we want to test
+from ..plugin.risk_analyzer import RiskAnalyzer, ENGINE_NUMPY
+from ..plugin.weight_tuner import WeightTuner
+from . import synthetic_data
+
+class TestWeightTuner(unittest.TestCase):
+    """Test suite for the WeightTuner class."""
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Set up the QGIS application. Run once for the entire test class.
+        """
+        cls.qgs = QgsApplication([], False)
+        cls.qgs.initQgis()
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.project = QgsProject.instance()
+        cls.study_area_path, cls.raster_path, _ = synthetic_data.write_inputs(cls.temp_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Clean up the QGIS application and temporary files. Run once after all tests.
+        """
+        cls.qgs.exitQgis()
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        self.study_area_layer = QgsVectorLayer(self.study_area_path, "study_area", "ogr")
+        self.raster_layer = QgsRasterLayer(self.raster_path, "raster")
+        self.assertTrue(self.study_area_layer.isValid(), "Test study area layer failed to load.")
+        self.assertTrue(self.raster_layer.isValid(), "Test raster layer failed to load.")
+        self.project.setHomePath(self.temp_dir)
+
+    def tearDown(self):
+        self.project.clear()
+
+    def _risk_factors(self, weights):
+        return [
+            {'layer': self.raster_layer, 'weight': weights[0], 'correlation': 'Higher values = Higher Risk'},
+            {'layer': self.raster_layer, 'weight': weights[1], 'correlation': 'Lower values = Higher Risk'}
+        ]
+
+    def test_incremental_update_matches_full_run(self):
+        """
+        Changing a weight incrementally must match a full run with the new weights.
+        """
+        print("\n--- Running test_incremental_update_matches_full_run ---")
+
+        tuner = WeightTuner(RiskAnalyzer(self.study_area_layer, self._risk_factors([5, 5]), 1000, "Tuning"))
+        self.assertTrue(tuner.load())
+        self.assertTrue(tuner.set_weight(0, 9))
+        self.assertTrue(tuner.set_weight(1, 2))
+        self.assertFalse(tuner.set_weight(1, 2), "An unchanged weight should not trigger an update.")
+
+        analyzer = RiskAnalyzer(self.study_area_layer, self._risk_factors([9, 2]), 1000, "Tuning_Full", engine=ENGINE_NUMPY)
+        success, final_risk_map = analyzer.run()
+        self.assertTrue(success)
+        dataset = gdal.Open(final_risk_map.source())
+        band = dataset.GetRasterBand(1)
+        expected = band.ReadAsArray().astype(np.float64)
+        expected[expected == band.GetNoDataValue()] = np.nan
+        dataset = None
+
+        np.testing.assert_allclose(tuner.risk(), expected, rtol=0, atol=1e-6, equal_nan=True)
+
+        preview = tuner.update_preview(self.project)
+        self.assertTrue(preview.isValid())
+        tuner.close(self.project)
+        self.assertFalse(os.path.exists(tuner.preview_path))
+        print("--- Test completed successfully ---")
+
+
+if __name__ == '__main__':
+    unittest.main()
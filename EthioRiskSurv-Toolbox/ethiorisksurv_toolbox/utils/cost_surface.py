@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+"""
+Accumulated-cost (travel time) surfaces for the cost evaluation.
+
+A friction raster gives the time needed to cross one metre of each cell,
+e.g. in minutes per metre as in the Malaria Atlas Project walking friction
+surfaces; cells that are NoData or not positive cannot be crossed. The grid
+is a graph in which every cell is linked to its eight neighbours, a step
+costing its length in metres times the mean friction of the two cells, and
+a single-source Dijkstra from the HQ's cell gives the travel time to every
+cell at once. The travel time to a sampling point is then a lookup of its
+cell.
+
+Friction grids and surfaces are cached in memory per friction raster (and
+per HQ cell for surfaces), so new sampling plans with the same raster and
+HQ only need lookups. A changed raster file (size or modification time)
+invalidates them.
+
+SciPy's csgraph.dijkstra is used when available, a heapq Dijkstra otherwise.
+"""
+
+import heapq
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from osgeo import gdal
+from qgis.core import QgsUnitTypes
+
+from ..utils import logger
+from ..utils import geodesy
+from ..utils.factor_cache import source_file
+from ..utils.raster_engine import RasterGrid, gdal_exceptions
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+except ImportError:
+    coo_matrix = csgraph_dijkstra = None # SciPy is optional
+
+MAX_CACHED_GRIDS = 2
+MAX_CACHED_SURFACES = 16
+
+# (row, column) steps to the neighbours below and to the right; every link is stored once
+NEIGHBOUR_STEPS = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+
+class FrictionGrid:
+    """Friction values of a north-up raster, NaN where a cell cannot be crossed."""
+    def __init__(self, friction, grid, crs):
+        """
+        Constructor.
+        :param friction: 2D float64 array, time per metre.
+        :param grid: raster_engine.RasterGrid of the array.
+        :param crs: QgsCoordinateReferenceSystem of the grid.
+        """
+        self.friction = friction
+        self.grid = grid
+        self.crs = crs
+
+    @classmethod
+    @gdal_exceptions()
+    def from_layer(cls, layer):
+        """Reads band 1 of a GDAL raster layer. :return: FrictionGrid."""
+        try:
+            dataset = gdal.Open(source_file(layer.source()))
+        except RuntimeError as e:
+            raise ValueError(f"Friction raster '{layer.name()}' cannot be read: {e}")
+        band = dataset.GetRasterBand(1)
+        friction = band.ReadAsArray().astype(np.float64)
+        invalid = ~np.isfinite(friction) | (friction <= 0)
+        nodata = band.GetNoDataValue()
+        if nodata is not None:
+            invalid |= friction == nodata
+        friction[invalid] = np.nan
+        return cls(friction, RasterGrid.from_dataset(dataset), layer.crs())
+
+    @property
+    def shape(self):
+        return self.friction.shape
+
+    @property
+    def median_friction(self):
+        """Median friction of the passable cells, or NaN if there are none."""
+        passable = self.friction[np.isfinite(self.friction)]
+        return float(np.median(passable)) if len(passable) else float('nan')
+
+    def cell_sizes(self):
+        """
+        Cell width for every row and cell height, in metres. The width of
+        cells in a geographic CRS shrinks with the cosine of the latitude.
+        :return: (widths array, height)
+        """
+        height, _ = self.shape
+        if self.crs.isGeographic():
+            latitudes = self.grid.y_max - (np.arange(height) + 0.5) * self.grid.pixel_height
+            radians_per_degree = math.pi / 180
+            widths = self.grid.pixel_width * radians_per_degree * geodesy.MEAN_EARTH_RADIUS * np.cos(np.radians(latitudes))
+            return widths, self.grid.pixel_height * radians_per_degree * geodesy.MEAN_EARTH_RADIUS
+        factor = QgsUnitTypes.fromUnitToUnitFactor(self.crs.mapUnits(), QgsUnitTypes.DistanceMeters)
+        return np.full(height, self.grid.pixel_width * factor), self.grid.pixel_height * factor
+
+    def cells(self, x, y):
+        """
+        Cells containing points in the grid CRS.
+        :return: (rows, columns, inside) arrays; rows and columns are 0 outside.
+        """
+        height, width = self.shape
+        columns = np.floor((x - self.grid.x_min) / self.grid.pixel_width)
+        rows = np.floor((self.grid.y_max - y) / self.grid.pixel_height)
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        return np.where(inside, rows, 0).astype(np.int64), np.where(inside, columns, 0).astype(np.int64), inside
+
+    def links(self):
+        """
+        Links between passable neighbouring cells, built for all cells at once.
+        :return: (sources, targets, weights) arrays of flat cell indices and times.
+        """
+        height, width = self.shape
+        index = np.arange(height * width).reshape(height, width)
+        widths, cell_height = self.cell_sizes()
+        sources, targets, weights = [], [], []
+        for row_step, column_step in NEIGHBOUR_STEPS:
+            from_rows, to_rows = slice(0, height - row_step), slice(row_step, height)
+            from_columns = slice(max(0, -column_step), width - max(0, column_step))
+            to_columns = slice(max(0, column_step), width - max(0, -column_step))
+            if row_step == 0:
+                length = widths[:, None]
+            elif column_step == 0:
+                length = cell_height
+            else:
+                length = np.hypot((widths[from_rows] + widths[to_rows]) / 2, cell_height)[:, None]
+            weight = length * (self.friction[from_rows, from_columns] + self.friction[to_rows, to_columns]) / 2
+            passable = np.isfinite(weight)
+            sources.append(index[from_rows, from_columns][passable])
+            targets.append(index[to_rows, to_columns][passable])
+            weights.append(weight[passable])
+        return np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
+
+    def dijkstra(self, row, column):
+        """
+        Travel times from one cell to every cell.
+        :return: float32 array of the grid's shape; inf where unreachable.
+        """
+        height, width = self.shape
+        source = row * width + column
+        if csgraph_dijkstra is not None:
+            sources, targets, weights = self.links()
+            matrix = coo_matrix((weights, (sources, targets)), shape=(height * width, height * width)).tocsr()
+            times = csgraph_dijkstra(matrix, directed=False, indices=source)
+            return times.reshape(height, width).astype(np.float32)
+
+        friction = self.friction.ravel().tolist()
+        widths, cell_height = self.cell_sizes()
+        widths = widths.tolist()
+        steps = [(row_step, column_step) for row_step in (-1, 0, 1) for column_step in (-1, 0, 1) if row_step or column_step]
+        times = [math.inf] * (height * width)
+        times[source] = 0.0
+        queue = [(0.0, source)]
+        while queue:
+            time, cell = heapq.heappop(queue)
+            if time > times[cell]:
+                continue # Stale entry
+            cell_row, cell_column = divmod(cell, width)
+            for row_step, column_step in steps:
+                neighbour_row, neighbour_column = cell_row + row_step, cell_column + column_step
+                if not (0 <= neighbour_row < height and 0 <= neighbour_column < width):
+                    continue
+                neighbour = neighbour_row * width + neighbour_column
+                if friction[neighbour] != friction[neighbour]:
+                    continue # NaN: impassable
+                if row_step == 0:
+                    length = widths[cell_row]
+                elif column_step == 0:
+                    length = cell_height
+                else:
+                    length = math.hypot((widths[cell_row] + widths[neighbour_row]) / 2, cell_height)
+                candidate = time + length * (friction[cell] + friction[neighbour]) / 2
+                if candidate < times[neighbour]:
+                    times[neighbour] = candidate
+                    heapq.heappush(queue, (candidate, neighbour))
+        return np.array(times, dtype=np.float32).reshape(height, width)
+
+
+class CostSurface:
+    """Accumulated travel time from one HQ over a FrictionGrid."""
+    def __init__(self, friction_grid, row, column, times):
+        """
+        Constructor.
+        :param row, column: Cell of the HQ.
+        :param times: Travel times from the HQ cell, in the friction's time unit.
+        """
+        self.friction_grid = friction_grid
+        self.row = row
+        self.column = column
+        self.times = times
+
+    def times_to(self, x, y, crs):
+        """
+        Travel times from the HQ to points in crs; inf for points outside the
+        raster or not reachable from the HQ.
+        """
+        x, y = geodesy.transform_xy(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), crs, self.friction_grid.crs)
+        rows, columns, inside = self.friction_grid.cells(x, y)
+        return np.where(inside, self.times[rows, columns], np.inf).astype(np.float64)
+
+
+_lock = threading.Lock()
+_grids = OrderedDict() # Raster fingerprint -> FrictionGrid
+_surfaces = OrderedDict() # (raster fingerprint, HQ row, HQ column) -> CostSurface
+
+
+def raster_fingerprint(layer):
+    """
+    Identifies the content of a friction raster: its file (size and
+    modification time) for file sources, otherwise the layer itself.
+    """
+    path = source_file(layer.source())
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    return (layer.id(), layer.source())
+
+
+def friction_grid(friction_layer):
+    """Cached FrictionGrid.from_layer(). :return: FrictionGrid."""
+    key = raster_fingerprint(friction_layer)
+    with _lock:
+        if key in _grids:
+            _grids.move_to_end(key)
+            return _grids[key]
+    grid = FrictionGrid.from_layer(friction_layer)
+    with _lock:
+        _grids[key] = grid
+        while len(_grids) > MAX_CACHED_GRIDS:
+            _grids.popitem(last=False)
+    return grid
+
+
+def cost_surface(friction_layer, hq_point, crs, feedback=None):
+    """
+    Travel time surface from the HQ over a friction raster, computed once
+    and then served from the cache for the same raster and HQ cell.
+    :param hq_point: QgsPointXY in crs.
+    :param crs: QgsCoordinateReferenceSystem of hq_point.
+    :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+    :return: CostSurface, or None.
+    """
+    grid = friction_grid(friction_layer)
+    hq_x, hq_y = geodesy.transform_xy(np.array([hq_point.x()]), np.array([hq_point.y()]), crs, grid.crs)
+    rows, columns, inside = grid.cells(hq_x, hq_y)
+    if not inside[0]:
+        raise ValueError(f"The HQ lies outside the friction raster '{friction_layer.name()}'.")
+    row, column = int(rows[0]), int(columns[0])
+    if not np.isfinite(grid.friction[row, column]):
+        raise ValueError(f"The HQ lies on a NoData cell of the friction raster '{friction_layer.name()}'.")
+    key = (raster_fingerprint(friction_layer), row, column)
+    with _lock:
+        if key in _surfaces:
+            _surfaces.move_to_end(key)
+            return _surfaces[key]
+
+    if feedback is not None and feedback.isCanceled():
+        return None
+    surface = CostSurface(grid, row, column, grid.dijkstra(row, column))
+    reachable = np.isfinite(surface.times).sum()
+    logger.info(f"Travel time surface from HQ: {reachable} of {surface.times.size} cells reachable.")
+    with _lock:
+        _surfaces[key] = surface
+        while len(_surfaces) > MAX_CACHED_SURFACES:
+            _surfaces.popitem(last=False)
+    return surface
+
+
+def clear_cache():
+    """Drops all cached friction grids and travel time surfaces."""
+    with _lock:
+        _grids.clear()
+        _surfaces.clear()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+Choice of field bases among candidate locations (towns, veterinary clinics)
+for a set of sampling points: the p-median problem, i.e. p bases minimizing
+the total distance from every point to its nearest base.
+
+The candidate-to-point distance matrix is computed once, block by block, and
+kept as float32. Bases are chosen greedily and then improved by vertex
+substitution (swapping a chosen base for another candidate while it lowers
+the total); both evaluate all candidates at once with NumPy. On request, a
+Lagrangian relaxation solved by subgradient optimization gives a lower bound
+on the optimal total, so the quality of the solution is known; it takes
+many passes over the matrix and costs far more than the solution itself.
+"""
+
+import numpy as np
+
+from ..utils import geodesy
+
+MAX_BLOCK_ELEMENTS = 2000000 # Matrix elements per NumPy block, to bound temporary memory
+LAGRANGIAN_ITERATIONS = 100
+IMPROVEMENT_EPSILON = 1e-6
+
+
+class PMedianSolution:
+    """Chosen bases and the assignment of the points to them."""
+    def __init__(self, bases, matrix):
+        """
+        :param bases: Row indices of the chosen candidates.
+        :param matrix: Candidate-to-point distance matrix.
+        """
+        self.bases = list(bases)
+        distances = matrix[self.bases]
+        self.assignment = np.argmin(distances, axis=0) # Index into bases for every point
+        self.distances = distances[self.assignment, np.arange(matrix.shape[1])].astype(np.float64)
+        self.total = float(self.distances.sum())
+        self.lower_bound = None
+
+    @property
+    def gap(self):
+        """Relative gap between the solution and the lower bound, if known."""
+        if self.lower_bound is None:
+            return None
+        return (self.total - self.lower_bound) / self.total if self.total > 0 else 0.0
+
+
+def distance_matrix(cx, cy, px, py, crs, ellipsoid=geodesy.DEFAULT_ELLIPSOID, feedback=None):
+    """
+    Distances in metres from every candidate (cx, cy) to every point (px, py), all in crs.
+    :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+    :return: float32 array of shape (candidates, points), or None.
+    """
+    matrix = np.empty((len(cx), len(px)), dtype=np.float32)
+    block = max(1, MAX_BLOCK_ELEMENTS // max(1, len(px)))
+    for start in range(0, len(cx), block):
+        if feedback is not None:
+            if feedback.isCanceled():
+                return None
+            feedback.setProgress(100 * start / len(cx))
+        rows = slice(start, start + block)
+        matrix[rows] = geodesy.distances_between(cx[rows, None], cy[rows, None], px[None, :], py[None, :], crs, ellipsoid)
+    return matrix
+
+
+def _totals(matrix, current):
+    """For every candidate, the total distance if it were added to bases giving current."""
+    totals = np.empty(matrix.shape[0])
+    block = max(1, MAX_BLOCK_ELEMENTS // max(1, matrix.shape[1]))
+    for start in range(0, matrix.shape[0], block):
+        totals[start:start + block] = np.minimum(matrix[start:start + block], current).sum(axis=1, dtype=np.float64)
+    return totals
+
+
+def greedy(matrix, p):
+    """Adds, p times, the candidate that lowers the total distance most. :return: Row indices."""
+    current = np.full(matrix.shape[1], np.inf, dtype=np.float32)
+    bases = []
+    for _ in range(min(p, matrix.shape[0])):
+        totals = _totals(matrix, current)
+        totals[bases] = np.inf
+        best = int(np.argmin(totals))
+        bases.append(best)
+        current = np.minimum(current, matrix[best])
+    return bases
+
+
+def interchange(matrix, bases, max_rounds=100):
+    """
+    Vertex substitution: replaces a base by the candidate that lowers the
+    total most, as long as one does. :return: Row indices.
+    """
+    bases = list(bases)
+    if len(bases) >= matrix.shape[0]:
+        return bases
+    total = PMedianSolution(bases, matrix).total
+    for _ in range(max_rounds):
+        improved = False
+        for position in range(len(bases)):
+            others = bases[:position] + bases[position + 1:]
+            without = matrix[others].min(axis=0) if others else np.full(matrix.shape[1], np.inf, dtype=np.float32)
+            totals = _totals(matrix, without)
+            totals[bases] = np.inf
+            best = int(np.argmin(totals))
+            if totals[best] < total - IMPROVEMENT_EPSILON * max(1.0, total):
+                bases[position] = best
+                total = totals[best]
+                improved = True
+        if not improved:
+            break
+    return bases
+
+
+def lagrangian_bound(matrix, p, upper_bound, iterations=LAGRANGIAN_ITERATIONS):
+    """
+    Lower bound on the optimal p-median total from the Lagrangian relaxation
+    of the assignment constraints, maximized by subgradient steps.
+    :param upper_bound: Total of a known solution, for the step size.
+    """
+    p = min(p, matrix.shape[0])
+    kth = min(p, matrix.shape[0] - 1) # Start at each point's (p + 1)-th nearest candidate distance
+    multipliers = np.partition(matrix, kth, axis=0)[kth].astype(np.float64)
+    best = 0.0
+    theta, stalled = 2.0, 0
+    block = max(1, MAX_BLOCK_ELEMENTS // max(1, matrix.shape[1]))
+    for _ in range(iterations):
+        reduced = np.empty(matrix.shape[0])
+        for start in range(0, matrix.shape[0], block):
+            reduced[start:start + block] = np.minimum(matrix[start:start + block] - multipliers, 0.0).sum(axis=1)
+        opened = np.argpartition(reduced, p - 1)[:p]
+        bound = multipliers.sum() + reduced[opened].sum()
+        if bound > best + IMPROVEMENT_EPSILON:
+            best, stalled = bound, 0
+        else:
+            stalled += 1
+            if stalled >= 5:
+                theta, stalled = theta / 2, 0
+        subgradient = 1.0 - (matrix[opened] < multipliers).sum(axis=0)
+        norm = float(subgradient @ subgradient)
+        if norm == 0 or upper_bound - bound <= IMPROVEMENT_EPSILON * max(1.0, upper_bound):
+            break # Every point is assigned exactly once: the bound is tight
+        multipliers = np.maximum(multipliers + theta * (upper_bound - bound) / norm * subgradient, 0.0)
+    return min(best, upper_bound)
+
+
+def solve(matrix, p, lower_bound=False):
+    """
+    Greedy start, vertex substitution and, optionally, a Lagrangian lower bound.
+    :return: PMedianSolution.
+    """
+    solution = PMedianSolution(interchange(matrix, greedy(matrix, p)), matrix)
+    if lower_bound:
+        solution.lower_bound = lagrangian_bound(matrix, p, solution.total)
+    return solution
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent, content-addressed cache for preprocessed risk factor rasters.
+
+Entries are GeoTIFFs named after a SHA-256 key built from the factor source
+(path plus mtime/size, or a hash of its content), the target grid and the
+correlation direction. Re-running an analysis with different weights finds
+every factor in the cache and skips proximity, normalization and warping.
+
+The cache also records the value range (min/max) of source rasters, keyed
+by their fingerprint, so an unchanged raster is not read again just to
+find its range and an edited one is.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from osgeo import gdal
+from qgis.core import QgsApplication
+from ..utils import logger
+from ..utils.raster_engine import gdal_exceptions
+
+DEFAULT_MAX_SIZE_MB = 2048
+RANGE_SUFFIX = '.range.json' # Value range records, a few bytes each and not counted in the size limit
+
+# How a source file is fingerprinted
+FINGERPRINT_MTIME = 'mtime'  # path, size and modification time (cheap)
+FINGERPRINT_HASH = 'hash'    # SHA-256 of the file content (robust to touch/copy)
+
+
+def default_cache_dir():
+    """Cache directory inside the active QGIS profile."""
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), 'ethiorisksurv_toolbox', 'factor_cache')
+
+
+def source_file(source):
+    """Strips OGR/GDAL layer options ('path|layername=...') from a layer source."""
+    return source.split('|')[0]
+
+
+class FactorCache:
+    """
+    Size-bounded on-disk cache of normalized (and inverted) factor rasters
+    with least-recently-used eviction.
+    """
+    def __init__(self, cache_dir=None, max_size_mb=DEFAULT_MAX_SIZE_MB, fingerprint=FINGERPRINT_MTIME):
+        """
+        Constructor.
+        :param cache_dir: Directory holding the cached rasters; created if missing.
+                          Defaults to default_cache_dir().
+        :param max_size_mb: Total size above which the least recently used entries are evicted.
+        :param fingerprint: FINGERPRINT_MTIME or FINGERPRINT_HASH.
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def source_fingerprint(self, source):
+        """
+        Fingerprint of a layer source, or None if the source is not a local
+        file (memory or database layers cannot be cached).
+        """
+        path = source_file(source)
+        if not os.path.isfile(path):
+            return None
+        if self.fingerprint == FINGERPRINT_HASH:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            return {'source': source, 'sha256': digest.hexdigest()}
+        stat = os.stat(path)
+        return {'source': os.path.abspath(path) + source[len(path):], 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def key(self, source, extent, resolution, crs_wkt, invert, stage='normalized'):
+        """
+        Cache key for a preprocessed factor.
+        :param source: Layer source string of the original factor.
+        :param extent: (xmin, ymin, xmax, ymax) of the target grid.
+        :return: Hex digest, or None if the source cannot be fingerprinted.
+        """
+        fingerprint = self.source_fingerprint(source)
+        if fingerprint is None:
+            return None
+        material = {
+            'fingerprint': fingerprint,
+            'extent': [round(v, 6) for v in extent],
+            'resolution': resolution,
+            'crs': crs_wkt,
+            'invert': bool(invert),
+            'stage': stage
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        """Path where the raster for a key is (or will be) stored."""
+        return os.path.join(self.cache_dir, f"{key}.tif")
+
+    def staging_path(self, key):
+        """
+        Path to write a new entry to before commit(); readers never see a
+        partially written raster.
+        """
+        return self.path_for(key) + '.part'
+
+    def get(self, key):
+        """
+        Returns the cached raster path for a key and marks it as recently used,
+        or None on a cache miss.
+        """
+        if key is None:
+            return None
+        path = self.path_for(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            os.utime(path, None)
+        logger.info(f"Factor cache hit: {key[:12]}")
+        return path
+
+    def put(self, key, raster_path):
+        """
+        Copies a raster into the cache and evicts old entries if the cache
+        grew beyond its size limit.
+        :return: Path of the cached copy.
+        """
+        cached_path = self.path_for(key)
+        if raster_path.startswith('/vsimem/'):
+            # In-memory intermediates are not visible to shutil
+            with gdal_exceptions():
+                gdal.Translate(cached_path, raster_path, format='GTiff')
+        elif os.path.abspath(raster_path) != os.path.abspath(cached_path):
+            shutil.copyfile(raster_path, cached_path)
+        self.commit(key)
+        return cached_path
+
+    def commit(self, key):
+        """
+        Registers a raster written to staging_path(key) (or directly to
+        path_for(key)) and enforces the size limit.
+        """
+        with self._lock:
+            if os.path.exists(self.staging_path(key)):
+                os.replace(self.staging_path(key), self.path_for(key))
+            os.utime(self.path_for(key), None)
+            self._evict(keep=os.path.basename(self.path_for(key)))
+
+    def get_min_max(self, source, band=1):
+        """
+        Value range recorded by put_min_max() for the current content of a
+        raster, or None if it is unknown (or the raster changed since).
+        """
+        path = self._range_path(source, band)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                values = json.load(f)
+            return float(values['min']), float(values['max'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def put_min_max(self, source, band, min_val, max_val):
+        """Records the value range of a raster for its current fingerprint."""
+        path = self._range_path(source, band)
+        if path is None:
+            return
+        staging_path = f"{path}.{os.getpid()}.part"
+        with self._lock:
+            with open(staging_path, 'w', encoding='utf-8') as f:
+                json.dump({'min': min_val, 'max': max_val}, f)
+            os.replace(staging_path, path)
+
+    def _range_path(self, source, band):
+        """Path of the value range record of a raster, or None if it cannot be fingerprinted."""
+        fingerprint = self.source_fingerprint(source)
+        if fingerprint is None:
+            return None
+        material = {'fingerprint': fingerprint, 'band': band, 'stage': 'min_max'}
+        key = hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}{RANGE_SUFFIX}")
+
+    def clear(self):
+        """Removes every cached raster and value range."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.tif') or name.endswith(RANGE_SUFFIX):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def size_bytes(self):
+        """Total size of the cached rasters."""
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.tif'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+        return entries
+
+    def _evict(self, keep=None):
+        """
+        Deletes the least recently used entries until the cache fits its size
+        limit. The entry named keep (the one just added) is never evicted.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if total <= self.max_size_bytes:
+                break
+            if name == keep:
+                continue
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            logger.info(f"Factor cache evicted {name}")
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized distances for the cost evaluation. Point coordinates are read
+from a layer once into NumPy arrays, transformed in bulk, and measured on the
+ellipsoid in a single call instead of one QgsDistanceArea.measureLine per point.
+
+Geodesic distances use pyproj's Geod.inv (GeographicLib, the algorithm
+behind QgsDistanceArea) when pyproj is installed, and a NumPy implementation
+of Vincenty's inverse formula otherwise; both agree with QgsDistanceArea to
+better than GEODESIC_TOLERANCE (relative).
+"""
+
+import numpy as np
+from osgeo import osr
+from qgis.core import QgsFeatureRequest, QgsEllipsoidUtils, QgsUnitTypes
+
+try:
+    from pyproj import Geod
+except ImportError:
+    Geod = None # pyproj is optional; the NumPy Vincenty implementation is used instead
+
+ELLIPSOID_NONE = 'NONE'
+DEFAULT_ELLIPSOID = 'WGS84' # Used for geographic layers when no ellipsoid is set
+GEODESIC_TOLERANCE = 1e-6 # Relative agreement with QgsDistanceArea
+
+METHOD_AUTO = 'auto'
+METHOD_PYPROJ = 'pyproj'
+METHOD_VINCENTY = 'vincenty'
+
+MEAN_EARTH_RADIUS = 6371008.8 # Metres, for the haversine fallback
+
+
+def layer_xy(layer, request=None, feedback=None):
+    """
+    Coordinates of a point layer, in the layer CRS, read in a single pass.
+    Multi-part geometries are represented by their centroid.
+    :param feedback: Optional QgsFeedback; reading stops early once it is canceled.
+    :return: (x, y) float64 arrays, one value per feature with a geometry.
+    """
+    request = QgsFeatureRequest(request) if request is not None else QgsFeatureRequest()
+    request.setNoAttributes()
+    if feedback is not None:
+        request.setFeedback(feedback)
+    xs, ys = [], []
+    for feature in layer.getFeatures(request):
+        geometry = feature.geometry()
+        if geometry.isEmpty():
+            continue
+        point = geometry.centroid().asPoint() if geometry.isMultipart() else geometry.asPoint()
+        xs.append(point.x())
+        ys.append(point.y())
+    return np.array(xs, dtype=np.float64), np.array(ys, dtype=np.float64)
+
+
+def ellipsoid_axes(acronym):
+    """
+    Semi-major and semi-minor axes of a QGIS ellipsoid ('WGS84', 'EPSG:7030', ...).
+    :return: (a, b) in metres, or None if the ellipsoid is unknown or 'NONE'.
+    """
+    if not acronym or acronym.upper() == ELLIPSOID_NONE:
+        return None
+    parameters = QgsEllipsoidUtils.ellipsoidParameters(acronym)
+    if not parameters.valid:
+        return None
+    return parameters.semiMajor, parameters.semiMinor
+
+
+def to_geographic(x, y, crs, axes):
+    """
+    Transforms coordinates from crs to longitude/latitude on the ellipsoid with
+    the given axes, as QgsDistanceArea does before measuring.
+    :return: (lon, lat) arrays in degrees.
+    """
+    if crs.isGeographic():
+        return x, y
+    target = osr.SpatialReference()
+    target.ImportFromProj4(f"+proj=longlat +a={axes[0]!r} +b={axes[1]!r} +no_defs")
+    return _transform(x, y, _srs(crs), target)
+
+
+def transform_xy(x, y, source_crs, target_crs):
+    """
+    Transforms coordinate arrays between two QgsCoordinateReferenceSystems in
+    a single call. :return: (x, y) arrays.
+    """
+    if source_crs == target_crs:
+        return x, y
+    return _transform(x, y, _srs(source_crs), _srs(target_crs))
+
+
+def _srs(crs):
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(crs.toWkt())
+    return srs
+
+
+def _transform(x, y, source, target):
+    for srs in (source, target):
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    if len(x) == 0:
+        return x, y
+    transformed = np.array(osr.CoordinateTransformation(source, target).TransformPoints(np.column_stack((x, y)).tolist()))
+    return transformed[:, 0], transformed[:, 1]
+
+
+def geodesic_distance(lon1, lat1, lon2, lat2, axes, method=METHOD_AUTO):
+    """
+    Geodesic distances between arrays (or scalars) of points, in metres.
+    :param axes: (a, b) of the ellipsoid.
+    :param method: METHOD_PYPROJ, METHOD_VINCENTY or METHOD_AUTO (pyproj if installed).
+    """
+    lon1, lat1, lon2, lat2 = np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in (lon1, lat1, lon2, lat2)))
+    if method == METHOD_PYPROJ or (method == METHOD_AUTO and Geod is not None):
+        if Geod is None:
+            raise ImportError("pyproj is not installed")
+        _, _, distances = Geod(a=axes[0], b=axes[1]).inv(lon1.ravel(), lat1.ravel(), lon2.ravel(), lat2.ravel())
+        return np.asarray(distances, dtype=np.float64).reshape(lon1.shape)
+    return vincenty_distance(lon1, lat1, lon2, lat2, axes)
+
+
+def vincenty_distance(lon1, lat1, lon2, lat2, axes, tolerance=1e-12, max_iterations=200):
+    """
+    Vincenty's inverse formula on arrays (accurate to about 0.1 mm). The rare
+    nearly antipodal pairs for which it does not converge fall back to the
+    haversine distance on a sphere of MEAN_EARTH_RADIUS.
+    """
+    a, b = axes
+    f = (a - b) / a
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    lam = L
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cos_U2 * sin_lam) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lam) ** 2)
+            cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_U1 * cos_U2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_U1 * sin_U2 / cos2_alpha) # Equatorial lines
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous = lam
+            lam = L + (1 - C) * f * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - previous) < tolerance
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (a * a - b * b) / (b * b)
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                                       - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distances = b * A * (sigma - delta_sigma)
+
+    if not converged.all():
+        fallback = ~converged
+        distances = np.where(fallback, haversine_distance(lon1, lat1, lon2, lat2), distances)
+    return distances
+
+
+def haversine_distance(lon1, lat1, lon2, lat2, radius=MEAN_EARTH_RADIUS):
+    """Great-circle distances on a sphere, in metres."""
+    lon1, lat1, lon2, lat2 = (np.radians(value) for value in (lon1, lat1, lon2, lat2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def distances_from_point(x, y, origin, crs, ellipsoid=DEFAULT_ELLIPSOID, method=METHOD_AUTO):
+    """
+    Distances in metres from origin to every (x, y), all in crs.
+
+    With an ellipsoid, distances are geodesic, as QgsDistanceArea measures
+    them with that ellipsoid and crs as source CRS. Without one ('NONE'),
+    projected coordinates are measured in the plane, converted to metres;
+    geographic coordinates always use an ellipsoid (DEFAULT_ELLIPSOID), since
+    planar distances in degrees are meaningless for travel.
+    :param origin: QgsPointXY, e.g. the HQ.
+    :return: float64 array of distances.
+    """
+    return distances_between(np.array([origin.x()]), np.array([origin.y()]), x, y, crs, ellipsoid, method)
+
+
+def distances_between(x1, y1, x2, y2, crs, ellipsoid=DEFAULT_ELLIPSOID, method=METHOD_AUTO):
+    """
+    Element-wise distances in metres between (x1, y1) and (x2, y2), all in
+    crs; the arrays broadcast against each other. Measured as in
+    distances_from_point.
+    :return: float64 array of distances.
+    """
+    x1, y1, x2, y2 = np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in (x1, y1, x2, y2)))
+    axes = ellipsoid_axes(ellipsoid)
+    if axes is None and not crs.isGeographic():
+        factor = QgsUnitTypes.fromUnitToUnitFactor(crs.mapUnits(), QgsUnitTypes.DistanceMeters)
+        return np.hypot(x2 - x1, y2 - y1) * factor
+    axes = axes or ellipsoid_axes(DEFAULT_ELLIPSOID)
+    lon1, lat1 = to_geographic(x1.ravel(), y1.ravel(), crs, axes)
+    lon2, lat2 = to_geographic(x2.ravel(), y2.ravel(), crs, axes)
+    return geodesic_distance(lon1, lat1, lon2, lat2, axes, method).reshape(x1.shape)
@@ -2,8 +2,11 @@
 
 from qgis.core import QgsProcessing, QgsProcessingAlgorithm, QgsProcessingParameterRasterLayer, QgsProcessingParameterNumber, QgsProcessingParameterRasterDestination
 from qgis.analysis import QgsRasterCalculator, QgsRasterCalculatorEntry
-from qgis.core import QgsVectorLayer, QgsProject, QgsMessageLog, Qgis
+from osgeo import gdal
+from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsRasterBandStats, QgsProject, QgsMessageLog, Qgis, QgsFeatureRequest, QgsGeometry
 from ..utils import logger
+from ..utils import raster_engine
+from ..utils.output_profile import replace_raster
 
 # --- NEW: Define our known resource layers ---
 # This dictionary maps a user-friendly name to its resource alias.
@@ -53,23 +56,94 @@ def get_layer_by_name(layer_name):
     logger.warning(f"Layer '{layer_name}' not found in project or base layers.")
     return None
 
+def detach_layer(layer):
+    """
+    A copy of a layer that is not registered in any project, safe to read
+    from a background task: vector layers are materialized in memory, other
+    layers are reopened from their source.
+    """
+    if layer is None:
+        return None
+    if isinstance(layer, QgsVectorLayer):
+        detached = layer.materialize(QgsFeatureRequest())
+        detached.setName(layer.name())
+        return detached
+    return QgsRasterLayer(layer.source(), layer.name(), layer.providerType())
+
+def interior_point(layer):
+    """
+    A point inside the polygons of a layer, e.g. a default HQ for a study
+    area: the extent centre if it lies inside, which it need not for a
+    concave or multi-part area, otherwise a point on the surface of the
+    largest polygon.
+    :return: QgsPointXY in the layer CRS, or None if the layer has no geometries.
+    """
+    center = layer.extent().center()
+    largest = None
+    for feature in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        geometry = feature.geometry()
+        if geometry.isNull() or geometry.isEmpty():
+            continue
+        if geometry.contains(QgsGeometry.fromPointXY(center)):
+            return center
+        if largest is None or geometry.area() > largest.area():
+            largest = geometry
+    return largest.pointOnSurface().asPoint() if largest is not None else None
+
 # ... (The existing normalize_raster function can remain here) ...
-def normalize_raster(input_layer, output_path):
+def raster_min_max(input_layer, mode=raster_engine.MINMAX_EXACT, cache=None):
+    """
+    Gets only the minimum and maximum of band 1 of a raster layer.
+    GDAL-backed layers use a single streaming min/max pass, or the range
+    recorded in the factor cache; other providers fall back to QGIS
+    statistics restricted to Min/Max.
+    :param input_layer: QgsRasterLayer.
+    :param mode: One of the raster_engine.MINMAX_* modes.
+    :param cache: Optional FactorCache for raster_engine.MINMAX_CACHED.
+    :return: (min, max) tuple, (None, None) if there is no valid data.
     """
-    Normalizes a raster layer to a 0-1 scale.
+    if input_layer.providerType() == 'gdal':
+        return raster_engine.band_min_max(input_layer.source(), mode=mode, cache=cache)
+    stats = input_layer.dataProvider().bandStatistics(1, QgsRasterBandStats.Min | QgsRasterBandStats.Max)
+    return stats.minimumValue, stats.maximumValue
+
+# Output formats supported by normalize_raster
+NORMALIZED_GTIFF = 'GTiff'  # Computed by QgsRasterCalculator and written out
+NORMALIZED_VRT = 'VRT'      # Virtual raster: a linear rescale applied lazily when read, nothing written
+
+def normalize_raster(input_layer, output_path, minmax_mode=raster_engine.MINMAX_EXACT, invert=False, output_format=NORMALIZED_GTIFF, profile=None, cache=None):
+    """
+    Normalizes a raster layer to a 0-1 scale, optionally inverted, in a single pass:
+    (x - min) / (max - min), or (max - x) / (max - min) when invert is True.
     :param input_layer: QgsRasterLayer to normalize.
-    :param output_path: Path for the normalized output raster.
+    :param output_path: Path for the normalized output raster. A /vsimem/ path keeps it in memory.
+    :param minmax_mode: How the value range is obtained (see raster_min_max).
+    :param invert: True for 'Lower values = Higher Risk' factors.
+    :param output_format: NORMALIZED_GTIFF or NORMALIZED_VRT (GDAL layers only, falls back to GTiff).
+    :param profile: Optional utils.output_profile.OutputProfile for the GeoTIFF output.
+    :param cache: Optional FactorCache for the value range (see raster_min_max).
     :return: QgsRasterLayer object of the normalized raster, or None on failure.
     """
-    # Get raster statistics
-    stats = input_layer.dataProvider().bandStatistics(1, QgsRasterBandStats.All)
-    min_val = stats.minimumValue
-    max_val = stats.maximumValue
+    # Get the value range; the calculator below is then the only full read
+    min_val, max_val = raster_min_max(input_layer, minmax_mode, cache)
 
     if min_val is None or max_val is None or min_val == max_val:
         # Cannot normalize if there's no data or all values are the same
         return None
 
+    if output_format == NORMALIZED_VRT and input_layer.providerType() == 'gdal':
+        # Normalization is linear, so a VRT scale/offset expresses it without writing pixels
+        if invert:
+            scale = [min_val, max_val, 1.0, 0.0]
+        else:
+            scale = [min_val, max_val, 0.0, 1.0]
+        dataset = gdal.Translate(output_path, input_layer.source(), format='VRT', bandList=[1],
+                                 outputType=gdal.GDT_Float32, scaleParams=[scale])
+        if dataset is None:
+            return None
+        dataset = None
+        return QgsRasterLayer(output_path, 'normalized_raster')
+
     # Setup raster calculator entry
     entry = QgsRasterCalculatorEntry()
     entry.ref = 'input@1'
@@ -77,13 +151,19 @@ def normalize_raster(input_layer, output_path):
     entry.bandNumber = 1
     entries = [entry]
 
-    # Formula: (layer - min) / (max - min)
-    formula = f"(\"{entry.ref}\" - {min_val}) / ({max_val} - {min_val})"
+    # Formula: (layer - min) / (max - min), or (max - layer) / (max - min)
+    if invert:
+        formula = f"(({max_val}) - \"{entry.ref}\") / (({max_val}) - ({min_val}))"
+    else:
+        formula = f"(\"{entry.ref}\" - ({min_val})) / (({max_val}) - ({min_val}))"
     
+    # QgsRasterCalculator only writes default GeoTIFFs; a profile is applied afterwards
+    calc_path = output_path if profile is None or profile.is_plain else f"{output_path}.raw.tif"
+
     # Setup calculator
     calc = QgsRasterCalculator(
         formula,
-        output_path,
+        calc_path,
         'GTiff',
         input_layer.extent(),
         input_layer.width(),
@@ -94,6 +174,8 @@ def normalize_raster(input_layer, output_path):
     # Run calculation
     if calc.processCalculation() != QgsRasterCalculator.NoError:
         return None
-    
+    if calc_path != output_path:
+        replace_raster(calc_path, output_path, profile)
+
     # Return the new layer object
     return QgsRasterLayer(output_path, 'normalized_raster')
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+Storage backends for the intermediate rasters of a risk analysis
+(proximity, normalized and inverted factors, study-area mask).
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+from osgeo import gdal
+
+from ..utils import logger
+
+STORAGE_PROJECT = 'project'  # GeoTIFFs next to the project file, kept after the run (legacy behaviour)
+STORAGE_SCRATCH = 'scratch'  # Local temporary directory, removed by cleanup()
+STORAGE_MEMORY = 'memory'    # GDAL /vsimem/ files, falling back to scratch when over the memory budget
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+
+class IntermediateStore:
+    """
+    Hands out paths for intermediate rasters and removes them afterwards.
+
+    Usable as a context manager; cleanup() runs on exit. The project
+    backend never deletes anything. Safe to use from the threads that
+    prepare factors concurrently.
+    """
+    def __init__(self, backend=STORAGE_PROJECT, project_home=None, scratch_dir=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        """
+        Constructor.
+        :param backend: STORAGE_PROJECT, STORAGE_SCRATCH or STORAGE_MEMORY.
+        :param project_home: Directory used by the project backend.
+        :param scratch_dir: Parent directory for scratch files; defaults to the system temp dir.
+        :param memory_budget_mb: Maximum estimated size of the /vsimem/ files held at once.
+        """
+        self.backend = backend
+        self.project_home = project_home or os.getcwd()
+        self.scratch_parent = scratch_dir
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.memory_used_bytes = 0
+        self._scratch_dir = None
+        self._vsimem_dir = f"/vsimem/ethiorisksurv_{uuid.uuid4().hex}"
+        self._memory_files = []
+        self._lock = threading.Lock() # Guards the memory budget and the scratch directory
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
+
+    def path(self, prefix, index, name, extension='tif', estimated_bytes=0, in_process=True):
+        """
+        Returns a path for a new intermediate raster.
+        :param prefix: Stage name, e.g. 'temp', 'norm' or 'inv'.
+        :param index: Factor index, keeps names unique across factors.
+        :param name: Layer name.
+        :param estimated_bytes: Expected size, counted against the memory budget.
+        :param in_process: False when the file is written or read by an external
+                           GDAL process (e.g. gdal:proximity), which cannot see /vsimem/.
+        """
+        filename = f"{prefix}_{index}_{name.replace(' ', '_')}.{extension}"
+        if self.backend == STORAGE_PROJECT:
+            return os.path.join(self.project_home, filename)
+
+        if self.backend == STORAGE_MEMORY and in_process:
+            with self._lock:
+                if self.memory_used_bytes + estimated_bytes <= self.memory_budget_bytes:
+                    self.memory_used_bytes += estimated_bytes
+                    path = f"{self._vsimem_dir}/{filename}"
+                    self._memory_files.append(path)
+                    return path
+            logger.info(f"Memory budget exceeded, writing {filename} to scratch disk.")
+
+        return os.path.join(self.scratch_dir(), filename)
+
+    def scratch_dir(self):
+        """Local scratch directory, created on first use."""
+        with self._lock:
+            if self._scratch_dir is None:
+                self._scratch_dir = tempfile.mkdtemp(prefix='ethiorisksurv_', dir=self.scratch_parent)
+            return self._scratch_dir
+
+    def cleanup(self):
+        """Deletes every scratch and in-memory intermediate handed out so far."""
+        with self._lock:
+            if self._memory_files:
+                for path in gdal.ReadDirRecursive(self._vsimem_dir) or []:
+                    gdal.Unlink(f"{self._vsimem_dir}/{path}")
+                self._memory_files = []
+                self.memory_used_bytes = 0
+            if self._scratch_dir is not None:
+                shutil.rmtree(self._scratch_dir, ignore_errors=True)
+                self._scratch_dir = None
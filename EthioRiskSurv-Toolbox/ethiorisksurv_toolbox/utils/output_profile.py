@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+GeoTIFF output profiles for the rasters written by the toolbox.
+
+A profile bundles the layout (tiling, compression, predictor), the pixel
+encoding (Float32, or UInt16 scaled back to the value range through the
+band scale/offset) and the overviews of a raster, optionally as a
+Cloud Optimized GeoTIFF.
+"""
+
+import numpy as np
+from osgeo import gdal
+
+from ..utils import logger
+from ..utils import overviews
+from ..utils.raster_engine import RasterGrid, RISK_NODATA, read_window, gdal_exceptions
+
+# Compression codecs
+COMPRESS_NONE = 'NONE'
+COMPRESS_DEFLATE = 'DEFLATE'
+COMPRESS_ZSTD = 'ZSTD'
+COMPRESS_LZW = 'LZW'
+
+# Pixel encodings
+DATA_FLOAT32 = 'Float32'
+DATA_UINT16 = 'UInt16'  # value range scaled to 0-65534, 65535 is NoData
+
+UINT16_NODATA = 65535
+UINT16_MAX_VALUE = 65534
+
+DEFAULT_BLOCK_SIZE = 512
+
+
+class OutputProfile:
+    """
+    How a raster is laid out and encoded on disk.
+    """
+    def __init__(self, compression=COMPRESS_DEFLATE, level=None, predictor=True, tiled=True, block_size=DEFAULT_BLOCK_SIZE,
+                 data_type=DATA_FLOAT32, value_range=(0.0, 1.0), overviews=True, overview_resampling='average', cog=False):
+        """
+        Constructor.
+        :param compression: COMPRESS_NONE, COMPRESS_DEFLATE, COMPRESS_ZSTD or COMPRESS_LZW.
+        :param level: Codec level (ZLEVEL / ZSTD_LEVEL), None for the GDAL default.
+        :param predictor: Use the floating point (Float32) or horizontal (UInt16) predictor.
+        :param tiled: Write block_size x block_size tiles instead of strips.
+        :param block_size: Tile size in pixels, a multiple of 16.
+        :param data_type: DATA_FLOAT32 or DATA_UINT16.
+        :param value_range: (min, max) mapped onto 0-65534 by DATA_UINT16.
+        :param overviews: Build internal overviews before the file is closed.
+        :param overview_resampling: GDAL overview resampling method.
+        :param cog: Write a Cloud Optimized GeoTIFF (always tiled, overviews per the flag above).
+        """
+        self.compression = compression
+        self.level = level
+        self.predictor = predictor
+        self.tiled = tiled
+        self.block_size = block_size
+        self.data_type = data_type
+        self.value_range = value_range
+        self.overviews = overviews
+        self.overview_resampling = overview_resampling
+        self.cog = cog
+
+    @classmethod
+    def plain(cls):
+        """Striped, uncompressed Float32 GeoTIFF without overviews (GDAL defaults)."""
+        return cls(compression=COMPRESS_NONE, predictor=False, tiled=False, overviews=False)
+
+    def intermediate(self):
+        """
+        Same layout and codec, for intermediate rasters that are read back by
+        the toolbox: always Float32, no overviews, no COG.
+        """
+        return OutputProfile(self.compression, self.level, self.predictor, self.tiled, self.block_size,
+                             DATA_FLOAT32, self.value_range, overviews=False, cog=False)
+
+    @property
+    def is_plain(self):
+        """True when the profile matches what GDAL writes by default."""
+        return (self.compression == COMPRESS_NONE and not self.tiled and self.data_type == DATA_FLOAT32
+                and not self.overviews and not self.cog)
+
+    @property
+    def gdal_type(self):
+        return gdal.GDT_UInt16 if self.data_type == DATA_UINT16 else gdal.GDT_Float32
+
+    @property
+    def scale(self):
+        """Band scale of the UInt16 encoding."""
+        min_val, max_val = self.value_range
+        return (max_val - min_val) / UINT16_MAX_VALUE
+
+    def nodata_for(self, nodata):
+        """NoData value actually written for a requested float NoData value."""
+        return UINT16_NODATA if self.data_type == DATA_UINT16 else nodata
+
+    def creation_options(self):
+        """GTiff creation options of the profile."""
+        options = ['BIGTIFF=IF_SAFER']
+        if self.tiled:
+            options += ['TILED=YES', f'BLOCKXSIZE={self.block_size}', f'BLOCKYSIZE={self.block_size}']
+        if self.compression != COMPRESS_NONE:
+            options.append(f'COMPRESS={self.compression}')
+            if self.predictor:
+                options.append('PREDICTOR=2' if self.data_type == DATA_UINT16 else 'PREDICTOR=3')
+            if self.level is not None:
+                options.append(f'{"ZSTD_LEVEL" if self.compression == COMPRESS_ZSTD else "ZLEVEL"}={self.level}')
+        return options
+
+    def cog_options(self):
+        """COG driver creation options of the profile."""
+        options = ['BIGTIFF=IF_SAFER', f'BLOCKSIZE={self.block_size}', f'COMPRESS={self.compression}',
+                   f'OVERVIEWS={"AUTO" if self.overviews else "NONE"}',
+                   f'OVERVIEW_RESAMPLING={self.overview_resampling.upper()}']
+        if self.compression != COMPRESS_NONE and self.predictor:
+            options.append('PREDICTOR=YES')
+        if self.compression != COMPRESS_NONE and self.level is not None:
+            options.append(f'LEVEL={self.level}')
+        return options
+
+    def overview_levels(self, width, height):
+        """Decimation factors 2, 4, 8... until the overview fits in one tile."""
+        return overviews.overview_levels(width, height, self.block_size // 2)
+
+    def encode(self, array, nodata=RISK_NODATA):
+        """Converts a float array (NaN = NoData) to the profile's pixel type."""
+        missing = np.isnan(array)
+        if self.data_type == DATA_UINT16:
+            min_val = self.value_range[0]
+            scaled = np.clip(np.rint((array - min_val) / self.scale), 0, UINT16_MAX_VALUE)
+            return np.where(missing, UINT16_NODATA, scaled).astype(np.uint16)
+        return np.where(missing, nodata, array).astype(np.float32)
+
+    @gdal_exceptions()
+    def create(self, path, grid, nodata=RISK_NODATA):
+        """
+        Creates a dataset that windows can be written into; close it with
+        finalize(). A COG is staged in a temporary GeoTIFF next to path.
+        """
+        target = f"{path}.tmp.tif" if self.cog else path
+        options = OutputProfile(COMPRESS_NONE, tiled=True, block_size=self.block_size).creation_options() if self.cog \
+            else self.creation_options()
+        dataset = grid.create_dataset(target, driver_name='GTiff', data_type=self.gdal_type,
+                                      nodata=self.nodata_for(nodata), options=options)
+        if self.data_type == DATA_UINT16:
+            band = dataset.GetRasterBand(1)
+            band.SetScale(self.scale)
+            band.SetOffset(self.value_range[0])
+        return dataset
+
+    @gdal_exceptions()
+    def finalize(self, dataset, path):
+        """
+        Builds the overviews while the dataset is still open (or lets the COG
+        driver do it) and closes it.
+        :return: path
+        """
+        if self.cog:
+            staging_path = dataset.GetDescription()
+            dataset.FlushCache()
+            cog = gdal.GetDriverByName('COG').CreateCopy(path, dataset, options=self.cog_options())
+            cog = None
+            dataset = None
+            gdal.GetDriverByName('GTiff').Delete(staging_path)
+            return path
+        if self.overviews:
+            levels = self.overview_levels(dataset.RasterXSize, dataset.RasterYSize)
+            if levels:
+                dataset.BuildOverviews(self.overview_resampling.upper(), levels)
+        dataset.FlushCache()
+        dataset = None
+        return path
+
+    @gdal_exceptions()
+    def discard(self, path):
+        """
+        Deletes the file(s) of a dataset from create() that will not be
+        finalized (close it first), including a COG left partly written.
+        """
+        for target in ([f"{path}.tmp.tif", path] if self.cog else [path]):
+            if gdal.VSIStatL(target) is not None:
+                gdal.GetDriverByName('GTiff').Delete(target)
+
+    @gdal_exceptions()
+    def write(self, path, array, grid, nodata=RISK_NODATA):
+        """Writes a whole float array (NaN = NoData) with this profile."""
+        dataset = self.create(path, grid, nodata)
+        dataset.GetRasterBand(1).WriteArray(self.encode(array, nodata))
+        self.finalize(dataset, path)
+        logger.info(f"Wrote raster {path} ({grid.width} x {grid.height}, {self.describe()})")
+        return path
+
+    @gdal_exceptions()
+    def copy(self, source_path, path, nodata=RISK_NODATA):
+        """
+        Rewrites band 1 of an existing raster with this profile, one tile
+        row at a time.
+        """
+        source = gdal.Open(source_path)
+        grid = RasterGrid.from_dataset(source)
+        dataset = self.create(path, grid, nodata)
+        band = dataset.GetRasterBand(1)
+        for window in grid.iter_windows(self.block_size):
+            band.WriteArray(self.encode(read_window(source, window), nodata), window[0], window[1])
+        source = None
+        self.finalize(dataset, path)
+        logger.info(f"Wrote raster {path} ({grid.width} x {grid.height}, {self.describe()})")
+        return path
+
+    def describe(self):
+        """Short human readable summary, e.g. 'COG DEFLATE UInt16'."""
+        return ' '.join(filter(None, ['COG' if self.cog else ('tiled' if self.tiled else 'striped'),
+                                      self.compression, self.data_type,
+                                      'overviews' if self.overviews else '']))
+
+
+@gdal_exceptions()
+def replace_raster(source_path, path, profile):
+    """
+    Rewrites source_path to path with the profile and deletes source_path.
+    Used after tools that can only write default GeoTIFFs (QgsRasterCalculator).
+    """
+    profile.copy(source_path, path)
+    gdal.GetDriverByName('GTiff').Delete(source_path)
+    return path
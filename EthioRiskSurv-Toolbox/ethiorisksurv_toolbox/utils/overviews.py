@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+Overview (pyramid) generation for rasters added to the project, so the map
+canvas and the report snapshot render from decimated levels instead of the
+full-resolution band.
+"""
+
+import math
+
+from osgeo import gdal
+from qgis.core import QgsApplication, QgsTask, QgsMessageLog, Qgis
+
+from ..utils import logger
+from ..utils.raster_engine import gdal_exceptions
+
+# When RiskAnalyzer builds overviews for the final map, if the output profile did not
+OVERVIEWS_NONE = 'none'    # never
+OVERVIEWS_SYNC = 'sync'    # before run() returns
+OVERVIEWS_ASYNC = 'async'  # in a background QgsTask; the layer is repainted when it finishes
+
+DEFAULT_MIN_SIZE = 256  # pixels on the longest side of the coarsest level
+DEFAULT_RESAMPLING = 'average'
+
+
+def overview_levels(width, height, min_size=DEFAULT_MIN_SIZE):
+    """Decimation factors 2, 4, 8... until the longest side drops below min_size."""
+    levels = []
+    factor = 2
+    while math.ceil(max(width, height) / factor) >= min_size and factor <= max(width, height):
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+def overview_count(path):
+    """Number of overviews of band 1 (internal or .ovr), 0 if it cannot be opened."""
+    try:
+        dataset = gdal.OpenEx(path, gdal.OF_RASTER)
+    except RuntimeError:
+        return 0 # Raised instead of returning None inside raster_engine.gdal_exceptions()
+    if dataset is None:
+        return 0
+    count = dataset.GetRasterBand(1).GetOverviewCount()
+    dataset = None
+    return count
+
+
+@gdal_exceptions()
+def build_overviews(path, levels=None, resampling=DEFAULT_RESAMPLING, compress='DEFLATE', progress=None, is_canceled=None):
+    """
+    Builds external (.ovr) overviews for a raster without rewriting it.
+    :param levels: Decimation factors; defaults to overview_levels() of the raster.
+    :param progress: Optional callable receiving a 0-100 percentage.
+    :param is_canceled: Optional callable; returning True aborts the build.
+    :return: True if overviews were built (or none were needed).
+    """
+    dataset = gdal.Open(path)
+    if levels is None:
+        levels = overview_levels(dataset.RasterXSize, dataset.RasterYSize)
+    if not levels:
+        dataset = None
+        return True
+
+    def callback(complete, message, data):
+        if progress is not None:
+            progress(complete * 100.0)
+        return 0 if is_canceled is not None and is_canceled() else 1
+
+    options = {'COMPRESS_OVERVIEW': compress, 'BIGTIFF_OVERVIEW': 'IF_SAFER'}
+    if dataset.GetRasterBand(1).DataType == gdal.GDT_Float32 and compress != 'NONE':
+        options['PREDICTOR_OVERVIEW'] = '3'
+    # Thread-local, as this also runs inside OverviewTask
+    for key, value in options.items():
+        gdal.SetThreadLocalConfigOption(key, value)
+    try:
+        result = dataset.BuildOverviews(resampling.upper(), levels, callback)
+    except RuntimeError as e:
+        logger.warning(f"Overview generation for {path} stopped: {e}")
+        result = 1
+    finally:
+        for key in options:
+            gdal.SetThreadLocalConfigOption(key, None)
+    dataset = None
+    return result == 0
+
+
+def refresh_layer(layer):
+    """Reopens the data source of a raster layer so new overviews are used."""
+    layer.dataProvider().reloadData()
+    layer.triggerRepaint()
+
+
+class OverviewTask(QgsTask):
+    """
+    Builds the overviews of a raster layer in the background and repaints
+    the layer when they are ready.
+    """
+    def __init__(self, layer, levels=None, resampling=DEFAULT_RESAMPLING):
+        super().__init__(f"Building overviews for {layer.name()}", QgsTask.CanCancel)
+        self.layer = layer
+        self.path = layer.source()
+        self.levels = levels
+        self.resampling = resampling
+
+    def run(self):
+        return build_overviews(self.path, self.levels, self.resampling, progress=self.setProgress, is_canceled=self.isCanceled)
+
+    def finished(self, result):
+        if result:
+            try:
+                refresh_layer(self.layer)
+            except RuntimeError:
+                return # The layer was removed from the project meanwhile
+            QgsMessageLog.logMessage(f"Overviews ready for {self.layer.name()}.", "EthioRiskSurv-Toolbox", Qgis.Info)
+        elif not self.isCanceled():
+            QgsMessageLog.logMessage(f"Overview generation failed for {self.layer.name()}.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+
+
+def ensure_overviews(layer, mode=OVERVIEWS_ASYNC):
+    """
+    Gives a GDAL raster layer overviews unless it already has some.
+    :param mode: OVERVIEWS_NONE, OVERVIEWS_SYNC or OVERVIEWS_ASYNC.
+    :return: The OverviewTask for OVERVIEWS_ASYNC (keep a reference to it), else None.
+    """
+    if mode == OVERVIEWS_NONE or layer.providerType() != 'gdal' or overview_count(layer.source()) > 0:
+        return None
+    if mode == OVERVIEWS_SYNC:
+        if build_overviews(layer.source()):
+            refresh_layer(layer)
+        return None
+    task = OverviewTask(layer)
+    QgsApplication.taskManager().addTask(task)
+    return task
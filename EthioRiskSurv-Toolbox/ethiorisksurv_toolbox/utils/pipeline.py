@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Progress, cancellation and timing for a run made of stages.
+
+A run is divided into parts with relative weights (one per risk factor, one
+for the overlay, ...), each made of stages (proximity, normalize, overlay,
+...). The overall progress is the weighted progress of the parts, reported to
+a single QgsFeedback; every stage gets its own child QgsProcessingFeedback for
+the processing algorithms or QgsRasterCalculator it runs, and is timed.
+
+    with Pipeline("Risk analysis", feedback, {'factor0': 4, 'overlay': 2}) as pipeline:
+        with pipeline.stage('proximity', 'factor0', factor='roads', share=0.8) as stage:
+            ...
+            stage.set_progress(50)
+            pipeline.check()  # Between blocks: raises PipelineCanceled
+        pipeline.finish_part('factor0')
+        ...
+        return result
+    return None  # Canceled
+
+Parts and stages may run concurrently on several threads.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from qgis.PyQt.QtCore import Qt
+from qgis.core import QgsMessageLog, Qgis, QgsProcessingFeedback
+
+class PipelineCanceled(Exception):
+    """Raised by Pipeline.check() once the feedback is canceled."""
+
+class Stage:
+    """One running stage: its share of a part and its child feedback."""
+    def __init__(self, pipeline, name, part, factor, share):
+        self.pipeline = pipeline
+        self.name = name
+        self.part = part
+        self.factor = factor
+        self.share = share
+        self.fraction = 0.0
+        self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.set_progress, Qt.DirectConnection)
+
+    def set_progress(self, percent):
+        """Progress within the stage, 0-100."""
+        self.fraction = min(max(percent, 0.0), 100.0) / 100.0
+        self.pipeline._report()
+
+class Pipeline:
+    """
+    Weighted progress, cancellation checks and a timing summary for one run.
+    """
+    def __init__(self, name, feedback=None, parts=None):
+        """
+        Constructor.
+        :param name: Run name used in the logged summary.
+        :param feedback: QgsFeedback receiving the overall progress; its cancellation stops the run.
+        :param parts: Dict of part name -> relative weight, in the expected order.
+        """
+        self.name = name
+        self.feedback = feedback or QgsProcessingFeedback()
+        self.weights = dict(parts or {})
+        self.completed = {} # Part -> completed share (0-1)
+        self.active = [] # Running stages
+        self.records = [] # One dict per finished stage
+        self.lock = threading.RLock()
+        self.start_time = None
+        self.total_seconds = None
+        self.canceled = False
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        self.check()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total_seconds = time.perf_counter() - self.start_time
+        if exc_type is PipelineCanceled:
+            self.canceled = True
+            QgsMessageLog.logMessage(f"{self.name} canceled.", "EthioRiskSurv-Toolbox", Qgis.Warning)
+            return True # The caller continues after the with block
+        if exc_type is None:
+            self.feedback.setProgress(100.0)
+        self.log_summary()
+        return False
+
+    def check(self):
+        """Raises PipelineCanceled if the run was canceled. Call it between blocks."""
+        if self.feedback.isCanceled():
+            raise PipelineCanceled()
+
+    @contextmanager
+    def stage(self, name, part, factor=None, share=1.0):
+        """
+        Runs one timed stage of a part.
+        :param name: Stage name (proximity, normalize, invert, overlay, clip, ...).
+        :param part: Part the stage belongs to.
+        :param factor: Name of the risk factor, if the stage belongs to one.
+        :param share: Fraction of the part this stage represents.
+        :return: The Stage; pass stage.feedback to processing algorithms.
+        """
+        self.check()
+        stage = Stage(self, name, part, factor, share)
+        canceled = self.feedback.canceled
+        canceled.connect(stage.feedback.cancel, Qt.DirectConnection)
+        with self.lock:
+            self.active.append(stage)
+        start = time.perf_counter()
+        try:
+            yield stage
+        except Exception as e:
+            if self.feedback.isCanceled() and not isinstance(e, PipelineCanceled):
+                raise PipelineCanceled() from e # e.g. a processing algorithm failing on cancellation
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            canceled.disconnect(stage.feedback.cancel)
+            with self.lock:
+                self.active.remove(stage)
+                self.completed[part] = min(1.0, self.completed.get(part, 0.0) + share)
+                self.records.append({'stage': name, 'part': part, 'factor': factor, 'seconds': seconds})
+            self._report()
+        self.check() # Processing algorithms return normally when canceled
+
+    def finish_part(self, part):
+        """Marks a part complete, e.g. after skipping stages on a cache hit."""
+        with self.lock:
+            self.completed[part] = 1.0
+        self._report()
+
+    def progress(self):
+        """Overall progress, 0-100."""
+        total = sum(self.weights.values())
+        if not total:
+            return 0.0
+        with self.lock:
+            done = dict(self.completed)
+            for stage in self.active:
+                done[stage.part] = done.get(stage.part, 0.0) + stage.fraction * stage.share
+        return 100.0 * sum(weight * min(1.0, done.get(part, 0.0)) for part, weight in self.weights.items()) / total
+
+    def summary(self):
+        """
+        Structured timing summary.
+        :return: dict with 'name', 'total_seconds', 'canceled', 'stages' (one
+                 record per stage run, in completion order), 'by_stage' and
+                 'by_factor' (seconds) and 'slowest_factor'.
+        """
+        by_stage, by_factor = {}, {}
+        for record in self.records:
+            by_stage[record['stage']] = by_stage.get(record['stage'], 0.0) + record['seconds']
+            if record['factor'] is not None:
+                by_factor[record['factor']] = by_factor.get(record['factor'], 0.0) + record['seconds']
+        return {
+            'name': self.name,
+            'total_seconds': self.total_seconds,
+            'canceled': self.canceled,
+            'stages': [dict(record) for record in self.records],
+            'by_stage': by_stage,
+            'by_factor': by_factor,
+            'slowest_factor': max(by_factor, key=by_factor.get) if by_factor else None
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        lines = [f"{self.name} finished in {summary['total_seconds']:.2f} s."]
+        total = summary['total_seconds'] or 1.0
+        for stage, seconds in sorted(summary['by_stage'].items(), key=lambda item: -item[1]):
+            lines.append(f"  {stage:<12} {seconds:8.2f} s {100 * seconds / total:5.1f} %")
+        for factor, seconds in sorted(summary['by_factor'].items(), key=lambda item: -item[1]):
+            lines.append(f"  factor '{factor}': {seconds:.2f} s")
+        QgsMessageLog.logMessage("\n".join(lines), "EthioRiskSurv-Toolbox", Qgis.Info)
+
+    def _report(self):
+        self.feedback.setProgress(self.progress())
@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+
+"""
+GDAL/NumPy helpers used by the in-memory and streaming risk overlay engines.
+
+Factors are read through GDAL onto a common target grid and processed as
+NumPy arrays, either whole or window by window, so no intermediate GeoTIFFs
+are written to disk. GDAL errors raise RuntimeError inside these helpers
+only (see gdal_exceptions).
+"""
+
+import math
+import sys
+import threading
+from contextlib import contextmanager
+import numpy as np
+from osgeo import gdal, ogr, osr
+from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject
+
+from ..utils import logger
+
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None # SciPy is optional; distances fall back to gdal.ComputeProximity
+
+# NoData value written into the final risk map GeoTIFF.
+RISK_NODATA = -9999.0
+
+_exceptions_lock = threading.Lock()
+_exceptions_state = {'depth': 0, 'switched_on': False} # Blocks open in any thread (GDAL < 3.7 only)
+
+
+@contextmanager
+def gdal_exceptions():
+    """
+    GDAL errors raise RuntimeError inside the block. The bindings are not
+    switched to exception mode for the whole QGIS process, where other
+    plugins and code checking for None returns share them. Also usable as
+    a decorator.
+    """
+    if hasattr(gdal, 'ExceptionMgr'): # GDAL >= 3.7, scoped to the calling thread
+        with gdal.ExceptionMgr(useExceptions=True):
+            yield
+        return
+    # Older bindings only have the process-wide switch: keep it on while any block is open
+    with _exceptions_lock:
+        if _exceptions_state['depth'] == 0:
+            _exceptions_state['switched_on'] = not gdal.GetUseExceptions()
+            if _exceptions_state['switched_on']:
+                gdal.UseExceptions()
+        _exceptions_state['depth'] += 1
+    try:
+        yield
+    finally:
+        with _exceptions_lock:
+            _exceptions_state['depth'] -= 1
+            if _exceptions_state['depth'] == 0 and _exceptions_state['switched_on']:
+                gdal.DontUseExceptions()
+
+
+class RasterGrid:
+    """
+    Describes a north-up target grid (extent, size and CRS) that every
+    risk factor is resampled onto before the overlay.
+    """
+    def __init__(self, x_min, y_max, pixel_width, pixel_height, width, height, crs_wkt):
+        self.x_min = x_min
+        self.y_max = y_max
+        self.pixel_width = pixel_width
+        self.pixel_height = pixel_height
+        self.width = width
+        self.height = height
+        self.crs_wkt = crs_wkt
+
+    @classmethod
+    def from_extent(cls, extent, resolution, crs_wkt):
+        """
+        Builds the same grid QgsRasterCalculator uses for a QgsRectangle
+        and a target resolution (width/height truncated, pixel size stretched).
+        """
+        width = max(1, int(extent.width() / resolution))
+        height = max(1, int(extent.height() / resolution))
+        return cls(extent.xMinimum(), extent.yMaximum(),
+                   extent.width() / width, extent.height() / height,
+                   width, height, crs_wkt)
+
+    @classmethod
+    def snapped(cls, extent, resolution, crs_wkt, origin=(0.0, 0.0)):
+        """
+        Builds a canonical grid with square resolution-sized pixels whose
+        edges fall on origin + k * resolution, covering the extent. Grids
+        built this way for overlapping study areas share pixel boundaries.
+        """
+        x_origin, y_origin = origin
+        x_min = x_origin + math.floor((extent.xMinimum() - x_origin) / resolution) * resolution
+        y_max = y_origin + math.ceil((extent.yMaximum() - y_origin) / resolution) * resolution
+        width = max(1, int(math.ceil((extent.xMaximum() - x_min) / resolution)))
+        height = max(1, int(math.ceil((y_max - extent.yMinimum()) / resolution)))
+        return cls(x_min, y_max, float(resolution), float(resolution), width, height, crs_wkt)
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """Grid of an open north-up GDAL dataset."""
+        x_min, pixel_width, _, y_max, _, pixel_height = dataset.GetGeoTransform()
+        return cls(x_min, y_max, pixel_width, -pixel_height, dataset.RasterXSize, dataset.RasterYSize,
+                   dataset.GetProjection())
+
+    @property
+    def geotransform(self):
+        return (self.x_min, self.pixel_width, 0.0, self.y_max, 0.0, -self.pixel_height)
+
+    @property
+    def bounds(self):
+        """(xmin, ymin, xmax, ymax) as expected by gdal.Warp outputBounds."""
+        return (self.x_min, self.y_max - self.height * self.pixel_height,
+                self.x_min + self.width * self.pixel_width, self.y_max)
+
+    def window(self, x_offset, y_offset, x_size, y_size):
+        """Returns the sub-grid covering a pixel window of this grid."""
+        return RasterGrid(self.x_min + x_offset * self.pixel_width,
+                          self.y_max - y_offset * self.pixel_height,
+                          self.pixel_width, self.pixel_height,
+                          x_size, y_size, self.crs_wkt)
+
+    def iter_windows(self, block_size):
+        """
+        Yields (x_offset, y_offset, x_size, y_size) windows of at most
+        block_size x block_size pixels, row by row.
+        """
+        for y_offset in range(0, self.height, block_size):
+            y_size = min(block_size, self.height - y_offset)
+            for x_offset in range(0, self.width, block_size):
+                yield x_offset, y_offset, min(block_size, self.width - x_offset), y_size
+
+    @gdal_exceptions()
+    def create_dataset(self, path='', driver_name='MEM', data_type=gdal.GDT_Float32, nodata=None, options=None):
+        """Creates a single-band dataset covering this grid."""
+        driver = gdal.GetDriverByName(driver_name)
+        dataset = driver.Create(path, self.width, self.height, 1, data_type, options or [])
+        dataset.SetGeoTransform(self.geotransform)
+        dataset.SetProjection(self.crs_wkt)
+        if nodata is not None:
+            dataset.GetRasterBand(1).SetNoDataValue(nodata)
+        return dataset
+
+
+# How band_min_max obtains the value range of a factor
+MINMAX_EXACT = 'exact'              # one streaming min/max pass over the full-resolution band
+MINMAX_CACHED = 'cached'            # exact, and reused across runs through a FactorCache keyed by the file fingerprint
+MINMAX_APPROXIMATE = 'approximate'  # estimate from overviews or a subsample, no full read
+
+
+@gdal_exceptions()
+def band_min_max(path, band=1, mode=MINMAX_EXACT, cache=None):
+    """
+    Minimum and maximum of a raster band without computing the full
+    statistics set (mean, standard deviation, histogram). Nothing is
+    written next to the raster, and statistics stored with it by other
+    tools are not trusted, as they may predate an edit.
+
+    :param path: GDAL-readable raster path.
+    :param mode: MINMAX_EXACT, MINMAX_CACHED or MINMAX_APPROXIMATE.
+    :param cache: utils.factor_cache.FactorCache holding the ranges of
+                  MINMAX_CACHED; without one it behaves as MINMAX_EXACT.
+    :return: (min, max) tuple, or (None, None) if the band has no valid data.
+    """
+    if mode == MINMAX_CACHED and cache is not None:
+        cached = cache.get_min_max(path, band)
+        if cached is not None:
+            return cached
+    dataset = gdal.Open(path)
+    try:
+        min_val, max_val = dataset.GetRasterBand(band).ComputeRasterMinMax(mode == MINMAX_APPROXIMATE)
+    except RuntimeError:
+        return None, None
+    finally:
+        dataset = None
+    if mode == MINMAX_CACHED and cache is not None:
+        cache.put_min_max(path, band, min_val, max_val)
+    return min_val, max_val
+
+
+def is_aligned(path, grid, tolerance=1e-6):
+    """True if the raster already has exactly the grid's size, geotransform and CRS."""
+    try:
+        dataset = gdal.Open(path)
+    except RuntimeError:
+        return False # Raised instead of returning None inside gdal_exceptions()
+    if dataset is None:
+        return False
+    try:
+        if (dataset.RasterXSize, dataset.RasterYSize) != (grid.width, grid.height):
+            return False
+        scale = max(grid.pixel_width, grid.pixel_height)
+        if any(abs(a - b) > tolerance * scale for a, b in zip(dataset.GetGeoTransform(), grid.geotransform)):
+            return False
+        source_srs = osr.SpatialReference(wkt=dataset.GetProjection())
+        grid_srs = osr.SpatialReference(wkt=grid.crs_wkt)
+        return bool(source_srs.IsSame(grid_srs))
+    finally:
+        dataset = None
+
+
+@gdal_exceptions()
+def warp_to_grid(path, grid, output_path, resampling='near', creation_options=None):
+    """
+    Warps a raster once onto the grid and writes it as a tiled GeoTIFF, so
+    later reads need no resampling.
+    :param creation_options: GTiff creation options, e.g. OutputProfile.creation_options().
+    """
+    dataset = gdal.Warp(output_path, path, format='GTiff', outputBounds=grid.bounds,
+                        width=grid.width, height=grid.height, dstSRS=grid.crs_wkt,
+                        resampleAlg=resampling, creationOptions=creation_options or ['TILED=YES', 'BIGTIFF=IF_SAFER'])
+    dataset = None
+    return output_path
+
+
+@gdal_exceptions()
+def read_aligned(path, grid, resampling='near'):
+    """
+    Reads band 1 of a raster resampled onto the target grid.
+
+    :param path: GDAL-readable raster path.
+    :param grid: RasterGrid to align to.
+    :param resampling: GDAL resampling algorithm name.
+    :return: float64 array with NoData pixels set to NaN.
+    """
+    if is_aligned(path, grid):
+        dataset = gdal.Open(path)
+        array = read_window(dataset, (0, 0, grid.width, grid.height))
+        dataset = None
+        return array
+    warped = gdal.Warp('', path, format='MEM', outputBounds=grid.bounds,
+                       width=grid.width, height=grid.height, dstSRS=grid.crs_wkt,
+                       resampleAlg=resampling, outputType=gdal.GDT_Float64,
+                       dstNodata=np.nan)
+    array = warped.GetRasterBand(1).ReadAsArray()
+    warped = None
+    return array
+
+
+@gdal_exceptions()
+def open_aligned(path, grid, resampling='near'):
+    """
+    Opens a raster as a virtual warped dataset aligned to the target grid.
+    Nothing is read until a window is requested, so the cost of a read is
+    proportional to the window size and not to the raster size. Rasters
+    already on the grid are opened directly.
+    """
+    if is_aligned(path, grid):
+        return gdal.Open(path)
+    return gdal.Warp('', path, format='VRT', outputBounds=grid.bounds,
+                     width=grid.width, height=grid.height, dstSRS=grid.crs_wkt,
+                     resampleAlg=resampling, outputType=gdal.GDT_Float64,
+                     dstNodata=np.nan)
+
+
+@gdal_exceptions()
+def read_window(dataset, window):
+    """
+    Reads a (x_offset, y_offset, x_size, y_size) window from band 1 of a
+    dataset returned by open_aligned as float64, with NoData set to NaN.
+    """
+    band = dataset.GetRasterBand(1)
+    array = band.ReadAsArray(*window).astype(np.float64)
+    nodata = band.GetNoDataValue()
+    if nodata is not None and not np.isnan(nodata):
+        array[array == nodata] = np.nan
+    return array
+
+
+def normalize_array(array, min_val, max_val, invert=False):
+    """
+    Scales an array to 0-1 in one pass: (x - min) / (max - min), or
+    (max - x) / (max - min) when invert is True.
+
+    The result is rounded to float32, the type normalize_raster stores, so
+    the GDAL-based engines and the QgsRasterCalculator engine agree.
+    """
+    if invert:
+        return ((max_val - array) / (max_val - min_val)).astype(np.float32)
+    return ((array - min_val) / (max_val - min_val)).astype(np.float32)
+
+
+def vector_layer_to_ogr(layer, crs_wkt):
+    """
+    Copies the geometries of a QgsVectorLayer into an in-memory OGR layer so
+    that it can be burnt with gdal.RasterizeLayer. Geometries are reprojected
+    to crs_wkt when the layer uses another CRS.
+
+    :return: (datasource, layer) tuple; keep the datasource alive while the layer is used.
+    """
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(crs_wkt)
+    target_crs = QgsCoordinateReferenceSystem.fromWkt(crs_wkt)
+    transform = None
+    if layer.crs().isValid() and target_crs.isValid() and layer.crs() != target_crs:
+        transform = QgsCoordinateTransform(layer.crs(), target_crs, QgsProject.instance())
+    datasource = ogr.GetDriverByName('Memory').CreateDataSource('')
+    ogr_layer = datasource.CreateLayer('features', srs=srs)
+    definition = ogr_layer.GetLayerDefn()
+    for feature in layer.getFeatures():
+        geometry = feature.geometry()
+        if geometry is None or geometry.isEmpty():
+            continue
+        if transform is not None:
+            geometry.transform(transform)
+        ogr_feature = ogr.Feature(definition)
+        ogr_feature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+        ogr_layer.CreateFeature(ogr_feature)
+    return datasource, ogr_layer
+
+
+def rasterize_mask(layer, grid, all_touched=False):
+    """
+    Rasterizes a polygon layer onto the grid.
+
+    :return: boolean array, True for pixels whose centre falls inside the polygons.
+    """
+    datasource, ogr_layer = vector_layer_to_ogr(layer, grid.crs_wkt)
+    mask = burn_mask(ogr_layer, grid, all_touched)
+    datasource = None
+    return mask
+
+
+@gdal_exceptions()
+def burn_mask(ogr_layer, grid, all_touched=False):
+    """Rasterizes an OGR layer onto the grid and returns it as a boolean array."""
+    dataset = grid.create_dataset(data_type=gdal.GDT_Byte)
+    options = ['ALL_TOUCHED=TRUE'] if all_touched else []
+    gdal.RasterizeLayer(dataset, [1], ogr_layer, burn_values=[1], options=options)
+    mask = dataset.GetRasterBand(1).ReadAsArray().astype(bool)
+    dataset = None
+    return mask
+
+
+@gdal_exceptions()
+def write_mask(path, mask, grid):
+    """
+    Writes a boolean mask as a Byte GeoTIFF with 1 inside and NoData (0)
+    outside, so multiplying a raster calculator expression by it clips the
+    result in the same pass.
+    """
+    dataset = grid.create_dataset(path, driver_name='GTiff', data_type=gdal.GDT_Byte, nodata=0)
+    band = dataset.GetRasterBand(1)
+    band.WriteArray(mask.astype(np.uint8))
+    band.FlushCache()
+    dataset = None
+    return path
+
+
+# Euclidean distance transform implementations used by vector_distance
+DISTANCE_AUTO = 'auto'    # SciPy when available, else GDAL
+DISTANCE_SCIPY = 'scipy'  # scipy.ndimage.distance_transform_edt (exact)
+DISTANCE_GDAL = 'gdal'    # gdal.ComputeProximity
+
+
+@gdal_exceptions()
+def vector_distance(layer, grid, method=DISTANCE_AUTO):
+    """
+    Distance, in CRS units, from every pixel centre of the grid to the
+    nearest pixel covered by the layer's features. The features are
+    rasterized once onto the grid (all touched pixels, so thin road and
+    river lines are kept) and an exact Euclidean distance transform is run.
+
+    :param layer: QgsVectorLayer (points, lines or polygons).
+    :param grid: RasterGrid the distances are computed on.
+    :param method: DISTANCE_AUTO, DISTANCE_SCIPY or DISTANCE_GDAL.
+    :return: float32 array, or None if no feature falls on the grid.
+    """
+    datasource, ogr_layer = vector_layer_to_ogr(layer, grid.crs_wkt)
+    features = burn_mask(ogr_layer, grid, all_touched=True)
+    datasource = None
+    if not features.any():
+        return None
+
+    if method == DISTANCE_SCIPY and ndimage is None:
+        logger.warning("SciPy is not available, using gdal.ComputeProximity for distances.")
+    if ndimage is not None and method in (DISTANCE_AUTO, DISTANCE_SCIPY):
+        return ndimage.distance_transform_edt(~features, sampling=(grid.pixel_height, grid.pixel_width)).astype(np.float32)
+
+    source = grid.create_dataset(data_type=gdal.GDT_Byte)
+    source.GetRasterBand(1).WriteArray(features.astype(np.uint8))
+    target = grid.create_dataset(data_type=gdal.GDT_Float32)
+    gdal.ComputeProximity(source.GetRasterBand(1), target.GetRasterBand(1), ['VALUES=1', 'DISTUNITS=GEO'])
+    distances = target.GetRasterBand(1).ReadAsArray()
+    source = None
+    target = None
+    return distances
+
+
+@gdal_exceptions()
+def write_array(path, array, grid, nodata=RISK_NODATA, profile=None):
+    """
+    Writes a float array as a single-band Float32 GeoTIFF. NaN pixels are
+    written as NoData.
+    :param profile: Optional utils.output_profile.OutputProfile for layout and encoding.
+    """
+    if profile is not None:
+        return profile.write(path, array, grid, nodata)
+    dataset = grid.create_dataset(path, driver_name='GTiff', nodata=nodata)
+    band = dataset.GetRasterBand(1)
+    band.WriteArray(np.where(np.isnan(array), nodata, array).astype(np.float32))
+    band.FlushCache()
+    dataset = None
+    logger.info(f"Wrote raster {path} ({grid.width} x {grid.height})")
+    return path
+
+
+@gdal_exceptions()
+def create_output(path, grid, nodata=RISK_NODATA, profile=None):
+    """
+    Creates a tiled Float32 GeoTIFF that windows can be written into.
+    Close it with close_output().
+    """
+    if profile is not None:
+        return profile.create(path, grid, nodata)
+    return grid.create_dataset(path, driver_name='GTiff', nodata=nodata,
+                               options=['TILED=YES', 'BIGTIFF=IF_SAFER'])
+
+
+@gdal_exceptions()
+def write_window(dataset, array, window, nodata=RISK_NODATA, profile=None):
+    """Writes a float array into a window of band 1; NaN pixels become NoData."""
+    x_offset, y_offset = window[0], window[1]
+    encoded = profile.encode(array, nodata) if profile is not None else np.where(np.isnan(array), nodata, array).astype(np.float32)
+    dataset.GetRasterBand(1).WriteArray(encoded, x_offset, y_offset)
+
+
+@gdal_exceptions()
+def close_output(dataset, path, profile=None):
+    """Finishes a dataset from create_output (overviews, COG layout) and closes it."""
+    if profile is not None:
+        return profile.finalize(dataset, path)
+    dataset.FlushCache()
+    dataset = None
+    return path
+
+
+@gdal_exceptions()
+def discard_output(path, profile=None):
+    """Deletes an unfinished dataset from create_output(); drop every reference to it first."""
+    if profile is not None:
+        return profile.discard(path)
+    if gdal.VSIStatL(path) is not None:
+        gdal.GetDriverByName('GTiff').Delete(path)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process in MB, or None when it
+    cannot be determined on this platform.
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+"""
+Road network routing for the cost evaluation.
+
+A road layer is turned into a compact graph in CSR form (indptr, indices,
+weights as NumPy arrays): line vertices closer than a snap tolerance become
+one node and every segment an edge in both directions, weighted by its
+geodesic length. A single-source Dijkstra from the HQ gives the network
+distance to every node at once (the shortest-path tree); a sampling point
+is reached through the node nearest to it, plus the straight-line access
+distance to that node.
+
+Graphs and shortest-path trees are cached in memory per road layer (and per
+HQ for trees), so repeated scenarios with the same roads and HQ only need
+lookups. A changed road file (size or modification time) invalidates them.
+
+SciPy's csgraph.dijkstra and cKDTree are used when available; a heapq
+Dijkstra and a block-wise nearest-node search are used otherwise.
+"""
+
+import heapq
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from qgis.core import QgsFeatureRequest
+
+from ..utils import logger
+from ..utils import geodesy
+from ..utils.factor_cache import source_file
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+    from scipy.spatial import cKDTree
+except ImportError:
+    csr_matrix = csgraph_dijkstra = cKDTree = None # SciPy is optional
+
+NO_PREDECESSOR = -9999 # As in scipy.sparse.csgraph
+
+# Vertices closer than this (in layer units) are merged into one node
+DEFAULT_SNAP_TOLERANCE_DEGREES = 1e-7
+DEFAULT_SNAP_TOLERANCE_METRES = 0.01
+
+MAX_CACHED_GRAPHS = 4
+MAX_CACHED_TREES = 32
+
+NEAREST_BLOCK_SIZE = 1024 # Points per block in the NumPy nearest-node search
+
+
+class RoadGraph:
+    """
+    Undirected road graph in CSR form. Node i is at (x[i], y[i]) in crs; the
+    edges leaving it are indices[indptr[i]:indptr[i + 1]], with lengths in
+    metres in the same slice of weights.
+    """
+    def __init__(self, x, y, indptr, indices, weights, crs, ellipsoid):
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.crs = crs
+        self.ellipsoid = ellipsoid
+        self._tree = None # cKDTree over the nodes, built on first use
+
+    @property
+    def node_count(self):
+        return len(self.x)
+
+    @property
+    def edge_count(self):
+        """Number of road segments (each is stored in both directions)."""
+        return len(self.indices) // 2
+
+    @classmethod
+    def from_layer(cls, layer, ellipsoid=geodesy.DEFAULT_ELLIPSOID, snap_tolerance=None, feedback=None):
+        """
+        Builds the graph of a line layer.
+        :param snap_tolerance: Distance in layer units below which vertices are merged;
+                               defaults to 1e-7 degrees or 1 cm.
+        :param feedback: Optional QgsFeedback; reading stops early once it is canceled.
+        :return: RoadGraph, or None if the layer has no line segments.
+        """
+        crs = layer.crs()
+        if snap_tolerance is None:
+            snap_tolerance = DEFAULT_SNAP_TOLERANCE_DEGREES if crs.isGeographic() else DEFAULT_SNAP_TOLERANCE_METRES
+
+        # --- 1. All vertices, and segments as pairs of vertex indices ---
+        request = QgsFeatureRequest().setNoAttributes()
+        if feedback is not None:
+            request.setFeedback(feedback)
+        xs, ys, starts = [], [], []
+        for feature in layer.getFeatures(request):
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            parts = geometry.asMultiPolyline() if geometry.isMultipart() else [geometry.asPolyline()]
+            for part in parts:
+                if len(part) < 2:
+                    continue
+                offset = len(xs)
+                xs.extend(point.x() for point in part)
+                ys.extend(point.y() for point in part)
+                starts.extend(range(offset, offset + len(part) - 1))
+        if not starts:
+            return None
+        xs, ys = np.array(xs, dtype=np.float64), np.array(ys, dtype=np.float64)
+        u = np.array(starts, dtype=np.int64)
+        v = u + 1
+
+        # --- 2. Merge coincident vertices into nodes ---
+        keys = np.round(np.column_stack((xs, ys)) / snap_tolerance).astype(np.int64)
+        _, first, node_of = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        node_of = node_of.ravel()
+        lengths = geodesy.distances_between(xs[u], ys[u], xs[v], ys[v], crs, ellipsoid)
+        u, v = node_of[u], node_of[v]
+        keep = u != v
+        u, v, lengths = u[keep], v[keep], lengths[keep]
+
+        # --- 3. CSR with both directions; parallel edges keep the shortest ---
+        rows, cols, weights = np.concatenate((u, v)), np.concatenate((v, u)), np.concatenate((lengths, lengths))
+        order = np.lexsort((weights, cols, rows))
+        rows, cols, weights = rows[order], cols[order], weights[order]
+        unique = np.ones(len(rows), dtype=bool)
+        unique[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows, cols, weights = rows[unique], cols[unique], weights[unique]
+        node_count = len(first)
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=node_count), out=indptr[1:])
+
+        graph = cls(xs[first], ys[first], indptr, cols.astype(np.int32), weights, crs, ellipsoid)
+        logger.info(f"Road graph built: {graph.node_count} nodes, {graph.edge_count} segments.")
+        return graph
+
+    def nearest_nodes(self, x, y):
+        """
+        Node nearest to each point (in the graph CRS) and the distance to it in metres.
+        :return: (nodes, distances) arrays.
+        """
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        if len(x) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        # In degrees, longitudes are scaled so that the search is roughly isotropic
+        scale = np.cos(np.radians(np.mean(self.y))) if self.crs.isGeographic() else 1.0
+        if cKDTree is not None:
+            if self._tree is None:
+                self._tree = cKDTree(np.column_stack((self.x * scale, self.y)))
+            _, nodes = self._tree.query(np.column_stack((x * scale, y)))
+        else:
+            nodes = np.empty(len(x), dtype=np.int64)
+            for start in range(0, len(x), NEAREST_BLOCK_SIZE):
+                block = slice(start, start + NEAREST_BLOCK_SIZE)
+                squared = ((x[block, None] - self.x[None, :]) * scale) ** 2 + (y[block, None] - self.y[None, :]) ** 2
+                nodes[block] = np.argmin(squared, axis=1)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return nodes, geodesy.distances_between(x, y, self.x[nodes], self.y[nodes], self.crs, self.ellipsoid)
+
+    def dijkstra(self, source):
+        """
+        Single-source shortest paths.
+        :return: (distances, predecessors) per node; unreachable nodes are at
+                 inf and have NO_PREDECESSOR.
+        """
+        if csgraph_dijkstra is not None:
+            matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(self.node_count, self.node_count))
+            distances, predecessors = csgraph_dijkstra(matrix, directed=True, indices=source, return_predecessors=True)
+            return distances, predecessors
+
+        indptr, indices, weights = self.indptr.tolist(), self.indices.tolist(), self.weights.tolist()
+        distances = [float('inf')] * self.node_count
+        predecessors = [NO_PREDECESSOR] * self.node_count
+        distances[source] = 0.0
+        queue = [(0.0, source)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if distance > distances[node]:
+                continue # Stale entry
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[edge]
+                candidate = distance + weights[edge]
+                if candidate < distances[neighbour]:
+                    distances[neighbour] = candidate
+                    predecessors[neighbour] = node
+                    heapq.heappush(queue, (candidate, neighbour))
+        return np.array(distances), np.array(predecessors, dtype=np.int32)
+
+
+class ShortestPathTree:
+    """Network distances from one HQ to every node of a RoadGraph."""
+    def __init__(self, graph, source, hq_access, distances, predecessors):
+        """
+        Constructor.
+        :param source: Node nearest to the HQ, where the tree is rooted.
+        :param hq_access: Straight-line distance in metres from the HQ to source.
+        """
+        self.graph = graph
+        self.source = source
+        self.hq_access = hq_access
+        self.distances = distances
+        self.predecessors = predecessors
+
+    def distances_to(self, x, y, crs):
+        """
+        Travel distances in metres from the HQ to points in crs: HQ access,
+        network distance between the nearest nodes, and point access.
+        Points whose nearest node is not connected to the HQ's get inf.
+        """
+        x, y = geodesy.transform_xy(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), crs, self.graph.crs)
+        nodes, access = self.graph.nearest_nodes(x, y)
+        return self.hq_access + self.distances[nodes] + access
+
+    def route(self, node):
+        """Nodes on the shortest path from the HQ's node to node, or [] if unreachable."""
+        if not np.isfinite(self.distances[node]):
+            return []
+        path = [node]
+        while path[-1] != self.source:
+            path.append(int(self.predecessors[path[-1]]))
+        return path[::-1]
+
+
+_lock = threading.Lock()
+_graphs = OrderedDict() # Graph key -> RoadGraph
+_trees = OrderedDict() # (graph key, HQ) -> ShortestPathTree
+
+
+def layer_fingerprint(layer):
+    """
+    Identifies the content of a road layer: its file (size and modification
+    time) for file sources, otherwise the layer itself.
+    """
+    source = layer.source()
+    path = source_file(source)
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path) + source[len(path):], stat.st_size, stat.st_mtime_ns, layer.subsetString())
+    return (layer.id(), source, layer.featureCount(), layer.extent().toString())
+
+
+def _graph_key(road_layer, ellipsoid):
+    return (layer_fingerprint(road_layer), road_layer.crs().toWkt(), ellipsoid)
+
+
+def road_graph(road_layer, ellipsoid=geodesy.DEFAULT_ELLIPSOID, feedback=None):
+    """Cached RoadGraph.from_layer(). :return: RoadGraph, or None."""
+    key = _graph_key(road_layer, ellipsoid)
+    with _lock:
+        if key in _graphs:
+            _graphs.move_to_end(key)
+            return _graphs[key]
+    graph = RoadGraph.from_layer(road_layer, ellipsoid, feedback=feedback)
+    if graph is None or (feedback is not None and feedback.isCanceled()):
+        return None
+    with _lock:
+        _graphs[key] = graph
+        while len(_graphs) > MAX_CACHED_GRAPHS:
+            _graphs.popitem(last=False)
+    return graph
+
+
+def shortest_path_tree(road_layer, hq_point, crs, ellipsoid=geodesy.DEFAULT_ELLIPSOID, feedback=None):
+    """
+    Shortest-path tree from the HQ over a road layer, built once and then
+    served from the cache for the same roads and HQ.
+    :param hq_point: QgsPointXY in crs.
+    :param crs: QgsCoordinateReferenceSystem of hq_point.
+    :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+    :return: ShortestPathTree, or None if the road layer has no segments.
+    """
+    hq_x, hq_y = geodesy.transform_xy(np.array([hq_point.x()]), np.array([hq_point.y()]), crs, road_layer.crs())
+    key = (_graph_key(road_layer, ellipsoid), round(float(hq_x[0]), 9), round(float(hq_y[0]), 9))
+    with _lock:
+        if key in _trees:
+            _trees.move_to_end(key)
+            return _trees[key]
+
+    graph = road_graph(road_layer, ellipsoid, feedback)
+    if graph is None:
+        return None
+    nodes, access = graph.nearest_nodes(hq_x, hq_y)
+    distances, predecessors = graph.dijkstra(int(nodes[0]))
+    tree = ShortestPathTree(graph, int(nodes[0]), float(access[0]), distances, predecessors)
+    reachable = np.isfinite(distances).sum()
+    logger.info(f"Shortest-path tree from HQ: {reachable} of {graph.node_count} road nodes reachable.")
+    with _lock:
+        _trees[key] = tree
+        while len(_trees) > MAX_CACHED_TREES:
+            _trees.popitem(last=False)
+    return tree
+
+
+def clear_cache():
+    """Drops all cached graphs and shortest-path trees."""
+    with _lock:
+        _graphs.clear()
+        _trees.clear()
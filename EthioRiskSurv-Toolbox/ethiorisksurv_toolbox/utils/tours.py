@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Daily field tours for the cost evaluation.
+
+Instead of a round trip from HQ to every sampling point, the points are
+grouped into daily tours of at most samples_per_day points (the sweep
+heuristic: points sorted by bearing from the HQ and cut into consecutive
+groups), and each tour is ordered with a nearest-neighbour start improved by
+2-opt and Or-opt moves on the tour's distance matrix. Improvement moves are
+evaluated for all positions at once with NumPy, so thousands of points are
+planned in seconds.
+"""
+
+import numpy as np
+
+from ..utils import geodesy
+
+IMPROVEMENT_EPSILON = 1e-7 # Metres; smaller gains are ignored
+MAX_IMPROVEMENT_ROUNDS = 100
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3)
+
+
+class Tour:
+    """One day of fieldwork: HQ -> points (in visiting order) -> HQ."""
+    def __init__(self, points, length):
+        """
+        :param points: Indices of the sampling points, in visiting order.
+        :param length: Tour length in metres, including the legs from and to the HQ.
+        """
+        self.points = points
+        self.length = length
+
+    def __len__(self):
+        return len(self.points)
+
+
+def sweep_clusters(x, y, hq_point, capacity, geographic=False):
+    """
+    Groups points into clusters of at most capacity points by bearing from
+    the HQ. The sweep starts after the widest empty sector, so that a group
+    of points is not split at an arbitrary bearing.
+    :return: List of index arrays.
+    """
+    dx, dy = x - hq_point.x(), y - hq_point.y()
+    if geographic:
+        dx = dx * np.cos(np.radians(hq_point.y()))
+    angles = np.arctan2(dy, dx)
+    order = np.argsort(angles, kind='stable')
+    if len(order) > 1:
+        sorted_angles = angles[order]
+        gaps = np.diff(np.append(sorted_angles, sorted_angles[0] + 2 * np.pi))
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+    return [order[start:start + capacity] for start in range(0, len(order), capacity)]
+
+
+def distance_matrix(x, y, crs, ellipsoid=geodesy.DEFAULT_ELLIPSOID):
+    """Distances in metres between all pairs of points, as an (n, n) array."""
+    return geodesy.distances_between(x[:, None], y[:, None], x[None, :], y[None, :], crs, ellipsoid)
+
+
+def route_length(route, matrix):
+    return float(matrix[route[:-1], route[1:]].sum())
+
+
+def nearest_neighbour_route(matrix):
+    """
+    Route starting and ending at node 0 (the HQ) that always moves to the
+    nearest unvisited node.
+    :return: int array [0, ..., 0].
+    """
+    count = len(matrix)
+    visited = np.zeros(count, dtype=bool)
+    visited[0] = True
+    route = [0]
+    for _ in range(count - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        nearest = int(np.argmin(distances))
+        visited[nearest] = True
+        route.append(nearest)
+    route.append(0)
+    return np.array(route, dtype=np.int64)
+
+
+def two_opt(route, matrix):
+    """
+    Applies improving 2-opt moves (reversing route[i:j + 1]) until none is
+    left; for each i the best j is found in one vectorized step.
+    :return: (route, improved)
+    """
+    improved = False
+    last = len(route) - 2 # Last visited point; route[-1] is the HQ
+    changed = True
+    while changed:
+        changed = False
+        for i in range(1, last):
+            j = np.arange(i + 1, last + 1)
+            a, b = route[i - 1], route[i]
+            delta = matrix[a, route[j]] + matrix[b, route[j + 1]] - matrix[a, b] - matrix[route[j], route[j + 1]]
+            best = int(np.argmin(delta))
+            if delta[best] < -IMPROVEMENT_EPSILON:
+                end = j[best]
+                route[i:end + 1] = route[i:end + 1][::-1].copy()
+                changed = improved = True
+    return route, improved
+
+
+def or_opt(route, matrix):
+    """
+    Moves segments of OR_OPT_SEGMENT_LENGTHS consecutive points, possibly
+    reversed, to the position where they shorten the route most.
+    :return: (route, improved)
+    """
+    improved = False
+    for length in OR_OPT_SEGMENT_LENGTHS:
+        i = 1
+        while i + length <= len(route) - 1:
+            segment = route[i:i + length]
+            rest = np.concatenate((route[:i], route[i + length:]))
+            first, last = segment[0], segment[-1]
+            removal_gain = matrix[rest[i - 1], first] + matrix[last, rest[i]] - matrix[rest[i - 1], rest[i]]
+            before, after = rest[:-1], rest[1:]
+            forward = matrix[before, first] + matrix[last, after] - matrix[before, after]
+            backward = matrix[before, last] + matrix[first, after] - matrix[before, after]
+            insertion = np.minimum(forward, backward)
+            insertion[i - 1] = np.inf # Putting the segment back where it was
+            position = int(np.argmin(insertion))
+            if removal_gain - insertion[position] > IMPROVEMENT_EPSILON:
+                moved = segment if forward[position] <= backward[position] else segment[::-1]
+                route = np.concatenate((rest[:position + 1], moved, rest[position + 1:]))
+                improved = True
+            else:
+                i += 1
+    return route, improved
+
+
+def order_tour(matrix):
+    """
+    Visiting order for one tour. Node 0 of the matrix is the HQ.
+    :return: (route as node indices [0, ..., 0], length in metres)
+    """
+    route = nearest_neighbour_route(matrix)
+    if len(route) > 4: # With fewer than three points every order is optimal
+        for _ in range(MAX_IMPROVEMENT_ROUNDS):
+            route, by_two_opt = two_opt(route, matrix)
+            route, by_or_opt = or_opt(route, matrix)
+            if not (by_two_opt or by_or_opt):
+                break
+    return route, route_length(route, matrix)
+
+
+def plan_tours(x, y, hq_point, crs, ellipsoid, samples_per_day, feedback=None):
+    """
+    Plans daily tours from the HQ over all points.
+    :param x, y: Point coordinates in crs.
+    :param hq_point: QgsPointXY in crs.
+    :param samples_per_day: Maximum number of points visited per tour.
+    :param feedback: Optional QgsFeedback; None is returned if it is canceled.
+    :return: List of Tour, or None.
+    """
+    capacity = max(1, int(samples_per_day))
+    tours = []
+    clusters = sweep_clusters(x, y, hq_point, capacity, crs.isGeographic())
+    for number, cluster in enumerate(clusters):
+        if feedback is not None:
+            if feedback.isCanceled():
+                return None
+            feedback.setProgress(100 * number / len(clusters))
+        tour_x = np.concatenate(([hq_point.x()], x[cluster]))
+        tour_y = np.concatenate(([hq_point.y()], y[cluster]))
+        route, length = order_tour(distance_matrix(tour_x, tour_y, crs, ellipsoid))
+        tours.append(Tour(cluster[route[1:-1] - 1], length))
+    return tours